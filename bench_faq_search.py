@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+⏱ Микро-бенчмарк поиска по FAQ.
+
+Строит индекс по нескольким тысячам синтетических вопросов и ответов,
+меряет время поиска произвольного вопроса (p50/p99) и время инкрементного
+обновления индекса после правки пары записей. Работает без Google и Telegram.
+
+Использование:
+    python bench_faq_search.py [кол-во записей] [кол-во запросов]
+"""
+
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from services.faq_cache import FaqEntry, FaqSnapshot
+from services.faq_search import FaqSearchIndex
+
+TOPICS = [
+    "занятие", "абонемент", "тренер", "оплата", "отмена", "перенос", "запись", "реформер",
+    "пилатес", "группа", "индивидуальное", "пробное", "студия", "расписание", "скидка",
+    "одежда", "носки", "коврик", "беременность", "спина", "колени", "новичок", "опоздание",
+    "парковка", "душ", "раздевалка", "подарочный", "сертификат", "заморозка", "продление",
+]
+VERBS = ["записаться", "отменить", "перенести", "оплатить", "продлить", "заморозить", "купить", "взять", "прийти"]
+FILLER = [
+    "можно", "ли", "как", "сколько", "стоит", "длится", "нужно", "если", "когда", "где",
+    "минут", "рублей", "дней", "до", "после", "начала", "через", "бот", "администратор",
+]
+
+QUERIES = [
+    "Как отменить запись на занятие?",
+    "сколько стоит абонемент на месяц",
+    "можно ли заморозить абонемент",
+    "что взять с собой на пилатес",
+    "занятия при беременности",
+    "опоздал на занятие что делать",
+    "где припарковаться у студии",
+    "подарочный сертификат купить",
+]
+
+
+SYLLABLES = ["ра", "зо", "ми", "ке", "ту", "ло", "вен", "стр", "ка", "пол", "ни", "да", "ре", "мо", "гу", "сти"]
+ENDINGS = ["а", "ы", "ой", "ение", "ами", "ать", "ил", "ная", "ого", "ях"]
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list:
+    """Псевдослова для "длинного хвоста" словаря настоящего FAQ."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(ENDINGS))
+    return sorted(words)
+
+
+def make_entries(count: int) -> list:
+    rng = random.Random(42)
+    rare = make_vocabulary(rng, count)
+    entries = []
+    for entry_id in range(1, count + 1):
+        topic = rng.sample(TOPICS, 2)
+        question = (
+            f"{rng.choice(FILLER).capitalize()} {rng.choice(VERBS)} {topic[0]} "
+            f"{rng.choice(rare)} {rng.choice(FILLER)} {topic[1]}?"
+        )
+        words = [rng.choice(rare) if rng.random() < 0.6 else rng.choice(TOPICS + FILLER + VERBS)
+                 for _ in range(rng.randint(15, 40))]
+        entries.append(FaqEntry(entry_id, question, " ".join(words) + "."))
+    return entries
+
+
+def main(count: int, queries: int) -> bool:
+    entries = make_entries(count)
+    index = FaqSearchIndex()
+
+    started = time.perf_counter()
+    index.apply(FaqSnapshot(1, entries))
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # Разные вопросы (промахи кэша ответов): поиск целиком по индексу
+    rng = random.Random(7)
+    cold = []
+    for i in range(queries):
+        query = f"{rng.choice(FILLER)} {rng.choice(VERBS)} {rng.choice(TOPICS)} {rng.choice(TOPICS)} {i}"
+        started = time.perf_counter()
+        index.search(query)
+        cold.append((time.perf_counter() - started) * 1_000_000)
+    cold.sort()
+
+    # Повторяющиеся вопросы
+    repeated = []
+    for i in range(queries):
+        started = time.perf_counter()
+        index.search(QUERIES[i % len(QUERIES)])
+        repeated.append((time.perf_counter() - started) * 1_000_000)
+    repeated.sort()
+
+    # Правка двух записей: переиндексируются только они
+    changed = list(entries)
+    changed[10] = FaqEntry(changed[10].id, changed[10].question, "Новый ответ про заморозку абонемента.")
+    changed[20] = FaqEntry(count + 1, "Есть ли душ в студии?", "Да, душ и раздевалка есть.")
+    before = index.reindexed
+    started = time.perf_counter()
+    index.apply(FaqSnapshot(2, changed), FaqSnapshot(1, entries))
+    update_ms = (time.perf_counter() - started) * 1000
+
+    print("=" * 70)
+    print(f"📋 Поиск по FAQ: {count} записей, {index.stats()['terms']} основ в индексе")
+    print("=" * 70)
+    print(f"   Построение индекса:      {build_ms:.1f} мс")
+    print(f"   Новый вопрос p50 / p99:  {statistics.median(cold):.0f} / {percentile(cold, 0.99):.0f} мкс")
+    print(f"   Повторный p50 / p99:     {statistics.median(repeated):.0f} / {percentile(repeated, 0.99):.0f} мкс")
+    print(f"   Инкрементное обновление: {update_ms:.2f} мс (переиндексировано записей: {index.reindexed - before})")
+    print("\n   Примеры:")
+    for query in QUERIES[:3]:
+        best = index.search(query, limit=1)
+        print(f"   «{query}» → {best[0][0].question if best else '—'}")
+
+    ok = statistics.median(cold) < 1000
+    print(f"\n{'✅' if ok else '❌'} Медиана поиска нового вопроса {'меньше' if ok else 'больше'} 1 мс")
+    return ok
+
+
+if __name__ == "__main__":
+    n_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    sys.exit(0 if main(n_entries, n_queries) else 1)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+⏱ Нагрузочный тест бронирования одного слота.
+
+Запускает сотни одновременных confirm_booking на один слот и проверяет,
+что мест выдано ровно столько, сколько было свободно, а локальный счётчик
+в slot_seats не ушёл в минус. Работает на временной SQLite-базе, без
+обращений к Google и Telegram.
+
+Использование:
+    python bench_seat_reservation.py [кол-во запросов] [мест в слоте]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from db.models import Base, Booking, SlotSeat
+from routers import booking as booking_router
+from services.reservations import ReservationEngine
+from services.schedule_index import SlotRecord
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class BenchState:
+    """Минимальная замена FSMContext: данные одного пользователя."""
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    async def get_data(self) -> dict:
+        return dict(self._data)
+
+    async def clear(self) -> None:
+        self._data = {}
+
+
+def make_callback(user_id: int, outcome: dict):
+    async def edit_text(text, **kwargs):
+        outcome[user_id] = text.startswith("✅")
+
+    async def answer(*args, **kwargs):
+        pass
+
+    return SimpleNamespace(
+        from_user=SimpleNamespace(id=user_id),
+        message=SimpleNamespace(edit_text=edit_text),
+        answer=answer,
+    )
+
+
+async def noop(*args, **kwargs):
+    return True
+
+
+async def run(requests: int, seats: int) -> bool:
+    tmp_dir = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_dir}/bench.db")
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    slot_date = date.today() + timedelta(days=1)
+    slot = SlotRecord(
+        row_index=2, trainer="Анна", date=slot_date, time="10:00",
+        free=seats, price=1000, lesson_type="",
+    )
+
+    async def get_slot(row_index):
+        return slot
+
+    # Внешние эффекты (Sheets, Calendar, Events) не участвуют в замере
+    booking_router.reservations = ReservationEngine(session_factory, noop)
+    booking_router.get_slot = get_slot
+    booking_router.sync_calendar_event = noop
+    booking_router.log_event_to_sheet = noop
+
+    outcome: dict = {}
+    latencies: list = []
+
+    async def one(user_id: int):
+        state = BenchState({
+            "trainer": slot.trainer, "date": "15 марта|пт", "time": slot.time,
+            "price": slot.price, "payment_type": "single",
+            "lesson_type": "group_single", "row_index": slot.row_index,
+        })
+        started = time.perf_counter()
+        # Как DbSessionMiddleware: своя сессия на каждое нажатие
+        async with session_factory() as session:
+            await booking_router.confirm_booking(make_callback(user_id, outcome), state, session)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(100000 + i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await booking_router.reservations.drain()
+
+    async with session_factory() as session:
+        booked = (await session.execute(select(func.count(Booking.id)))).scalar_one()
+        free_left = (await session.execute(
+            select(SlotSeat.free).where(SlotSeat.slot_key == slot.slot_key)
+        )).scalar_one()
+    await engine.dispose()
+
+    confirmed = sum(outcome.values())
+    latencies.sort()
+    print("=" * 70)
+    print(f"📋 {requests} одновременных confirm_booking на слот с {seats} местами")
+    print("=" * 70)
+    print(f"   Подтверждено:      {confirmed}")
+    print(f"   Отказано:          {requests - confirmed}")
+    print(f"   Записей в БД:      {booked}")
+    print(f"   Осталось мест:     {free_left}")
+    print(f"   Общее время:       {elapsed * 1000:.0f} мс ({requests / elapsed:.0f} запросов/с)")
+    print(f"   Задержка p50/p95:  {statistics.median(latencies):.1f} / "
+          f"{latencies[int(len(latencies) * 0.95) - 1]:.1f} мс")
+
+    ok = confirmed == seats and booked == seats and free_left == 0
+    print("\n" + ("✅ Пересадки нет: мест выдано ровно столько, сколько было" if ok else "❌ Счётчик мест разошёлся!"))
+    return ok
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_seats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.exit(0 if asyncio.run(run(n_requests, n_seats)) else 1)
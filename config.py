@@ -13,6 +13,21 @@ YOO_KASSA_SECRET_KEY: str = os.getenv("YOO_KASSA_SECRET_KEY", "")
 ADMIN_CHAT_ID: int = int(os.getenv("ADMIN_CHAT_ID", "0"))
 TIMEZONE: str = os.getenv("TIMEZONE", "Europe/Samara")
 
+# База данных SQLite: профиль настроек (wal / safe / legacy — см. db/database.py)
+DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///pilates_bot.db")
+DB_PROFILE: str = os.getenv("DB_PROFILE", "wal")
+# Сколько ждать блокировки записи (мс), кэш страниц на соединение (КиБ) и окно mmap (байт)
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+# Пул соединений aiosqlite: у каждого соединения свой поток, писатель в SQLite всё равно один.
+# Сессия апдейта (DbSessionMiddleware) держит соединение до конца хэндлера — запас на пики
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "15"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Сколько свободных страниц возвращать ОС за одно ночное обслуживание (0 — все)
+DB_VACUUM_PAGES: int = int(os.getenv("DB_VACUUM_PAGES", "0"))
+
 # Чаты тренеров
 TRAINER_CHAT_IDS = {
     "Екатерина": os.getenv("TRAINER_EKATERINA_CHAT_ID"),
@@ -20,4 +35,85 @@ TRAINER_CHAT_IDS = {
     "Ольга": os.getenv("TRAINER_OLGA_CHAT_ID"),
 }
 
+# Календари тренеров в Google Calendar (события о записях создаются в календаре тренера)
+TRAINER_CALENDAR_IDS = {
+    "Екатерина": os.getenv("TRAINER_EKATERINA_CALENDAR_ID", "c_ekaterina@example.com"),
+    "Анна": os.getenv("TRAINER_ANNA_CALENDAR_ID", "c_anna@example.com"),
+    "Ольга": os.getenv("TRAINER_OLGA_CALENDAR_ID", "c_olga@example.com"),
+}
+
 BOT_USERNAME = "@PilatesReformerIzh_bot"
+
+# Пул потоков для блокирующих вызовов Google API (Sheets, Calendar)
+GOOGLE_IO_WORKERS: int = int(os.getenv("GOOGLE_IO_WORKERS", "4"))
+GOOGLE_IO_MAX_QUEUE: int = int(os.getenv("GOOGLE_IO_MAX_QUEUE", "100"))
+GOOGLE_IO_TIMEOUT: float = float(os.getenv("GOOGLE_IO_TIMEOUT", "15"))
+
+# Поминутные квоты Google API (с запасом от лимитов проекта) и circuit breaker на 429/5xx
+SHEETS_QUOTA_PER_MINUTE: float = float(os.getenv("SHEETS_QUOTA_PER_MINUTE", "55"))
+DRIVE_QUOTA_PER_MINUTE: float = float(os.getenv("DRIVE_QUOTA_PER_MINUTE", "60"))
+CALENDAR_QUOTA_PER_MINUTE: float = float(os.getenv("CALENDAR_QUOTA_PER_MINUTE", "120"))
+GOOGLE_BREAKER_FAILURES: int = int(os.getenv("GOOGLE_BREAKER_FAILURES", "5"))
+GOOGLE_BREAKER_RESET: float = float(os.getenv("GOOGLE_BREAKER_RESET", "30"))
+
+# Сколько секунд снимок листа Schedule считается свежим
+SCHEDULE_CACHE_TTL: float = float(os.getenv("SCHEDULE_CACHE_TTL", "60"))
+
+# Как часто (в секундах) опрашивается ревизия таблицы в Drive: листы перечитываются только при её смене
+SHEET_POLL_INTERVAL: float = float(os.getenv("SHEET_POLL_INTERVAL", "10"))
+
+# Полная сверка зеркала schedule_slots и кэша FAQ с таблицей (страховка, если опрос ревизии не работает)
+SCHEDULE_SYNC_INTERVAL: float = float(os.getenv("SCHEDULE_SYNC_INTERVAL", "600"))
+
+# Окно дат (дней вперёд), которое читается из листа Schedule, и через сколько дней прошедшие слоты уходят в архив
+SCHEDULE_WINDOW_DAYS: int = int(os.getenv("SCHEDULE_WINDOW_DAYS", "31"))
+SCHEDULE_ARCHIVE_AFTER_DAYS: int = int(os.getenv("SCHEDULE_ARCHIVE_AFTER_DAYS", "7"))
+
+# Пакетная запись в лист Events
+EVENTS_BATCH_SIZE: int = int(os.getenv("EVENTS_BATCH_SIZE", "50"))
+EVENTS_FLUSH_INTERVAL: float = float(os.getenv("EVENTS_FLUSH_INTERVAL", "5"))
+EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "2000"))
+
+# Окно (в секундах), в течение которого изменения одной строки Schedule сливаются в один batch_update
+SLOT_WRITE_MERGE_WINDOW: float = float(os.getenv("SLOT_WRITE_MERGE_WINDOW", "0.3"))
+
+# Хранилище таблицы: "google" — настоящий Google Sheets, "fake" — таблица в памяти (бенчмарки и тесты без сети)
+SHEETS_BACKEND: str = os.getenv("SHEETS_BACKEND", "google")
+FAKE_SHEETS_LATENCY: float = float(os.getenv("FAKE_SHEETS_LATENCY", "0.05"))
+FAKE_SHEETS_ERROR_RATE: float = float(os.getenv("FAKE_SHEETS_ERROR_RATE", "0"))
+FAKE_SHEETS_QUOTA_PER_MINUTE: int = int(os.getenv("FAKE_SHEETS_QUOTA_PER_MINUTE", "60"))
+
+# Префикс id событий броней в Google Calendar (только цифры и латиница a-v): id события = префикс + id брони
+CALENDAR_EVENT_ID_PREFIX: str = os.getenv("CALENDAR_EVENT_ID_PREFIX", "pilates")
+# Сколько операций с событиями Google Calendar уходит одним batch-запросом
+CALENDAR_BATCH_SIZE: int = int(os.getenv("CALENDAR_BATCH_SIZE", "50"))
+
+# Outbox внешних действий по брони: опрос таблицы (сек), окно сбора пачки после новой брони (сек),
+# число попыток и экспоненциальная задержка между ними (от OUTBOX_RETRY_BASE до OUTBOX_RETRY_MAX сек)
+OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_BATCH_WINDOW: float = float(os.getenv("OUTBOX_BATCH_WINDOW", "0.5"))
+OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE: float = float(os.getenv("OUTBOX_RETRY_BASE", "5"))
+OUTBOX_RETRY_MAX: float = float(os.getenv("OUTBOX_RETRY_MAX", "900"))
+# Аренда доставки (сек): сообщение в статусе sending дольше этого срока (результат доставки не
+# удалось записать) возвращается в очередь без рестарта бота
+OUTBOX_SENDING_LEASE: float = float(os.getenv("OUTBOX_SENDING_LEASE", "300"))
+
+# Занятость тренеров из Google Calendar (freebusy): ближайшие дни обновляются часто, всё окно расписания — реже
+FREEBUSY_REFRESH_INTERVAL: float = float(os.getenv("FREEBUSY_REFRESH_INTERVAL", "300"))
+FREEBUSY_NEAR_DAYS: int = int(os.getenv("FREEBUSY_NEAR_DAYS", "2"))
+FREEBUSY_FULL_REFRESH_INTERVAL: float = float(os.getenv("FREEBUSY_FULL_REFRESH_INTERVAL", "3600"))
+
+# Напоминания о занятиях: как часто (сек) проверять брони и сколько сообщений отправлять за секунду
+REMINDER_SWEEP_INTERVAL: float = float(os.getenv("REMINDER_SWEEP_INTERVAL", "60"))
+REMINDER_BATCH_SIZE: int = int(os.getenv("REMINDER_BATCH_SIZE", "25"))
+
+# Рассылки в Telegram: сообщений в секунду на весь бот (лимит Telegram — около 30),
+# одновременных отправок, получателей в пачке (итоги пачки пишутся в БД разом) и попыток на сообщение
+BROADCAST_RATE: float = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_BATCH_SIZE: int = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))
+BROADCAST_MAX_ATTEMPTS: int = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "3"))
+
+# Активность пользователей копится в памяти и пишется в users.last_activity раз в N секунд
+ACTIVITY_FLUSH_INTERVAL: float = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "60"))
@@ -1,4 +1,5 @@
 from .database import engine, AsyncSessionLocal, init_db
-from .models import Base, User, Booking, Subscription
+from .models import Base, User, Booking, Subscription, SlotSeat, ScheduleSlot, OutboxMessage, BroadcastJob, BroadcastDelivery
 
-__all__ = ["engine", "AsyncSessionLocal", "init_db", "Base", "User", "Booking", "Subscription"]
+__all__ = ["engine", "AsyncSessionLocal", "init_db", "Base", "User", "Booking", "Subscription", "SlotSeat", "ScheduleSlot", "OutboxMessage",
+           "BroadcastJob", "BroadcastDelivery"]
@@ -1,18 +1,118 @@
 import logging
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import (
+    DATABASE_URL, DB_PROFILE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_VACUUM_PAGES,
+)
 from .models import Base
 
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = "sqlite+aiosqlite:///pilates_bot.db"
+# Профили SQLite. "wal": читатели не ждут писателя, fsync только на чекпоинтах —
+# при сбое питания теряется не больше последних транзакций, но БД не портится.
+# "safe": WAL с fsync на каждый коммит. "legacy": настройки SQLite по умолчанию
+# (rollback journal) — для сравнения и отката.
+PROFILES: Dict[str, List[Tuple[str, str]]] = {
+    "wal": [
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("temp_store", "MEMORY"),
+    ],
+    "safe": [
+        ("journal_mode", "WAL"),
+        ("synchronous", "FULL"),
+    ],
+    "legacy": [],
+}
+
+
+def _pragmas(profile: str) -> List[Tuple[str, str]]:
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный DB_PROFILE: {profile!r} (допустимо: {', '.join(PROFILES)})")
+    if profile == "legacy":
+        return []
+    return PROFILES[profile] + [
+        ("busy_timeout", str(SQLITE_BUSY_TIMEOUT_MS)),
+        ("cache_size", str(-SQLITE_CACHE_SIZE_KB)),  # отрицательное значение — в КиБ, а не в страницах
+        ("mmap_size", str(SQLITE_MMAP_SIZE)),
+        # Действует только для новой БД; существующую переводит scripts/migrate_add_columns.py
+        ("auto_vacuum", "INCREMENTAL"),
+    ]
+
+
+PRAGMAS = _pragmas(DB_PROFILE)
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# У aiosqlite по умолчанию NullPool: каждая сессия открывала файл, поднимала поток
+# и заново читала схему. Пул держит соединения (и их кэш страниц) между сессиями
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    # Соединения с файлом SQLite не рвутся — проверка перед выдачей не нужна
+    pool_pre_ping=False,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@event.listens_for(engine.sync_engine, "connect")
+def _apply_pragmas(dbapi_connection, connection_record) -> None:
+    """PRAGMA действуют на соединение, поэтому задаются каждому новому соединению пула."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
 async def init_db() -> None:
     """Создаёт таблицы при первом запуске"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    logger.info("База данных инициализирована (SQLite)")
+        journal = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+    logger.info(f"База данных инициализирована (SQLite, профиль {DB_PROFILE}, journal_mode={journal})")
+
+
+async def run_maintenance() -> Dict[str, float]:
+    """
+    Обслуживание БД: статистика для планировщика запросов (ANALYZE, PRAGMA optimize),
+    возврат свободных страниц (incremental_vacuum) и усечение WAL.
+
+    Returns:
+        Время каждого шага в миллисекундах плюс освобождённые страницы
+    """
+    steps = [
+        ("analyze", "ANALYZE"),
+        ("optimize", "PRAGMA optimize"),
+        ("incremental_vacuum", f"PRAGMA incremental_vacuum({DB_VACUUM_PAGES})"),
+        ("wal_checkpoint", "PRAGMA wal_checkpoint(TRUNCATE)"),
+    ]
+    timings: Dict[str, float] = {}
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        auto_vacuum = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        free_before = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+        for name, sql in steps:
+            if name == "incremental_vacuum" and auto_vacuum != 2:
+                logger.warning("Обслуживание БД: auto_vacuum не INCREMENTAL, запустите scripts/migrate_add_columns.py")
+                continue
+            started = time.perf_counter()
+            result = await conn.exec_driver_sql(sql)
+            if result.returns_rows:
+                result.fetchall()  # incremental_vacuum освобождает страницы по мере чтения результата
+            timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        free_after = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+    timings["pages_freed"] = free_before - free_after
+    logger.info(f"Обслуживание БД: {timings}")
+    return timings
@@ -1,13 +1,34 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Float, Boolean,
-    ForeignKey, Text, JSON
+    Column, Integer, String, DateTime, Date, Float, Boolean,
+    ForeignKey, Text, JSON, Index, text
 )
 from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.types import TypeDecorator
 
 Base = declarative_base()
 
 
+class UtcDateTime(TypeDecorator):
+    """
+    Момент времени: принимает aware datetime, хранит naive UTC (SQLite не
+    хранит смещение), отдаёт aware UTC. Строки в БД сравниваются
+    лексикографически, поэтому диапазонные запросы идут по индексу.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            if value.tzinfo is None:
+                raise ValueError("UtcDateTime ожидает aware datetime")
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return value.replace(tzinfo=timezone.utc) if value is not None else None
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -18,10 +39,16 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_activity = Column(DateTime, default=datetime.utcnow)
     last_inactivity_message_sent = Column(DateTime, nullable=True)  # Когда последний раз отправили напоминание о неактивности
+    is_blocked = Column(Boolean, default=False)          # заблокировал бота — рассылки его пропускают
 
     bookings = relationship("Booking", back_populates="user")
     subscriptions = relationship("Subscription", back_populates="user")
 
+    __table_args__ = (
+        # check_inactive_users: давно не активные, кому ещё не напоминали
+        Index("ix_users_inactivity", "last_activity", "last_inactivity_message_sent"),
+    )
+
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -38,9 +65,21 @@ class Booking(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     reminder_12_sent = Column(Boolean, default=False)   # 12 hours before
     reminder_2_sent = Column(Boolean, default=False)    # 2 hours before
+    slot_key = Column(String(100), nullable=True)       # ключ слота в slot_seats (для возврата места)
+    calendar_event_id = Column(String(64), nullable=True)  # id события в календаре тренера (после первой синхронизации)
+    lesson_start = Column(UtcDateTime, nullable=True)   # начало занятия (UTC); date/time — для показа
 
     user = relationship("User", back_populates="bookings")
 
+    __table_args__ = (
+        # Диапазоны по времени занятия (сегодня, неделя, сверка календаря) и проход по напоминаниям
+        Index("ix_bookings_lesson_start_reminders", "lesson_start", "reminder_12_sent", "reminder_2_sent"),
+        # «Мои занятия» (по времени, без сортировки в памяти) и «кто записывался» для рассылки тренера
+        Index("ix_bookings_user_lesson_start", "user_id", "lesson_start"),
+        # Неделя тренера
+        Index("ix_bookings_trainer_lesson_start", "trainer", "lesson_start"),
+    )
+
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
@@ -53,3 +92,94 @@ class Subscription(Base):
     expires_at = Column(DateTime, nullable=True)         # purchased_at + 30 дней
 
     user = relationship("User", back_populates="subscriptions")
+
+    __table_args__ = (
+        # Абонементы пользователя и проверка «есть ли занятия в абонементе»
+        Index("ix_subscriptions_user_left", "user_id", "classes_left"),
+    )
+
+
+class SlotSeat(Base):
+    """Локальный счётчик свободных мест слота — источник правды для бронирований."""
+    __tablename__ = "slot_seats"
+
+    id = Column(Integer, primary_key=True)
+    slot_key = Column(String(100), unique=True, nullable=False)  # "Анна|2025-03-15|10:00|0"
+    row_index = Column(Integer, nullable=False)         # строка в листе Schedule
+    free = Column(Integer, nullable=False)              # свободно по локальному учёту
+    synced_free = Column(Integer, nullable=True)        # последнее значение, записанное в Sheets
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ScheduleSlot(Base):
+    """Локальное зеркало листа Schedule: чтения слотов идут отсюда, а не из Google."""
+    __tablename__ = "schedule_slots"
+
+    id = Column(Integer, primary_key=True)
+    slot_key = Column(String(100), unique=True, nullable=False)  # как в SlotSeat
+    row_index = Column(Integer, nullable=False)
+    trainer = Column(String(50), nullable=False)
+    slot_date = Column(Date, nullable=False)
+    time = Column(String(5), nullable=False)
+    free = Column(Integer, nullable=False, default=0)
+    price = Column(Integer, nullable=False, default=0)
+    lesson_type = Column(String(20), nullable=False, default="")  # "" — тип ещё не задан
+    synced_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_schedule_slots_date_trainer", "slot_date", "trainer"),
+        # Точечное обновление строки после правки листа (update_slot)
+        Index("ix_schedule_slots_row_index", "row_index"),
+    )
+
+
+class OutboxMessage(Base):
+    """Внешнее действие по брони (Sheets, Calendar, Events), записанное в одной транзакции с ней."""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    target = Column(String(20), nullable=False)         # seat / calendar / events
+    payload = Column(JSON, nullable=False)
+    dedup_key = Column(String(150), nullable=True)      # одинаковые ждущие сообщения схлопываются
+    status = Column(String(10), nullable=False, default="pending")  # pending, sending, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_outbox_due", "status", "next_attempt_at"),
+        Index("ux_outbox_dedup_pending", "dedup_key", unique=True, sqlite_where=text("status = 'pending'")),
+    )
+
+
+class BroadcastJob(Base):
+    """Рассылка: текст, кому отчитаться и итоги. Получатели — в broadcast_deliveries."""
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(30), nullable=False)           # trainer_reminder, inactive_users
+    text = Column(Text, nullable=False)
+    requested_by = Column(Integer, nullable=True)       # telegram_id, кому прислать отчёт
+    status = Column(String(10), nullable=False, default="running")  # running, done
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class BroadcastDelivery(Base):
+    """Один получатель рассылки: по этим строкам рассылка продолжается после рестарта."""
+    __tablename__ = "broadcast_deliveries"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id"), nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    status = Column(String(10), nullable=False, default="pending")  # pending, sent, failed, blocked
+    error = Column(String(200), nullable=True)
+
+    __table_args__ = (
+        Index("ix_broadcast_deliveries_job_status", "job_id", "status"),
+    )
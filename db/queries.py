@@ -0,0 +1,144 @@
+"""
+Горячие запросы к БД.
+
+Запросы, которые выполняются на каждое нажатие или в каждом проходе фоновых
+задач, собраны здесь: хэндлеры и сервисы берут их отсюда, а
+test_query_plans.py проверяет их планы (EXPLAIN QUERY PLAN) — каждый должен
+идти по индексу из db/models.py, без перебора таблицы и сортировки в памяти.
+Меняя запрос, проверьте, что тест проходит; новый горячий запрос добавьте и
+сюда, и в тест.
+"""
+
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import Select, Update, func, select, update
+from sqlalchemy.orm import selectinload
+
+from db.models import Booking, BroadcastDelivery, OutboxMessage, ScheduleSlot, SlotSeat, Subscription, User
+
+
+# Закрытые брони: повторная отмена не должна второй раз вернуть место или занятие
+CLOSED_STATUSES = ("cancelled", "late_cancel", "done")
+
+
+# ——— Пользователи и брони (хэндлеры) ———
+
+def user_by_telegram_id(telegram_id: int) -> Select:
+    return select(User).where(User.telegram_id == telegram_id)
+
+
+def user_bookings(user_id: int) -> Select:
+    """Брони пользователя, новые первыми."""
+    return select(Booking).where(Booking.user_id == user_id).order_by(Booking.lesson_start.desc())
+
+
+def user_subscriptions(user_id: int) -> Select:
+    return select(Subscription).where(Subscription.user_id == user_id)
+
+
+def active_subscription(user_id: int) -> Select:
+    """Абонемент с оставшимися занятиями."""
+    return select(Subscription).where((Subscription.user_id == user_id) & (Subscription.classes_left > 0))
+
+
+def close_booking(booking_id: int, status: str, expected: Optional[str] = None) -> Update:
+    """
+    Переводит бронь в status, только если она ещё не закрыта (или, если задан
+    expected, только из статуса expected). Условный UPDATE атомарен: из двух
+    одновременных отмен rowcount == 1 получит только одна.
+    """
+    current = Booking.status.not_in(CLOSED_STATUSES) if expected is None else Booking.status == expected
+    return update(Booking).where(Booking.id == booking_id, current).values(status=status)
+
+
+def day_bookings(start: datetime, end: datetime) -> Select:
+    """Неотменённые брони с началом в [start, end) по времени начала."""
+    return select(Booking).where(
+        (Booking.lesson_start >= start) &
+        (Booking.lesson_start < end) &
+        (Booking.status != "cancelled")
+    ).order_by(Booking.lesson_start)
+
+
+def trainer_bookings(trainer: str, start: datetime, end: datetime) -> Select:
+    """Действующие брони тренера с началом в [start, end) вместе с клиентами."""
+    return (
+        select(Booking)
+        .options(selectinload(Booking.user))
+        .where(
+            (Booking.trainer == trainer) &
+            (Booking.lesson_start >= start) &
+            (Booking.lesson_start < end) &
+            (Booking.status.not_in(("cancelled", "late_cancel")))
+        )
+        .order_by(Booking.lesson_start)
+    )
+
+
+# ——— Фоновые задачи ———
+
+def reminder_candidates(start: datetime, end: datetime, skip_statuses: Iterable[str]) -> Select:
+    """Брони с началом в (start, end] и хотя бы одним неотправленным напоминанием."""
+    return select(
+        Booking.id, Booking.user_id, Booking.lesson_start, Booking.created_at,
+        Booking.reminder_12_sent, Booking.reminder_2_sent,
+    ).where(
+        Booking.lesson_start > start,
+        Booking.lesson_start <= end,
+        (Booking.reminder_12_sent.is_not(True)) | (Booking.reminder_2_sent.is_not(True)),
+        Booking.status.not_in(tuple(skip_statuses)),
+    )
+
+
+def inactive_users(cutoff: datetime) -> Select:
+    """Неактивные с cutoff, без напоминания о неактивности после cutoff и не заблокировавшие бота."""
+    return select(User.telegram_id).where(
+        (User.last_activity < cutoff) &
+        ((User.last_inactivity_message_sent == None) |  # noqa: E711
+         (User.last_inactivity_message_sent < cutoff)) &
+        (User.is_blocked.is_not(True))
+    )
+
+
+def bookings_between(start: datetime, end: datetime) -> Select:
+    """Все брони с началом в [start, end) (сверка с календарём)."""
+    return select(Booking).where(Booking.lesson_start >= start, Booking.lesson_start < end)
+
+
+def schedule_slots_since(since: date) -> Select:
+    """Слоты зеркала Schedule с даты since; места — из учёта slot_seats, если он есть."""
+    return (
+        select(ScheduleSlot, func.coalesce(SlotSeat.free, ScheduleSlot.free))
+        .outerjoin(SlotSeat, SlotSeat.slot_key == ScheduleSlot.slot_key)
+        .where(ScheduleSlot.slot_date >= since)
+    )
+
+
+def update_schedule_row(row_index: int, **values) -> Update:
+    return update(ScheduleSlot).where(ScheduleSlot.row_index == row_index).values(**values)
+
+
+def slot_free(slot_key: str) -> Select:
+    return select(SlotSeat.free).where(SlotSeat.slot_key == slot_key)
+
+
+def due_outbox(now: datetime, limit: int) -> Select:
+    """Готовые к отправке сообщения outbox в порядке индекса ix_outbox_due — без сортировки в памяти."""
+    return (
+        select(OutboxMessage.id, OutboxMessage.target, OutboxMessage.payload,
+               OutboxMessage.dedup_key, OutboxMessage.attempts)
+        .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+        .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+        .limit(limit)
+    )
+
+
+def pending_deliveries(job_id: int, limit: int) -> Select:
+    """Следующая пачка получателей рассылки."""
+    return (
+        select(BroadcastDelivery.id, BroadcastDelivery.chat_id)
+        .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status == "pending")
+        .order_by(BroadcastDelivery.id)
+        .limit(limit)
+    )
@@ -0,0 +1,21 @@
+from typing import Iterable
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from services.faq_cache import FaqEntry
+
+
+def faq_keyboard(entries: Iterable[FaqEntry]) -> InlineKeyboardMarkup:
+    """Список вопросов: в callback_data только id, чтобы не упираться в лимит 64 байта."""
+    builder = InlineKeyboardBuilder()
+    for entry in entries:
+        builder.row(InlineKeyboardButton(text=entry.question, callback_data=f"faq_{entry.id}"))
+    builder.row(InlineKeyboardButton(text="◀️ В меню", callback_data="back_to_menu"))
+    return builder.as_markup()
+
+
+def faq_answer_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="◀️ Назад к FAQ", callback_data="back_to_faq")]
+    ])
@@ -6,7 +6,8 @@ from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 from config import TELEGRAM_BOT_TOKEN, ADMIN_CHAT_ID
-from db.database import init_db
+from db.database import AsyncSessionLocal, init_db
+from middlewares import DbSessionMiddleware
 from routers import (
     start,
     booking,
@@ -17,7 +18,17 @@ from routers import (
     admin,
     trainer,
     cancellation,
+    faq_search,
 )
+from services.activity import activity
+from services.broadcast import broadcasts
+from services.google_calendar import calendar_configured, trainer_busy
+from services.google_executor import google_io
+from services.google_sheets import (
+    sheets_client, event_sink, schedule_mirror, sheet_watcher, start_sheet_sync, stop_sheet_sync,
+)
+from services.outbox import outbox
+from services.reservations import reservations
 from services.scheduler import setup_scheduler
 from utils.logging_config import setup_logging
 
@@ -31,12 +42,41 @@ async def on_startup(bot: Bot) -> None:
     """Действия при старте бота"""
     await init_db()
     await setup_scheduler(bot)
+    sheets_client.start_token_refresher()
+    event_sink.start()
+    outbox.start()
+    broadcasts.start(bot)
+    activity.start()
+    if calendar_configured():
+        trainer_busy.start()
+    start_sheet_sync()
 
     welcome_msg = "🤖 <b>Бот Pilates Reformer успешно запущен!</b>"
     await bot.send_message(ADMIN_CHAT_ID, welcome_msg, parse_mode=ParseMode.HTML)
     logger.info("Бот запущен и готов к работе")
 
 
+async def on_shutdown(bot: Bot) -> None:
+    """Действия при остановке бота"""
+    await reservations.drain()
+    await outbox.stop()
+    await broadcasts.stop()
+    await activity.stop()
+    await stop_sheet_sync()
+    await event_sink.stop()
+    await trainer_busy.stop()
+    await sheets_client.stop_token_refresher()
+    google_io.shutdown()
+    logger.info(f"Google I/O: {google_io.stats()}")
+    logger.info(f"Зеркало Schedule: {schedule_mirror.stats()}")
+    logger.info(f"Ревизии таблицы: {sheet_watcher.stats()}")
+    logger.info(f"Outbox: {await outbox.stats()}")
+    logger.info(f"Рассылки: {await broadcasts.stats()}")
+    logger.info(f"Активность пользователей: {activity.stats()}")
+    logger.info(f"Занятость тренеров: {trainer_busy.stats()}")
+    logger.info("Бот остановлен")
+
+
 async def main() -> None:
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN не указан в .env!")
@@ -48,6 +88,9 @@ async def main() -> None:
     )
     dp = Dispatcher()
 
+    # Одна сессия БД на апдейт: хэндлеры получают её аргументом session
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+
     # Подключаем роутеры
     dp.include_router(start.router)
     dp.include_router(booking.router)
@@ -58,9 +101,11 @@ async def main() -> None:
     dp.include_router(feedback.router)
     dp.include_router(faq.router)
     dp.include_router(admin.router)
+    dp.include_router(faq_search.router)  # Последним: ответ по FAQ на любой необработанный текст
 
     # Запуск планировщика и уведомление админа
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     logger.info("Запуск бота в режиме polling...")
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
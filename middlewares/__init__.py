@@ -0,0 +1,3 @@
+from .db_session import DbSessionMiddleware
+
+__all__ = ["DbSessionMiddleware"]
@@ -0,0 +1,47 @@
+"""
+Одна сессия БД на апдейт.
+
+Раньше одно нажатие «Записаться» открывало несколько AsyncSessionLocal():
+отдельно update_user_activity, отдельно хэндлер, и каждая со своим коммитом
+и своим соединением из пула. DbSessionMiddleware открывает сессию на весь
+апдейт и передаёт её хэндлеру аргументом session; хелперы принимают ту же
+сессию и не коммитят сами. Незакоммиченное хэндлером коммитится после
+него; при исключении транзакция откатывается. Сессия ленивая: апдейт, который не трогает БД,
+не берёт соединение из пула.
+
+Итоговый коммит выполняется уже после ответа хэндлера, а ответы в
+Telegram и запросы к Google идут по сети сотни миллисекунд. Поэтому правило
+для хэндлеров: закоммитить до первого внешнего вызова после записи в БД.
+Иначе блокировка записи SQLite держится всё это время, и остальные
+апдейты ждут её. Хэндлеры, которые только читают, тоже коммитят после
+последнего запроса: так соединение возвращается в пул до ответа
+пользователю. После такого коммита итоговый ничего не делает, а объекты
+остаются доступны (expire_on_commit=False). Внешние действия, которые
+должны пройти вместе с транзакцией (Sheets, Calendar), ставятся в outbox до
+коммита, а outbox.wake() вызывается после него.
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Outer-middleware для dp.update: session в данных хэндлера, коммит в конце апдейта."""
+
+    def __init__(self, session_factory: Callable):
+        self._session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self._session_factory() as session:
+            data["session"] = session
+            result = await handler(event, data)
+            if session.in_transaction():
+                await session.commit()
+            return result
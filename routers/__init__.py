@@ -6,6 +6,7 @@ from .profile import router as profile_router
 from .feedback import router as feedback_router
 from .faq import router as faq_router
 from .admin import router as admin_router
+from .faq_search import router as faq_search_router
 
 __all__ = [
     "start_router",
@@ -16,4 +17,5 @@ __all__ = [
     "feedback_router",
     "faq_router",
     "admin_router",
+    "faq_search_router",
 ]
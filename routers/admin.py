@@ -9,7 +9,9 @@
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+
+import pytz
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -17,12 +19,16 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from db.models import Booking, Subscription, User
-from db.database import AsyncSessionLocal
+from db.queries import close_booking, day_bookings
 from keyboards.main_menu import get_main_menu
+from services.google_calendar import sync_calendar_event
 from services.google_sheets import log_event_to_sheet, update_free_slots
-from config import ADMIN_CHAT_ID
+from services.outbox import outbox
+from services.reservations import reservations, enqueue_seat_push
+from config import ADMIN_CHAT_ID, TIMEZONE
+from utils.constants import MONTHS_RU
 from utils.helpers import hours_to_lesson
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 router = Router(name="admin_router")
@@ -70,7 +76,7 @@ async def admin_panel(message: Message):
 
 
 @router.callback_query(F.data == "admin_today_bookings")
-async def show_today_bookings(callback: CallbackQuery):
+async def show_today_bookings(callback: CallbackQuery, session: AsyncSession):
     """Показывает все бронирования на сегодня с кнопками управления (Шаг 6.3)"""
     telegram_id = callback.from_user.id
     
@@ -78,17 +84,15 @@ async def show_today_bookings(callback: CallbackQuery):
         await callback.answer("❌ Доступ запрещён", show_alert=True)
         return
     
-    today_str = datetime.now().strftime("%d %B %Y")
-    
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Booking).where(
-                (Booking.date == today_str) &
-                (Booking.status != "cancelled")
-            ).order_by(Booking.time)
-        )
-        bookings = result.scalars().all()
+    tz = pytz.timezone(TIMEZONE)
+    day_start = tz.localize(datetime.combine(datetime.now(tz=tz).date(), time.min))
+    day_end = tz.localize(datetime.combine(day_start.date() + timedelta(days=1), time.min))
+    today_str = f"{day_start.day} {MONTHS_RU[day_start.month]}"
     
+    result = await session.execute(day_bookings(day_start, day_end))
+    bookings = result.scalars().all()
+    await session.commit()  # отдаём соединение в пул до запросов к Telegram
+
     if not bookings:
         await callback.message.edit_text(
             "📅 <b>Занятия на сегодня</b>\n\n"
@@ -134,7 +138,7 @@ async def show_today_bookings(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_booking_actions_"))
-async def show_booking_actions(callback: CallbackQuery):
+async def show_booking_actions(callback: CallbackQuery, session: AsyncSession):
     """Показывает действия для бронирования (Шаг 7.1-7.2)"""
     try:
         booking_id = int(callback.data.split("_")[3])
@@ -142,14 +146,14 @@ async def show_booking_actions(callback: CallbackQuery):
         await callback.answer("❌ Ошибка", show_alert=True)
         return
     
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        if not booking:
-            await callback.answer("❌ Бронирование не найдено", show_alert=True)
-            return
-        
-        hours = hours_to_lesson(booking)
-    
+    booking = await session.get(Booking, booking_id)
+    await session.commit()  # отдаём соединение в пул до запросов к Telegram
+    if not booking:
+        await callback.answer("❌ Бронирование не найдено", show_alert=True)
+        return
+
+    hours = hours_to_lesson(booking)
+
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(
@@ -183,7 +187,7 @@ async def show_booking_actions(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_no_penalty_cancel_"))
-async def admin_cancel_no_penalty(callback: CallbackQuery):
+async def admin_cancel_no_penalty(callback: CallbackQuery, session: AsyncSession):
     """Admin override: отмена БЕЗ списания занятия (Шаг 7.2)"""
     try:
         booking_id = int(callback.data.split("_")[4])
@@ -193,23 +197,41 @@ async def admin_cancel_no_penalty(callback: CallbackQuery):
     
     admin_id = callback.from_user.id
     
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        if not booking:
-            await callback.answer("❌ Бронирование не найдено", show_alert=True)
-            return
-        
-        # Сохраняем информацию для логирования
-        user_id = booking.user_id
-        lesson_type = booking.lesson_type
-        
-        # ✅ ОТМЕНА БЕЗ ПОТЕРЬ (OVERRIDE)
-        booking.status = "cancelled"
-        await session.commit()
-        
-        # ❌ ВАЖНО: Не списываем абонемент при override!
-        # (Тогда как обычная отмена > 10 часов вернула бы занятие)
-    
+    booking = await session.get(Booking, booking_id)
+    if not booking:
+        await callback.answer("❌ Бронирование не найдено", show_alert=True)
+        return
+
+    if booking.status in ("cancelled", "done"):
+        await callback.answer("ℹ️ Бронирование уже отменено или завершено", show_alert=True)
+        return
+
+    # Сохраняем информацию для логирования
+    user_id = booking.user_id
+    lesson_type = booking.lesson_type
+    # Поздняя отмена по абонементу место уже вернула; разовая — нет (slot-logic-update.md п.4.2)
+    holds_seat = bool(booking.slot_key) and not (
+        booking.status == "late_cancel" and lesson_type == "group_subscription"
+    )
+
+    # ✅ ОТМЕНА БЕЗ ПОТЕРЬ (OVERRIDE): переводим из прочитанного статуса — параллельная
+    # отмена клиентом или повторное нажатие не вернут место второй раз
+    result = await session.execute(close_booking(booking_id, "cancelled", expected=booking.status))
+    if result.rowcount != 1:
+        await session.rollback()
+        await callback.answer("ℹ️ Бронирование уже изменилось — обновите список", show_alert=True)
+        return
+    # Учёт мест slot_seats — источник правды: место возвращаем в той же транзакции, в Sheets — через outbox
+    if holds_seat:
+        await reservations.release(booking.slot_key, push=False, session=session)
+        await enqueue_seat_push(session, booking.slot_key)
+    await sync_calendar_event(booking_id, session)
+    await session.commit()
+    outbox.wake()
+
+    # ❌ ВАЖНО: Не списываем абонемент при override!
+    # (Тогда как обычная отмена > 10 часов вернула бы занятие)
+
     # Логируем override действие
     await log_event_to_sheet(
         admin_id,
@@ -232,7 +254,7 @@ async def admin_cancel_no_penalty(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_mark_done_"))
-async def admin_mark_done(callback: CallbackQuery):
+async def admin_mark_done(callback: CallbackQuery, session: AsyncSession):
     """Отметить бронирование как выполненное"""
     try:
         booking_id = int(callback.data.split("_")[3])
@@ -242,15 +264,14 @@ async def admin_mark_done(callback: CallbackQuery):
     
     admin_id = callback.from_user.id
     
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        if not booking:
-            await callback.answer("❌ Бронирование не найдено", show_alert=True)
-            return
-        
-        booking.status = "done"
-        await session.commit()
-    
+    booking = await session.get(Booking, booking_id)
+    if not booking:
+        await callback.answer("❌ Бронирование не найдено", show_alert=True)
+        return
+
+    booking.status = "done"
+    await session.commit()
+
     await log_event_to_sheet(
         admin_id,
         f"admin_mark_done: booking_id={booking_id} (отмечено как выполненное)"
@@ -6,8 +6,8 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from db.models import User, Booking, Subscription
-from db.database import AsyncSessionLocal
+from db.models import User, Booking
+from db.queries import active_subscription, user_subscriptions
 from keyboards.booking import (
     trainers_keyboard, dates_keyboard, times_keyboard,
     payment_type_keyboard, confirm_booking_keyboard
@@ -15,13 +15,16 @@ from keyboards.booking import (
 from keyboards.lesson_type import lesson_type_keyboard
 from services.google_sheets import (
     get_available_trainers, get_available_dates, get_available_times,
-    log_event_to_sheet, update_free_slots, get_lesson_type_from_sheet, update_lesson_type
+    log_event_to_sheet, get_slot, enqueue_event, sheet_configured
 )
-from services.google_calendar import create_calendar_event
+from services.google_calendar import sync_calendar_event
+from services.outbox import outbox
+from services.reservations import reservations, enqueue_seat_push
 from services.yookassa import create_payment_link
 from utils.constants import LESSON_TYPES, SBP_PHONE, PAYMENT_MESSAGE
-from utils.helpers import hours_to_lesson, update_user_activity
-from sqlalchemy import select
+from services.schedule_index import resolve_day_month
+from utils.helpers import hours_to_lesson, lesson_start_at, update_user_activity
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 router = Router(name="booking_router")
@@ -43,7 +46,7 @@ async def start_booking(message: Message, state: FSMContext):
     user_id = message.from_user.id
     
     # Обновляем активность пользователя
-    await update_user_activity(user_id)
+    update_user_activity(user_id)
     
     await state.set_state(BookingStates.choosing_lesson_type)
     await state.update_data(bookings=[])
@@ -58,7 +61,7 @@ async def start_booking(message: Message, state: FSMContext):
 
 # ——— Выбор типа занятия ———
 @router.callback_query(BookingStates.choosing_lesson_type, F.data.startswith("lesson_"))
-async def choose_lesson_type(callback: CallbackQuery, state: FSMContext):
+async def choose_lesson_type(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработчик выбора типа занятия."""
     lesson_type = callback.data.split("_", 1)[1]  # trial, group_single, group_subscription, individual
     
@@ -68,14 +71,8 @@ async def choose_lesson_type(callback: CallbackQuery, state: FSMContext):
     # Проверяем, есть ли активный абонемент при выборе group_subscription
     if lesson_type == "group_subscription":
         telegram_id = callback.from_user.id
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(Subscription).where(
-                    (Subscription.user_id == telegram_id) &
-                    (Subscription.classes_left > 0)
-                )
-            )
-            active_sub = result.scalar_one_or_none()
+        result = await session.execute(active_subscription(telegram_id))
+        active_sub = result.scalar_one_or_none()
         
         if not active_sub:
             await callback.answer("❌ У тебя нет активного абонемента!", show_alert=True)
@@ -200,59 +197,72 @@ async def choose_payment_type(callback: CallbackQuery, state: FSMContext):
 
 # ——— Финальное подтверждение ———
 @router.callback_query(BookingStates.confirming, F.data == "confirm_booking")
-async def confirm_booking(callback: CallbackQuery, state: FSMContext):
+async def confirm_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     user_id = callback.from_user.id
 
     # Получаем тип занятия из выбранного клиентом (сохранён в FSM)
     lesson_type = data.get("lesson_type", "group_single")
 
-    # Сохраняем в БД
-    async with AsyncSessionLocal() as session:
-        booking = Booking(
-            user_id=user_id,
-            trainer=data["trainer"],
-            date=data["date"].split("|")[0].strip(),
-            time=data["time"],
-            price=data["price"],
-            payment_type=data["payment_type"],
-            lesson_type=lesson_type,
-            status="pending"
+    # Бронь, место в слоте, списание абонемента и внешние действия (Sheets, Calendar, Events) —
+    # одна транзакция: либо сохраняется всё, либо ничего. Внешние действия выполнит outbox в фоне.
+    # Место списывается в локальном учёте сразу, без чтения из Google; тип слота
+    # (slot-logic-update.md п.3.3) и новое количество мест уйдут в Sheets через outbox
+    slot = await get_slot(data.get("row_index"))
+    if slot is None and data.get("row_index") and sheet_configured():
+        # Слота нет в снимке Schedule (строку удалили или таблица недоступна) — место не проверить.
+        # В демо-режиме (таблица не настроена) снимка нет вовсе — там записываем без учёта мест
+        logger.warning(f"Слот row_index={data['row_index']} не найден в снимке Schedule, запись отклонена")
+        await callback.message.edit_text(
+            "😔 Не удалось проверить свободные места на это время.\n"
+            "Выбери, пожалуйста, время заново."
         )
-        session.add(booking)
-        await session.commit()
-        await session.refresh(booking)
-
-    # Логика: при первом бронировании слота (когда тип был пустой) — записываем тип в Google Sheets
-    # (slot-logic-update.md п.3.3)
-    if "row_index" in data and data["row_index"]:
-        await update_lesson_type(data["row_index"], lesson_type)
-        logger.info(f"Обновлен тип слота: row_index={data['row_index']}, lesson_type={lesson_type}")
-
-    # Обновляем свободные места в Google Sheets
-    if "row_index" in data:
-        await update_free_slots(data["row_index"], delta=-1)
-
-    # Создаём событие в календаре тренера
-    await create_calendar_event(booking)
+        await state.clear()
+        return
+    if slot is not None:
+        remaining = await reservations.reserve(slot, lesson_type=lesson_type, push=False, session=session)
+        if remaining is None:
+            await session.commit()  # не держим транзакцию записи, пока отвечаем в Telegram
+            await callback.message.edit_text(
+                "😔 Пока ты оформлял(а) запись, места на это время закончились.\n"
+                "Выбери, пожалуйста, другое время."
+            )
+            await state.clear()
+            return
+        logger.info(f"Место забронировано: {slot.slot_key}, осталось {remaining}")
+
+    by_subscription = data["payment_type"] == "subscription" and lesson_type == "group_subscription"
+    date_str = data["date"].split("|")[0].strip()
+    lesson_day = slot.date if slot is not None else resolve_day_month(date_str)
+    booking = Booking(
+        user_id=user_id,
+        trainer=data["trainer"],
+        date=date_str,
+        time=data["time"],
+        lesson_start=lesson_start_at(lesson_day, data["time"]),
+        price=data["price"],
+        payment_type=data["payment_type"],
+        lesson_type=lesson_type,
+        status="paid" if by_subscription else "pending",
+        slot_key=slot.slot_key if slot is not None else None,
+    )
+    session.add(booking)
 
     # Обновляем абонемент, если выбрана подписка
-    if data["payment_type"] == "subscription" and lesson_type == "group_subscription":
-        async with AsyncSessionLocal() as session:
-            sub = await session.execute(
-                select(Subscription).where(Subscription.user_id == user_id)
-            )
-            active_sub = sub.scalar_one_or_none()
-            if active_sub and active_sub.classes_left > 0:
-                active_sub.classes_left -= 1
-                await session.commit()
-        booking.status = "paid"
-    else:
-        booking.status = "pending"
-    
-    async with AsyncSessionLocal() as session:
-        await session.merge(booking)
-        await session.commit()
+    if by_subscription:
+        sub = await session.execute(user_subscriptions(user_id))
+        active_sub = sub.scalar_one_or_none()
+        if active_sub and active_sub.classes_left > 0:
+            active_sub.classes_left -= 1
+
+    await session.flush()  # нужен id брони для календаря
+    if slot is not None:
+        await enqueue_seat_push(session, slot.slot_key, lesson_type)
+    await sync_calendar_event(booking.id, session)
+    await enqueue_event(session, user_id, f"booking: {booking.trainer} {booking.date} {booking.time} ({lesson_type})")
+    # При исключении выше транзакцию (вместе со списанным местом) откатит DbSessionMiddleware
+    await session.commit()
+    outbox.wake()
 
     # Выводим подтверждение
     await callback.message.edit_text(
@@ -266,5 +276,4 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
         parse_mode="HTML"
     )
 
-    await log_event_to_sheet(user_id, f"booking: {booking.trainer} {booking.date} {booking.time} ({lesson_type})")
     await state.clear()
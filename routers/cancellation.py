@@ -14,14 +14,15 @@ from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from db.models import Booking, Subscription
-from db.database import AsyncSessionLocal
-from keyboards.booking import dates_keyboard
-from services.google_sheets import (
-    get_available_dates, log_event_to_sheet, update_free_slots
-)
-from utils.helpers import hours_to_lesson
-from sqlalchemy import select
+from db.models import Booking
+from db.queries import CLOSED_STATUSES, close_booking, user_subscriptions
+from keyboards.booking import dates_keyboard, times_keyboard
+from services.google_calendar import sync_calendar_event
+from services.outbox import outbox
+from services.google_sheets import get_available_dates, get_available_times, get_slot, log_event_to_sheet
+from services.reservations import reservations, enqueue_seat_push
+from utils.helpers import hours_to_lesson, lesson_start_at
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 router = Router(name="cancellation_router")
@@ -33,8 +34,21 @@ class RescheduleStates(StatesGroup):
     choosing_new_time = State()
 
 
+async def _close_booking(session: AsyncSession, booking: Booking, status: str) -> bool:
+    """
+    Закрывает бронь условным UPDATE. False — её уже закрыл параллельный или
+    повторный запрос: тогда место, занятие и outbox трогать нельзя.
+    """
+    # synchronize_session по умолчанию обновит и booking.status в сессии
+    result = await session.execute(close_booking(booking.id, status))
+    if result.rowcount != 1:
+        await session.rollback()  # не держим транзакцию записи, пока отвечаем в Telegram
+        return False
+    return True
+
+
 @router.callback_query(F.data.startswith("cancel_"))
-async def cancel_booking(callback: CallbackQuery):
+async def cancel_booking(callback: CallbackQuery, session: AsyncSession):
     """Обработка отмены бронирования с проверкой 10-часового правила"""
     try:
         booking_id = int(callback.data.split("_")[1])
@@ -44,111 +58,116 @@ async def cancel_booking(callback: CallbackQuery):
     
     telegram_id = callback.from_user.id
     
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        
-        if not booking or booking.user_id != telegram_id:
-            await callback.answer("❌ Запись не найдена", show_alert=True)
-            return
-        
-        if booking.status == "cancelled":
-            await callback.answer("ℹ️ Эта запись уже отменена", show_alert=True)
+    booking = await session.get(Booking, booking_id)
+    
+    if not booking or booking.user_id != telegram_id:
+        await callback.answer("❌ Запись не найдена", show_alert=True)
+        return
+    
+    if booking.status in CLOSED_STATUSES:
+        await callback.answer("ℹ️ Эта запись уже отменена или завершена", show_alert=True)
+        return
+    
+    # ⏰ ПРАВИЛО 10 ЧАСОВ (Шаг 5.3)
+    hours_remaining = hours_to_lesson(booking)
+    
+    if hours_remaining < 10:
+        # ❌ Менее 10 часов - отмена с потерями
+        if not await _close_booking(session, booking, "late_cancel"):  # Поздняя отмена
+            await callback.answer("ℹ️ Эта запись уже отменена или завершена", show_alert=True)
             return
-        
-        # ⏰ ПРАВИЛО 10 ЧАСОВ (Шаг 5.3)
-        hours_remaining = hours_to_lesson(booking)
-        
-        if hours_remaining < 10:
-            # ❌ Менее 10 часов - отмена с потерями
-            if booking.lesson_type == "group_subscription":
-                # Абонемент: занятие считается отгулянным
-                booking.status = "late_cancel"  # Поздняя отмена
-                await session.commit()
-                
-                # Возвращаем место в Sheets (slot-logic-update.md п.4.2)
-                # НЕ МЕНЯЕМ ТИП СЛОТА! Слот остаётся привязанным к типу первого клиента
-                if hasattr(booking, 'row_index'):
-                    await update_free_slots(booking.row_index, delta=+1)
-                    logger.info(f"Поздняя отмена: возвращено место, тип слота НЕ изменился (booking_id={booking.id})")
-                
-                await log_event_to_sheet(
-                    telegram_id, 
-                    f"late_cancel_subscription: {booking.trainer} {booking.date} (занятие учтено)"
-                )
-                
-                await callback.answer(
-                    "⏰ Менее 10 часов до занятия!\n\n"
-                    "❌ Отмену без потерь уже нельзя сделать.\n"
-                    "✓ Занятие будет считаться пройденным и спишется с абонемента.\n\n"
-                    "Если это необходимо обсудить, напиши администратору!",
-                    show_alert=True
-                )
-            else:
-                # Разовая оплата: деньги не вернутся
-                booking.status = "late_cancel"
-                await session.commit()
-                
-                await log_event_to_sheet(
-                    telegram_id,
-                    f"late_cancel_single: {booking.trainer} {booking.date} (платёж не возвращается)"
-                )
-                
-                await callback.answer(
-                    "⏰ Менее 10 часов до занятия!\n\n"
-                    "❌ Отмену нельзя сделать.\n"
-                    "💰 Оплата не будет возвращена.\n\n"
-                    "Если это необходимо обсудить, напиши администратору!",
-                    show_alert=True
-                )
+        # Абонемент: занятие считается отгулянным, но место возвращаем (slot-logic-update.md п.4.2)
+        # НЕ МЕНЯЕМ ТИП СЛОТА! Слот остаётся привязанным к типу первого клиента
+        release_seat = booking.lesson_type == "group_subscription" and booking.slot_key
+        if release_seat:
+            await reservations.release(booking.slot_key, push=False, session=session)
+            await enqueue_seat_push(session, booking.slot_key)
+        # Клиент не придёт — убираем занятие из календаря тренера (в той же транзакции)
+        await sync_calendar_event(booking.id, session)
+        await session.commit()
+        outbox.wake()
+        if release_seat:
+            logger.info(f"Поздняя отмена: возвращено место, тип слота НЕ изменился (booking_id={booking.id})")
+
+        if booking.lesson_type == "group_subscription":
+            await log_event_to_sheet(
+                telegram_id, 
+                f"late_cancel_subscription: {booking.trainer} {booking.date} (занятие учтено)"
+            )
             
-            await callback.message.edit_text(
-                f"❌ Запись не может быть отменена\n\n"
-                f"📅 {booking.date}\n"
-                f"🕐 {booking.time}\n"
-                f"👨‍🏫 {booking.trainer}\n\n"
-                f"⏰ Менее 10 часов до начала занятия",
-                parse_mode="HTML"
+            await callback.answer(
+                "⏰ Менее 10 часов до занятия!\n\n"
+                "❌ Отмену без потерь уже нельзя сделать.\n"
+                "✓ Занятие будет считаться пройденным и спишется с абонемента.\n\n"
+                "Если это необходимо обсудить, напиши администратору!",
+                show_alert=True
             )
-            return
-        
-        # ✅ 10+ часов - разрешить отмену без потерь
-        booking.status = "cancelled"
-        
-        # Если по абонементу, вернуть класс в пул
-        if booking.lesson_type == "group_subscription":
-            result = await session.execute(
-                select(Subscription).where(Subscription.user_id == telegram_id)
+        else:
+            # Разовая оплата: деньги не вернутся
+            await log_event_to_sheet(
+                telegram_id,
+                f"late_cancel_single: {booking.trainer} {booking.date} (платёж не возвращается)"
+            )
+            
+            await callback.answer(
+                "⏰ Менее 10 часов до занятия!\n\n"
+                "❌ Отмену нельзя сделать.\n"
+                "💰 Оплата не будет возвращена.\n\n"
+                "Если это необходимо обсудить, напиши администратору!",
+                show_alert=True
             )
-            active_sub = result.scalar_one_or_none()
-            if active_sub:
-                active_sub.classes_left += 1
-        
-        await session.commit()
-        
-        # Возвращаем место в Sheets (slot-logic-update.md п.4.1)
-        # ВАЖНО: НЕ МЕНЯЕМ ТИП СЛОТА! Слот остаётся привязанным к типу первого клиента
-        if hasattr(booking, 'row_index'):
-            await update_free_slots(booking.row_index, delta=+1)
-            logger.info(f"Отмена: возвращено место в слот, тип слота НЕ изменился (booking_id={booking.id})")
-        
-        await log_event_to_sheet(
-            telegram_id, 
-            f"cancel_early: {booking.trainer} {booking.date} {booking.time} ({hours_remaining:.1f} часов)"
-        )
         
-        await callback.answer("✅ Запись отменена успешно!", show_alert=True)
         await callback.message.edit_text(
-            f"✅ Запись отменена\n\n"
+            f"❌ Запись не может быть отменена\n\n"
             f"📅 {booking.date}\n"
             f"🕐 {booking.time}\n"
             f"👨‍🏫 {booking.trainer}\n\n"
-            f"⏰ За {hours_remaining:.1f} часов до начала (без потерь)",
+            f"⏰ Менее 10 часов до начала занятия",
             parse_mode="HTML"
         )
+        return
+    
+    # ✅ 10+ часов - разрешить отмену без потерь
+    if not await _close_booking(session, booking, "cancelled"):
+        await callback.answer("ℹ️ Эта запись уже отменена или завершена", show_alert=True)
+        return
+    
+    # Если по абонементу, вернуть класс в пул
+    if booking.lesson_type == "group_subscription":
+        result = await session.execute(user_subscriptions(telegram_id))
+        active_sub = result.scalar_one_or_none()
+        if active_sub:
+            active_sub.classes_left += 1
+    
+    # Возвращаем место в Sheets (slot-logic-update.md п.4.1) — в той же транзакции, через outbox
+    # ВАЖНО: НЕ МЕНЯЕМ ТИП СЛОТА! Слот остаётся привязанным к типу первого клиента
+    if booking.slot_key:
+        await reservations.release(booking.slot_key, push=False, session=session)
+        await enqueue_seat_push(session, booking.slot_key)
+    await sync_calendar_event(booking.id, session)
+    await session.commit()
+    outbox.wake()
+    if booking.slot_key:
+        logger.info(f"Отмена: возвращено место в слот, тип слота НЕ изменился (booking_id={booking.id})")
+    
+    await log_event_to_sheet(
+        telegram_id, 
+        f"cancel_early: {booking.trainer} {booking.date} {booking.time} ({hours_remaining:.1f} часов)"
+    )
+    
+    await callback.answer("✅ Запись отменена успешно!", show_alert=True)
+    await callback.message.edit_text(
+        f"✅ Запись отменена\n\n"
+        f"📅 {booking.date}\n"
+        f"🕐 {booking.time}\n"
+        f"👨‍🏫 {booking.trainer}\n\n"
+        f"⏰ За {hours_remaining:.1f} часов до начала (без потерь)",
+        parse_mode="HTML"
+    )
 
 
 @router.callback_query(F.data.startswith("reschedule_"))
-async def reschedule_booking(callback: CallbackQuery, state: FSMContext):
+async def reschedule_booking(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Обработка переноса бронирования с проверкой 10-часового правила"""
     try:
         booking_id = int(callback.data.split("_")[1])
@@ -158,56 +177,128 @@ async def reschedule_booking(callback: CallbackQuery, state: FSMContext):
     
     telegram_id = callback.from_user.id
     
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        
-        if not booking or booking.user_id != telegram_id:
-            await callback.answer("❌ Запись не найдена", show_alert=True)
-            return
-        
-        if booking.status == "cancelled":
-            await callback.answer("ℹ️ Эта запись уже отменена", show_alert=True)
-            return
-        
-        # ⏰ ПРАВИЛО 10 ЧАСОВ для переноса
-        hours_remaining = hours_to_lesson(booking)
-        
-        if hours_remaining < 10:
-            await callback.answer(
-                "⏰ Менее 10 часов до занятия!\n\n"
-                "❌ Перенос уже не возможен.\n"
-                "💡 Пожалуйста, отмени эту запись и забронируй новое время,\n"
-                "   или напиши администратору для помощи.",
-                show_alert=True
-            )
-            return
-        
-        # ✅ 10+ часов - разрешить перенос
-        await state.set_state(RescheduleStates.choosing_new_date)
-        await state.update_data(
-            old_booking_id=booking_id,
-            lesson_type=booking.lesson_type,
-            payment_type=booking.payment_type,
-            trainer=booking.trainer,
-            hours_remaining=hours_remaining
-        )
-        
-        await log_event_to_sheet(
-            telegram_id,
-            f"reschedule_start: {booking.trainer} {booking.date} {booking.time} ({hours_remaining:.1f} часов)"
-        )
-        
-        dates = await get_available_dates(booking.trainer)
-        if not dates:
-            await callback.answer("😔 Нет свободных дат у этого тренера", show_alert=True)
-            return
-        
-        await callback.message.edit_text(
-            f"📅 Перенос занятия\n\n"
-            f"Текущее: {booking.date} {booking.time}\n"
-            f"Тренер: {booking.trainer}\n\n"
-            f"⏰ Осталось {hours_remaining:.1f} часов до занятия\n\n"
-            f"Выбери новую дату:",
-            reply_markup=dates_keyboard(dates, booking.trainer),
-            parse_mode="HTML"
+    booking = await session.get(Booking, booking_id)
+    
+    if not booking or booking.user_id != telegram_id:
+        await callback.answer("❌ Запись не найдена", show_alert=True)
+        return
+    
+    if booking.status == "cancelled":
+        await callback.answer("ℹ️ Эта запись уже отменена", show_alert=True)
+        return
+    
+    # ⏰ ПРАВИЛО 10 ЧАСОВ для переноса
+    hours_remaining = hours_to_lesson(booking)
+    
+    if hours_remaining < 10:
+        await callback.answer(
+            "⏰ Менее 10 часов до занятия!\n\n"
+            "❌ Перенос уже не возможен.\n"
+            "💡 Пожалуйста, отмени эту запись и забронируй новое время,\n"
+            "   или напиши администратору для помощи.",
+            show_alert=True
         )
+        return
+    
+    # ✅ 10+ часов - разрешить перенос
+    await state.set_state(RescheduleStates.choosing_new_date)
+    await state.update_data(
+        old_booking_id=booking_id,
+        lesson_type=booking.lesson_type,
+        payment_type=booking.payment_type,
+        trainer=booking.trainer,
+        hours_remaining=hours_remaining
+    )
+    
+    await log_event_to_sheet(
+        telegram_id,
+        f"reschedule_start: {booking.trainer} {booking.date} {booking.time} ({hours_remaining:.1f} часов)"
+    )
+    
+    dates = await get_available_dates(booking.trainer)
+    if not dates:
+        await callback.answer("😔 Нет свободных дат у этого тренера", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        f"📅 Перенос занятия\n\n"
+        f"Текущее: {booking.date} {booking.time}\n"
+        f"Тренер: {booking.trainer}\n\n"
+        f"⏰ Осталось {hours_remaining:.1f} часов до занятия\n\n"
+        f"Выбери новую дату:",
+        reply_markup=dates_keyboard(dates, booking.trainer),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(RescheduleStates.choosing_new_date, F.data.startswith("date_"))
+async def reschedule_choose_date(callback: CallbackQuery, state: FSMContext):
+    """Перенос: выбор новой даты"""
+    _, _, date_str = callback.data.split("_", 2)
+    data = await state.get_data()
+
+    times = await get_available_times(data["trainer"], date_str, lesson_type=data.get("lesson_type"))
+    if not times:
+        await callback.answer("😔 На эту дату нет свободного времени, выбери другую", show_alert=True)
+        return
+
+    await state.set_state(RescheduleStates.choosing_new_time)
+    await callback.message.edit_text(
+        f"📅 Перенос занятия\n\nТренер: <b>{data['trainer']}</b>\nНовая дата: <b>{date_str}</b>\nВыбери время:",
+        reply_markup=times_keyboard(times, data["trainer"], date_str),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(RescheduleStates.choosing_new_time, F.data.startswith("time_"))
+async def reschedule_choose_time(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    """Перенос: выбор времени — бронь переезжает в новый слот, старое место возвращается"""
+    _, _, date_str, time, _ = callback.data.split("_", 4)
+    data = await state.get_data()
+    telegram_id = callback.from_user.id
+
+    times = await get_available_times(data["trainer"], date_str, lesson_type=data.get("lesson_type"))
+    row_index = next((slot.get("row_index") for slot in times if slot["time"] == time), None)
+    slot = await get_slot(row_index) if row_index else None
+    # Новое место, возврат старого и сама бронь — одна транзакция: при ошибке до коммита
+    # DbSessionMiddleware откатит всё вместе, место не потеряется
+    lesson_type = data.get("lesson_type")
+    if slot is None or await reservations.reserve(slot, lesson_type=lesson_type, push=False, session=session) is None:
+        await session.commit()  # не держим транзакцию записи, пока отвечаем в Telegram
+        await callback.answer("😔 Это время уже заняли, выбери другое", show_alert=True)
+        return
+
+    booking = await session.get(Booking, data["old_booking_id"])
+    if not booking or booking.user_id != telegram_id or booking.status in ("cancelled", "late_cancel"):
+        await session.rollback()  # отменяет и списание нового места
+        await state.clear()
+        await callback.message.edit_text("❌ Запись не найдена или уже отменена")
+        return
+
+    old_slot_key, old_date, old_time = booking.slot_key, booking.date, booking.time
+    booking.date = date_str
+    booking.time = time
+    booking.lesson_start = lesson_start_at(slot.date, time)
+    booking.slot_key = slot.slot_key
+    booking.reminder_12_sent = False
+    booking.reminder_2_sent = False
+    await enqueue_seat_push(session, slot.slot_key, lesson_type)
+    if old_slot_key:
+        await reservations.release(old_slot_key, push=False, session=session)
+        await enqueue_seat_push(session, old_slot_key)
+    await sync_calendar_event(booking.id, session)
+    await session.commit()
+    outbox.wake()
+    await state.clear()
+
+    await log_event_to_sheet(
+        telegram_id,
+        f"reschedule: {booking.trainer} {old_date} {old_time} → {date_str} {time}"
+    )
+    await callback.message.edit_text(
+        f"✅ Занятие перенесено\n\n"
+        f"📅 {date_str}\n"
+        f"🕐 {time}\n"
+        f"👨‍🏫 {booking.trainer}",
+        parse_mode="HTML"
+    )
@@ -1,42 +1,58 @@
+import html
 import logging
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 
-from services.google_sheets import get_faq_answers
+from keyboards.faq import faq_keyboard, faq_answer_keyboard
+from services.faq_cache import FaqSnapshot
+from services.google_sheets import get_faq
 
 logger = logging.getLogger(__name__)
 router = Router(name="faq_router")
 
+FAQ_TITLE = "Часто задаваемые вопросы:"
+
+
+def _snapshot_keyboard(snapshot: FaqSnapshot) -> InlineKeyboardMarkup:
+    # Клавиатура строится один раз на версию FAQ и дальше переиспользуется
+    if snapshot.keyboard is None:
+        snapshot.keyboard = faq_keyboard(snapshot.entries)
+    return snapshot.keyboard
+
 
 @router.message(F.text == "FAQ ❓")
 async def show_faq(message: Message):
-    answers = await get_faq_answers()
-    if not answers:
+    snapshot = await get_faq()
+    if not snapshot:
         await message.answer("❌ FAQ временно недоступен")
         return
 
-    builder = InlineKeyboardBuilder()
-    for q, a in answers:
-        builder.row(
-            InlineKeyboardBuilder().button(text=q, callback_data=f"faq_{q[:50]}").as_markup().inline_keyboard[0][0]
-        )
-    builder.row(
-        InlineKeyboardBuilder().button(text="◀️ В меню", callback_data="back_to_menu").as_markup().inline_keyboard[0][0]
-    )
+    await message.answer(FAQ_TITLE, reply_markup=_snapshot_keyboard(snapshot))
 
-    await message.answer("Часто задаваемые вопросы:", reply_markup=builder.as_markup())
+
+@router.callback_query(F.data == "back_to_faq")
+async def back_to_faq(callback: CallbackQuery):
+    snapshot = await get_faq()
+    if not snapshot:
+        await callback.answer("FAQ временно недоступен", show_alert=True)
+        return
+
+    await callback.message.edit_text(FAQ_TITLE, reply_markup=_snapshot_keyboard(snapshot))
+    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("faq_"))
 async def show_faq_answer(callback: CallbackQuery):
-    question = callback.data[4:]
-    answers = await get_faq_answers()
-    answer = next((a for q, a in answers if q == question), "Ответ не найден")
+    snapshot = await get_faq()
+    try:
+        entry = snapshot.by_id.get(int(callback.data[4:])) if snapshot else None
+    except ValueError:
+        entry = None  # кнопка из старого сообщения с текстом вопроса вместо id
+    if entry is None:
+        await callback.answer("Ответ не найден — откройте FAQ заново", show_alert=True)
+        return
 
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardBuilder().button(text="◀️ Назад к FAQ", callback_data="back_to_faq").as_markup().inline_keyboard[0][0]
+    await callback.message.edit_text(
+        f"<b>{html.escape(entry.question)}</b>\n\n{html.escape(entry.answer)}", reply_markup=faq_answer_keyboard(), parse_mode="HTML"
     )
-
-    await callback.message.edit_text(f"<b>{question}</b>\n\n{answer}", reply_markup=builder.as_markup(), parse_mode="HTML")
+    await callback.answer()
@@ -0,0 +1,44 @@
+import html
+import logging
+from aiogram import Router, F
+from aiogram.filters import StateFilter
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+
+from services.google_sheets import search_faq
+
+logger = logging.getLogger(__name__)
+router = Router(name="faq_search_router")
+
+# Ниже этого BM25-скора совпадение считаем случайным
+MIN_SCORE = 1.0
+
+
+@router.message(StateFilter(None), F.text, ~F.text.startswith("/"))
+async def answer_free_text(message: Message):
+    """
+    Ответ на произвольный текст по FAQ.
+
+    Роутер подключается последним: сюда попадают только сообщения, которые
+    не обработал ни один другой хэндлер, и только вне сценариев FSM.
+    """
+    matches = [(entry, score) for entry, score in await search_faq(message.text) if score >= MIN_SCORE]
+    if not matches:
+        await message.answer(
+            "🤔 Не нашли ответа на ваш вопрос.\n\n"
+            "Загляните в раздел «FAQ ❓» или напишите нам через «Связаться с администратором ✉️»."
+        )
+        return
+
+    best, score = matches[0]
+    logger.debug(f"FAQ-поиск: {message.text!r} → {best.id} (score={score:.2f})")
+    others = [
+        [InlineKeyboardButton(text=entry.question, callback_data=f"faq_{entry.id}")]
+        for entry, _ in matches[1:]
+    ]
+    await message.answer(
+        # Текст из таблицы — экранируем, иначе "<" или "&" в ответе ломают HTML-разметку
+        f"<b>{html.escape(best.question)}</b>\n\n{html.escape(best.answer)}"
+        + ("\n\nПохожие вопросы:" if others else ""),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=others) if others else None,
+        parse_mode="HTML",
+    )
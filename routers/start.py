@@ -4,7 +4,7 @@ from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 
 from db.models import User
-from db.database import AsyncSessionLocal
+from db.queries import user_by_telegram_id
 from keyboards.main_menu import get_main_menu
 from utils.constants import WELCOME_TEXT
 from utils.helpers import update_user_activity
@@ -13,37 +13,38 @@ from services.google_sheets import log_event_to_sheet
 
 router = Router(name="start_router")
 
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-async def register_user_if_not_exists(telegram_id: int, full_name: str, username: str | None):
-    """Регистрация пользователя если его нет в БД"""
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-        user = result.scalar_one_or_none()
-        if not user:
-            new_user = User(
-                telegram_id=telegram_id,
-                full_name=full_name or username or "Не указано",
-            )
-            session.add(new_user)
-            await session.commit()
+async def register_user_if_not_exists(session: AsyncSession, telegram_id: int, full_name: str, username: str | None):
+    """Регистрация пользователя если его нет в БД (в сессии апдейта, коммит — в хэндлере)"""
+    result = await session.execute(user_by_telegram_id(telegram_id))
+    user = result.scalar_one_or_none()
+    if not user:
+        new_user = User(
+            telegram_id=telegram_id,
+            full_name=full_name or username or "Не указано",
+        )
+        session.add(new_user)
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, session: AsyncSession):
     """Команда /start: регистрация и показ меню по ролям"""
     telegram_id = message.from_user.id
     
     await state.clear()
     await register_user_if_not_exists(
+        session,
         telegram_id=telegram_id,
         full_name=message.from_user.full_name,
         username=message.from_user.username,
     )
+    # Фиксируем регистрацию до запросов к Google и Telegram — не держим блокировку записи SQLite
+    await session.commit()
     
     # Обновляем активность пользователя
-    await update_user_activity(telegram_id)
+    update_user_activity(telegram_id)
     
     # Логируем событие
     await log_event_to_sheet(telegram_id, "message: /start")
@@ -65,16 +66,19 @@ async def cmd_start(message: Message, state: FSMContext):
 
 
 @router.message(F.text == "Начать 🚀")
-async def start_button(message: Message, state: FSMContext):
+async def start_button(message: Message, state: FSMContext, session: AsyncSession):
     """Кнопка 'Начать' - запускает тот же процесс что и /start"""
     telegram_id = message.from_user.id
     
     await state.clear()
     await register_user_if_not_exists(
+        session,
         telegram_id=telegram_id,
         full_name=message.from_user.full_name,
         username=message.from_user.username,
     )
+    # Фиксируем регистрацию до запросов к Google и Telegram — не держим блокировку записи SQLite
+    await session.commit()
     
     # Логируем событие
     await log_event_to_sheet(telegram_id, "click: Начать")
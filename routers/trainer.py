@@ -12,16 +12,26 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from db.models import Booking, User
-from db.database import AsyncSessionLocal
+from db.queries import trainer_bookings
 from keyboards.main_menu import get_main_menu
+from services.broadcast import broadcasts
 from services.google_sheets import log_event_to_sheet
 from config import TRAINER_CHAT_IDS
-from sqlalchemy import select
-from datetime import datetime, timedelta
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 
 router = Router(name="trainer_router")
 
 
+def _trainer_name(telegram_id: int):
+    """Имя тренера по его Telegram ID (TRAINER_CHAT_IDS: имя → chat id); None — не тренер."""
+    return next(
+        (name for name, chat_id in TRAINER_CHAT_IDS.items() if chat_id and str(chat_id) == str(telegram_id)),
+        None,
+    )
+
+
 class TrainerStates(StatesGroup):
     """Состояния FSM для функций тренера"""
     sending_reminder = State()  # Отправка напоминания всем студентам
@@ -29,60 +39,52 @@ class TrainerStates(StatesGroup):
 
 
 @router.message(F.text == "Мои занятия как тренера 🎓")
-async def trainer_schedule(message: Message, state: FSMContext) -> None:
+async def trainer_schedule(message: Message, state: FSMContext, session: AsyncSession) -> None:
     """Показывает расписание тренера на неделю с возможностью отметить посещение"""
     telegram_id = message.from_user.id
     
     # Проверяем что это тренер
-    if telegram_id not in TRAINER_CHAT_IDS:
+    if _trainer_name(telegram_id) is None:
         await message.answer("❌ У вас нет доступа к этой функции")
         return
     
     await log_event_to_sheet(telegram_id, "click: Мои занятия как тренера")
     
-    async with AsyncSessionLocal() as session:
-        # Получаем все бронирования на неделю где тренер = current_trainer
-        # Для упрощения используем фильтр по тексту в trainer поле
-        today = datetime.now()
-        week_end = today + timedelta(days=7)
-        
-        result = await session.execute(
-            select(Booking).where(
-                (Booking.trainer_name != None) &
-                (Booking.status != "cancelled")
-            )
+    # Бронирования тренера на ближайшую неделю — диапазон по индексу lesson_start
+    now = datetime.now(timezone.utc)
+    result = await session.execute(trainer_bookings(_trainer_name(telegram_id), now, now + timedelta(days=7)))
+    bookings = result.scalars().all()
+    await session.commit()  # отдаём соединение в пул до запросов к Telegram
+
+    if not bookings:
+        await message.answer(
+            "📅 На этой неделе у вас нет запланированных занятий.",
+            reply_markup=get_main_menu(is_trainer=True)
         )
-        bookings = result.scalars().all()
-        
-        if not bookings:
-            await message.answer(
-                "📅 На этой неделе у вас нет запланированных занятий.",
-                reply_markup=get_main_menu(is_trainer=True)
-            )
-            return
-        
-        # Форматируем расписание
-        schedule_text = "📅 *Ваши занятия на неделю:*\n\n"
-        
-        for i, booking in enumerate(bookings, 1):
-            status_emoji = "✅" if booking.status == "paid" else "⏳"
-            student_name = booking.student_name or "Не указано"
-            
-            schedule_text += (
-                f"{i}. {booking.date} {booking.time}\n"
-                f"   Студент: {student_name}\n"
-                f"   Тип: {booking.lesson_type} {status_emoji}\n\n"
-            )
-        
-        schedule_text += "\n💡 Нажмите кнопку ниже для отметки посещения:"
+        return
+
+    # Форматируем расписание
+    schedule_text = "📅 *Ваши занятия на неделю:*\n\n"
+
+    for i, booking in enumerate(bookings, 1):
+        status_emoji = "✅" if booking.status == "paid" else "⏳"
+        student_name = (booking.user.full_name if booking.user else None) or "Не указано"
         
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[[
-                InlineKeyboardButton(text="✅ Отметить посещение", callback_data="mark_attendance")
-            ]]
+        schedule_text += (
+            f"{i}. {booking.date} {booking.time}\n"
+            f"   Студент: {student_name}\n"
+            f"   Тип: {booking.lesson_type} {status_emoji}\n\n"
         )
-        
-        await message.answer(schedule_text, reply_markup=keyboard, parse_mode="Markdown")
+
+    schedule_text += "\n💡 Нажмите кнопку ниже для отметки посещения:"
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[[
+            InlineKeyboardButton(text="✅ Отметить посещение", callback_data="mark_attendance")
+        ]]
+    )
+
+    await message.answer(schedule_text, reply_markup=keyboard, parse_mode="Markdown")
 
 
 @router.message(F.text == "Отметить посещение ✅")
@@ -90,7 +92,7 @@ async def mark_attendance_start(message: Message, state: FSMContext) -> None:
     """Начало процесса отметки посещения"""
     telegram_id = message.from_user.id
     
-    if telegram_id not in TRAINER_CHAT_IDS:
+    if _trainer_name(telegram_id) is None:
         await message.answer("❌ У вас нет доступа к этой функции")
         return
     
@@ -109,7 +111,7 @@ async def send_reminder_start(message: Message, state: FSMContext) -> None:
     """Начало процесса отправки напоминания всем студентам"""
     telegram_id = message.from_user.id
     
-    if telegram_id not in TRAINER_CHAT_IDS:
+    if _trainer_name(telegram_id) is None:
         await message.answer("❌ У вас нет доступа к этой функции")
         return
     
@@ -123,7 +125,7 @@ async def send_reminder_start(message: Message, state: FSMContext) -> None:
 
 
 @router.message(TrainerStates.sending_reminder)
-async def process_reminder_text(message: Message, state: FSMContext) -> None:
+async def process_reminder_text(message: Message, state: FSMContext, session: AsyncSession) -> None:
     """Обработка текста напоминания и отправка всем студентам"""
     telegram_id = message.from_user.id
     reminder_text = message.text
@@ -134,26 +136,23 @@ async def process_reminder_text(message: Message, state: FSMContext) -> None:
     
     await log_event_to_sheet(telegram_id, f"reminder_sent: {reminder_text[:50]}")
     
-    # Получаем всех активных студентов
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(User).where(User.status == "active")
+    # Все, кто записывался на занятия и не заблокировал бота
+    result = await session.execute(
+        select(User.telegram_id).where(
+            User.is_blocked.is_not(True),
+            exists().where(Booking.user_id == User.telegram_id),
         )
-        students = result.scalars().all()
-    
-    # Отправляем напоминание каждому
-    sent_count = 0
-    for student in students:
-        try:
-            # TODO: Реализовать отправку сообщения через бот API
-            # await bot.send_message(student.telegram_id, reminder_text)
-            sent_count += 1
-        except Exception as e:
-            print(f"Ошибка при отправке студенту {student.telegram_id}: {e}")
-    
+    )
+    students = result.scalars().all()
+    await session.commit()  # отдаём соединение в пул до запросов к Telegram
+
+    # Отправка идёт в фоне с учётом лимитов Telegram; итоги придут тренеру отдельным сообщением
+    await broadcasts.create("trainer_reminder", reminder_text, students, requested_by=telegram_id)
+
     await state.clear()
     await message.answer(
-        f"✅ Напоминание отправлено {sent_count} студентам!",
+        f"📬 Напоминание поставлено в рассылку: {len(students)} студентов.\n"
+        "Пришлю отчёт, когда отправка закончится.",
         reply_markup=get_main_menu(is_trainer=True)
     )
 
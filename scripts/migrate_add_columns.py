@@ -3,16 +3,77 @@
 Миграционный скрипт для добавления отсутствующих колонок в SQLite БД:
 - users.last_inactivity_message_sent (DateTime NULLABLE)
 - bookings.lesson_type (String, default 'group_single')
+- bookings.slot_key (String NULLABLE)
+- bookings.calendar_event_id (String NULLABLE)
+- users.is_blocked (Boolean, default 0)
+- bookings.lesson_start (DateTime UTC) + пакетное заполнение из date/time
+
+и недостающих индексов (CREATE INDEX IF NOT EXISTS):
+- ix_bookings_lesson_start_reminders — диапазоны по времени занятия и напоминания
+- ix_bookings_user_lesson_start, ix_bookings_trainer_lesson_start — «Мои занятия», неделя тренера
+- ix_subscriptions_user_left — абонементы пользователя
+- ix_users_inactivity — проверка неактивных пользователей
+- ix_schedule_slots_row_index — обновление зеркала Schedule по строке
+
+и переводит БД в auto_vacuum=INCREMENTAL (один VACUUM) для ночного обслуживания.
 
 Скрипт безопасно проверяет наличие колонки через PRAGMA table_info
 и выполняет ALTER TABLE ADD COLUMN только если колонки нет.
 """
 
 import sqlite3
+import sys
+from datetime import date, datetime, timezone
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.schedule_index import parse_day_month, resolve_day_month
+from utils.helpers import lesson_start_at
+
 DB_PATH = Path("pilates_bot.db")
 
+# Сколько броней заполнять за одну транзакцию (не держим запись в БД надолго)
+BACKFILL_BATCH = 500
+
+# (имя, DDL) — индексы из db/models.py; create_all создаёт их только в новых таблицах
+INDEXES = [
+    (
+        "ix_bookings_lesson_start_reminders",
+        "CREATE INDEX IF NOT EXISTS ix_bookings_lesson_start_reminders "
+        "ON bookings (lesson_start, reminder_12_sent, reminder_2_sent)",
+    ),
+    (
+        "ix_bookings_user_lesson_start",
+        "CREATE INDEX IF NOT EXISTS ix_bookings_user_lesson_start ON bookings (user_id, lesson_start)",
+    ),
+    (
+        "ix_bookings_trainer_lesson_start",
+        "CREATE INDEX IF NOT EXISTS ix_bookings_trainer_lesson_start ON bookings (trainer, lesson_start)",
+    ),
+    (
+        "ix_subscriptions_user_left",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_user_left ON subscriptions (user_id, classes_left)",
+    ),
+    (
+        "ix_users_inactivity",
+        "CREATE INDEX IF NOT EXISTS ix_users_inactivity ON users (last_activity, last_inactivity_message_sent)",
+    ),
+    (
+        "ix_schedule_slots_row_index",
+        "CREATE INDEX IF NOT EXISTS ix_schedule_slots_row_index ON schedule_slots (row_index)",
+    ),
+]
+
+# Индексы, заменённые новыми
+DROPPED_INDEXES = ["ix_bookings_date_reminders"]
+
+
+def has_table(conn: sqlite3.Connection, table: str) -> bool:
+    """Проверяет наличие таблицы (новые таблицы создаёт init_db вместе с индексами)"""
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
 
 def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
     """Проверяет наличие колонки в таблице"""
@@ -21,6 +82,50 @@ def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
     return column in cols
 
 
+def parse_lesson_start(date_str: str, time_str: str, created_at) -> str:
+    """
+    "15 марта" / "15 марта 2025" + "10:00" → строка UTC в формате SQLAlchemy DateTime.
+    Год без явного указания — ближайший к дате создания брони.
+    """
+    parts = date_str.split()
+    if len(parts) >= 3 and parts[2].isdigit():
+        day, month = parse_day_month(date_str)
+        lesson_day = date(int(parts[2]), month, day)
+    else:
+        reference = datetime.fromisoformat(created_at).date() if created_at else None
+        lesson_day = resolve_day_month(date_str, today=reference)
+    start = lesson_start_at(lesson_day, time_str).astimezone(timezone.utc)
+    return start.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def backfill_lesson_start(conn: sqlite3.Connection) -> None:
+    """Заполняет bookings.lesson_start пачками по BACKFILL_BATCH с коммитом после каждой."""
+    last_id, filled, skipped = 0, 0, []
+    while True:
+        rows = conn.execute(
+            "SELECT id, date, time, created_at FROM bookings "
+            "WHERE lesson_start IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for booking_id, date_str, time_str, created_at in rows:
+            try:
+                updates.append((parse_lesson_start(date_str, time_str, created_at), booking_id))
+            except (TypeError, ValueError):
+                skipped.append(booking_id)
+        conn.executemany("UPDATE bookings SET lesson_start = ? WHERE id = ?", updates)
+        conn.commit()
+        filled += len(updates)
+        last_id = rows[-1][0]
+        print(f"   … заполнено {filled}")
+    print(f"✅ lesson_start заполнен у {filled} броней")
+    if skipped:
+        print(f"⚠️  Не удалось разобрать дату у броней: {skipped[:20]}{' …' if len(skipped) > 20 else ''}")
+    print()
+
+
 def main():
     """Выполняет миграцию"""
     if not DB_PATH.exists():
@@ -52,7 +157,63 @@ def main():
         else:
             print("✓ bookings.lesson_type уже существует\n")
 
+        # bookings.slot_key
+        if not has_column(conn, "bookings", "slot_key"):
+            print("📝 Добавляю: bookings.slot_key")
+            conn.execute("ALTER TABLE bookings ADD COLUMN slot_key TEXT")
+            print("✅ Готово!\n")
+        else:
+            print("✓ bookings.slot_key уже существует\n")
+
+        # bookings.calendar_event_id
+        if not has_column(conn, "bookings", "calendar_event_id"):
+            print("📝 Добавляю: bookings.calendar_event_id")
+            conn.execute("ALTER TABLE bookings ADD COLUMN calendar_event_id TEXT")
+            print("✅ Готово!\n")
+        else:
+            print("✓ bookings.calendar_event_id уже существует\n")
+
+        # users.is_blocked
+        if not has_column(conn, "users", "is_blocked"):
+            print("📝 Добавляю: users.is_blocked")
+            conn.execute("ALTER TABLE users ADD COLUMN is_blocked BOOLEAN DEFAULT 0")
+            print("✅ Готово!\n")
+        else:
+            print("✓ users.is_blocked уже существует\n")
+
+        # bookings.lesson_start
+        if not has_column(conn, "bookings", "lesson_start"):
+            print("📝 Добавляю: bookings.lesson_start")
+            conn.execute("ALTER TABLE bookings ADD COLUMN lesson_start TIMESTAMP")
+            conn.commit()
+            print("✅ Готово!\n")
+        else:
+            print("✓ bookings.lesson_start уже существует\n")
+        backfill_lesson_start(conn)
+
+        print("🔍 Проверка индексов...\n")
+        for name in DROPPED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for name, ddl in INDEXES:
+            table = ddl.split(" ON ")[1].split()[0]
+            if not has_table(conn, table):
+                print(f"– {name}: таблицы {table} ещё нет, индекс создаст init_db")
+                continue
+            conn.execute(ddl)
+            print(f"✓ {name}")
+        print()
+
         conn.commit()
+
+        # auto_vacuum меняется только через полный VACUUM (вне транзакции)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("📝 Перевожу БД в auto_vacuum=INCREMENTAL (VACUUM)...")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            print("✅ Готово!\n")
+        else:
+            print("✓ auto_vacuum=INCREMENTAL уже включён\n")
+
         print("🎉 Миграция завершена успешно!")
         return True
         
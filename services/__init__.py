@@ -1,5 +1,5 @@
 from .google_sheets import get_available_trainers, get_available_dates, get_available_times, get_faq_answers
-from .google_calendar import create_calendar_event
+from .google_calendar import sync_calendar_event
 from .yookassa import create_payment_link
 from .scheduler import setup_scheduler
 
@@ -8,7 +8,7 @@ __all__ = [
     "get_available_dates",
     "get_available_times",
     "get_faq_answers",
-    "create_calendar_event",
+    "sync_calendar_event",
     "create_payment_link",
     "setup_scheduler",
 ]
@@ -0,0 +1,118 @@
+"""
+Учёт активности пользователей с отложенной записью.
+
+Раньше каждое нажатие в меню писало users.last_activity в БД (и держало
+блокировку записи SQLite до конца хэндлера), хотя читает это поле только
+check_inactive_users раз в день. Теперь ActivityTracker запоминает в памяти
+последнее время по пользователю, а раз в interval секунд записывает всё
+накопленное одним executemany UPDATE. Перед проверкой неактивности и при
+остановке бота накопленное сбрасывается в БД, поэтому точность не хуже
+интервала сброса, а при аварийном падении теряется не больше него.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from config import ACTIVITY_FLUSH_INTERVAL
+from db import AsyncSessionLocal
+from db.models import User
+
+logger = logging.getLogger(__name__)
+
+_users = User.__table__
+
+# Обновление по telegram_id (не по первичному ключу) — Core-UPDATE с параметрами на каждую строку
+_UPDATE_ACTIVITY = (
+    update(_users)
+    .where(_users.c.telegram_id == bindparam("uid"))
+    .values(last_activity=bindparam("ts"))
+)
+
+
+class ActivityTracker:
+    """Последняя активность по пользователю в памяти с периодической записью в БД."""
+
+    def __init__(self, session_factory: Callable, interval: float):
+        self._session_factory = session_factory
+        self.interval = interval
+        self._pending: Dict[int, datetime] = {}  # telegram_id → последняя активность (UTC)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.touched = 0
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+
+    def touch(self, user_id: int) -> None:
+        """Отмечает активность пользователя (без обращения к БД)."""
+        self._pending[user_id] = datetime.utcnow()
+        self.touched += 1
+
+    async def flush(self) -> int:
+        """Записывает накопленную активность в БД. Возвращает число пользователей."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                async with self._session_factory() as session:
+                    await session.execute(
+                        _UPDATE_ACTIVITY, [{"uid": uid, "ts": ts} for uid, ts in batch.items()]
+                    )
+                    await session.commit()
+            except BaseException:
+                # Возвращаем в очередь, не затирая более свежие отметки; в том числе
+                # при отмене (CancelledError из stop()), иначе пакет пропадёт
+                for uid, ts in batch.items():
+                    self._pending.setdefault(uid, ts)
+                self.errors += 1
+                raise
+        self.written += len(batch)
+        self.flushes += 1
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Не удалось записать активность пользователей: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает периодическую запись и сбрасывает накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Не удалось записать активность пользователей при остановке: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "touched": self.touched,
+            "written": self.written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
+
+
+activity = ActivityTracker(AsyncSessionLocal, interval=ACTIVITY_FLUSH_INTERVAL)
@@ -0,0 +1,279 @@
+"""
+Массовые рассылки в Telegram с учётом лимитов.
+
+Раньше check_inactive_users слал сообщения по одному с коммитом после
+каждого, а рассылка тренера вообще ничего не отправляла. Теперь рассылка —
+это строка broadcast_jobs и по строке на получателя в broadcast_deliveries.
+BroadcastEngine в фоне отправляет получателей пачками: до concurrency
+сообщений одновременно, в пределах общего лимита Telegram (token bucket,
+rate сообщений в секунду) и не чаще раза в секунду в один чат. На
+TelegramRetryAfter приостанавливаются все отправки на указанное время, и
+сообщение повторяется. Заблокировавшие бота помечаются User.is_blocked.
+Итоги пачки записываются одним UPDATE, поэтому после рестарта рассылка
+продолжается с неотправленных (остановка дожидается текущей пачки; при
+аварийном падении её сообщения могут уйти повторно). По окончании автору
+рассылки приходит отчёт.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE, BROADCAST_MAX_ATTEMPTS
+from db import AsyncSessionLocal
+from db.models import BroadcastDelivery, BroadcastJob, User
+from db.queries import pending_deliveries
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Не чаще одного сообщения в секунду в один чат (лимит Telegram)
+PER_CHAT_INTERVAL = 1.0
+
+# Вызывается после каждой пачки с id чатов, которым сообщение доставлено (в той же транзакции)
+SentHook = Callable[[AsyncSession, List[int]], Awaitable[None]]
+
+
+class BroadcastEngine:
+    """Очередь рассылок в БД и фоновая отправка с лимитами Telegram."""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        rate: float,
+        concurrency: int,
+        batch_size: int,
+        max_attempts: int,
+    ):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket("telegram", per_minute=rate * 60, capacity=rate)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bot: Optional[Bot] = None
+        self._hooks: Dict[str, SentHook] = {}
+        self._chat_next: Dict[int, float] = {}  # chat_id → когда можно писать в чат снова (monotonic)
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.retry_after = 0
+
+    def on_sent(self, kind: str, hook: SentHook) -> None:
+        """Действие после доставки для рассылок вида kind (например, отметка времени у пользователя)."""
+        self._hooks[kind] = hook
+
+    async def create(self, kind: str, text: str, chat_ids: Iterable[int], requested_by: Optional[int] = None) -> int:
+        """Ставит рассылку в очередь. Возвращает id рассылки."""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        async with self._session_factory() as session:
+            job = BroadcastJob(kind=kind, text=text, requested_by=requested_by, total=len(chat_ids))
+            session.add(job)
+            await session.flush()
+            if chat_ids:
+                await session.execute(
+                    insert(BroadcastDelivery),
+                    [{"job_id": job.id, "chat_id": chat_id} for chat_id in chat_ids],
+                )
+            await session.commit()
+        logger.info(f"Рассылка #{job.id} ({kind}) поставлена в очередь: получателей {len(chat_ids)}")
+        self._wakeup.set()
+        return job.id
+
+    # ——— Отправка ———
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        while True:
+            now = time.monotonic()
+            delay = max(self._paused_until, self._chat_next.get(chat_id, 0.0)) - now
+            if delay <= 0:
+                delay = self._bucket.try_take()
+                if delay == 0.0:
+                    self._chat_next[chat_id] = now + PER_CHAT_INTERVAL
+                    return
+            await asyncio.sleep(delay)
+
+    async def _send_one(self, chat_id: int, text: str) -> Tuple[str, Optional[str]]:
+        """Отправляет одно сообщение. Возвращает (статус доставки, ошибка)."""
+        error = None
+        for _ in range(self.max_attempts):
+            await self._wait_turn(chat_id)
+            try:
+                await self._bot.send_message(chat_id, text)
+                return "sent", None
+            except TelegramRetryAfter as e:
+                # Флуд-контроль: останавливаем всю рассылку, а не только этот чат
+                self.retry_after += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"Telegram просит подождать {e.retry_after} с — рассылка приостановлена")
+                error = str(e)
+            except TelegramForbiddenError as e:
+                return "blocked", str(e)
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    return "blocked", str(e)
+                return "failed", str(e)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error = str(e)
+                await asyncio.sleep(1)
+        return "failed", error
+
+    async def _send_guarded(self, chat_id: int, text: str) -> Tuple[str, Optional[str]]:
+        async with self._semaphore:
+            try:
+                return await self._send_one(chat_id, text)
+            except Exception as e:
+                logger.error(f"Ошибка отправки рассылки в чат {chat_id}: {e}")
+                return "failed", str(e)
+
+    async def process_batch(self, job: BroadcastJob) -> int:
+        """Отправляет следующую пачку получателей рассылки. Возвращает размер пачки (0 — рассылка закончена)."""
+        async with self._session_factory() as session:
+            result = await session.execute(pending_deliveries(job.id, self.batch_size))
+            batch = result.all()
+        if not batch:
+            return 0
+
+        outcomes = await asyncio.gather(*(self._send_guarded(chat_id, job.text) for _, chat_id in batch))
+
+        counts = {"sent": 0, "failed": 0, "blocked": 0}
+        for status, _ in outcomes:
+            counts[status] += 1
+        sent_chats = [chat_id for (_, chat_id), (status, _) in zip(batch, outcomes) if status == "sent"]
+        blocked_chats = [chat_id for (_, chat_id), (status, _) in zip(batch, outcomes) if status == "blocked"]
+        async with self._session_factory() as session:
+            await session.execute(
+                update(BroadcastDelivery),
+                [
+                    {"id": delivery_id, "status": status, "error": error[:200] if error else None}
+                    for (delivery_id, _), (status, error) in zip(batch, outcomes)
+                ],
+            )
+            await session.execute(
+                update(BroadcastJob).where(BroadcastJob.id == job.id).values(
+                    sent=BroadcastJob.sent + counts["sent"],
+                    failed=BroadcastJob.failed + counts["failed"],
+                    blocked=BroadcastJob.blocked + counts["blocked"],
+                )
+            )
+            if blocked_chats:
+                await session.execute(
+                    update(User).where(User.telegram_id.in_(blocked_chats)).values(is_blocked=True)
+                )
+            hook = self._hooks.get(job.kind)
+            if hook is not None and sent_chats:
+                await hook(session, sent_chats)
+            await session.commit()
+
+        self.sent += counts["sent"]
+        self.failed += counts["failed"]
+        self.blocked += counts["blocked"]
+        self._prune_chats()
+        return len(batch)
+
+    def _prune_chats(self) -> None:
+        if len(self._chat_next) > 10 * self.batch_size:
+            now = time.monotonic()
+            self._chat_next = {chat_id: at for chat_id, at in self._chat_next.items() if at > now}
+
+    async def _finish(self, job_id: int) -> None:
+        async with self._session_factory() as session:
+            job = await session.get(BroadcastJob, job_id)
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            await session.commit()
+        logger.info(
+            f"Рассылка #{job.id} ({job.kind}) завершена: отправлено {job.sent}, "
+            f"не доставлено {job.failed}, заблокировали бота {job.blocked}"
+        )
+        if job.requested_by:
+            try:
+                await self._bot.send_message(
+                    job.requested_by,
+                    f"📬 Рассылка завершена\n\n"
+                    f"✅ Отправлено: {job.sent} из {job.total}\n"
+                    f"❌ Не доставлено: {job.failed}\n"
+                    f"🚫 Заблокировали бота: {job.blocked}",
+                )
+            except Exception as e:
+                logger.error(f"Не удалось отправить отчёт о рассылке #{job.id}: {e}")
+
+    async def _next_job(self) -> Optional[BroadcastJob]:
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(BroadcastJob).where(BroadcastJob.status == "running").order_by(BroadcastJob.id).limit(1)
+            )
+            return result.scalar_one_or_none()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                job = await self._next_job()
+                if job is None:
+                    await self._wakeup.wait()
+                    self._wakeup.clear()
+                    continue
+                while not self._closing and await self.process_batch(job):
+                    pass
+                if not self._closing:
+                    await self._finish(job.id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка рассылки: {e}")
+                await asyncio.sleep(5)
+
+    def start(self, bot: Bot) -> None:
+        """Запускает фоновую отправку; незавершённые до рестарта рассылки продолжаются."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Дожидается текущей пачки (её итоги записываются) и останавливается; остальное — после рестарта."""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+
+    async def stats(self) -> dict:
+        async with self._session_factory() as session:
+            running = (await session.execute(
+                select(func.count()).select_from(BroadcastJob).where(BroadcastJob.status == "running")
+            )).scalar_one()
+        return {
+            "running_jobs": running,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "retry_after": self.retry_after,
+            "tokens": self._bucket.stats()["tokens"],
+        }
+
+
+broadcasts = BroadcastEngine(
+    AsyncSessionLocal,
+    rate=BROADCAST_RATE,
+    concurrency=BROADCAST_CONCURRENCY,
+    batch_size=BROADCAST_BATCH_SIZE,
+    max_attempts=BROADCAST_MAX_ATTEMPTS,
+)
@@ -0,0 +1,138 @@
+"""
+Буферизованная запись действий пользователей в лист Events.
+
+Хэндлеры только кладут строку в ограниченную очередь и сразу продолжают
+работу. Фоновая задача забирает строки пачками и пишет их одним append_rows
+каждые batch_size строк или flush_interval секунд. При переполнении очереди
+новые события отбрасываются (логирование не должно тормозить бота),
+при остановке очередь дописывается до конца.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventSink:
+    """Асинхронный приёмник событий с пакетной записью."""
+
+    def __init__(
+        self,
+        writer: Callable[[List[list]], Awaitable[None]],
+        max_queue: int,
+        batch_size: int,
+        flush_interval: float,
+    ):
+        self._writer = writer
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[list] = []  # пачка, которую не удалось записать
+
+        # Метрики
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    def emit(self, row: list) -> bool:
+        """Ставит строку в очередь, не дожидаясь записи. False — событие отброшено."""
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Events: очередь переполнена, отброшено событий: {self.dropped}")
+            return False
+        self.enqueued += 1
+        if self.queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    def _take_batch(self) -> List[list]:
+        batch, self._pending = self._pending, []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def flush(self) -> int:
+        """Записывает одну пачку. Возвращает количество записанных строк."""
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        try:
+            await self._writer(batch)
+        except Exception as e:
+            self.flush_errors += 1
+            # Оставляем пачку для следующей попытки, если не вытесняем ею очередь
+            if len(batch) + self.queue.qsize() <= self.max_queue:
+                self._pending = batch
+            else:
+                self.dropped += len(batch)
+            logger.debug(f"Events: не удалось записать {len(batch)} строк (некритично): {e}")
+            return 0
+        self.flushes += 1
+        self.written += len(batch)
+        logger.debug(f"Events: записано {len(batch)} строк")
+        return len(batch)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            # Ждём, пока наберётся пачка, но не дольше flush_interval
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            while True:
+                written = await self.flush()
+                if not written and self._pending and not self._closing:
+                    # Sheets недоступен — не долбим его повторами без паузы
+                    await asyncio.sleep(self.flush_interval)
+                if written < self.batch_size:
+                    break
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и дописывает всё, что осталось в очереди."""
+        if self._task is not None:
+            self._closing = True
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+        while self._pending or (self._queue is not None and not self._queue.empty()):
+            if not await self.flush():
+                break
+        if self._pending or (self._queue is not None and not self._queue.empty()):
+            logger.warning(f"Events: при остановке не записано {len(self._pending) + self.queue.qsize()} строк")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() + len(self._pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
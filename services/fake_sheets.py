@@ -0,0 +1,280 @@
+"""
+Таблица Google Sheets в памяти процесса — для бенчмарков и тестов без сети.
+
+FakeClient повторяет ту часть API gspread, которой пользуется бот
+(open_by_key, worksheet, row_values, col_values, batch_get, batch_update,
+append_rows, get_all_records, deleteDimension и запрос версии файла в Drive),
+поэтому весь путь бронирования — зеркало Schedule, SlotWriter, очередь
+Events, квоты и breaker в google_io — работает на нём без изменений.
+
+Задержка каждого запроса, доля ошибок 503 и поминутная квота (сверх неё —
+429, как у настоящего API) настраиваются, чтобы нагрузочные тесты видели
+то же поведение, что и в проде.
+
+Включается через SHEETS_BACKEND=fake.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all, to_records
+
+SCHEDULE_HEADERS = ["Дата", "Время", "Тренер", "Свободно", "Цена", "Типтренировки"]
+FAQ_HEADERS = ["Вопрос", "Ответ"]
+EVENTS_HEADERS = ["Telegram ID", "Время", "Действие"]
+
+
+def _api_error(code: int, message: str) -> APIError:
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({"error": {"code": code, "message": message, "status": "FAKE"}}).encode()
+    return APIError(response)
+
+
+class _Response:
+    """Ответ Drive API с метаданными файла."""
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class FakeWorksheet:
+    """Лист: строки хранятся как списки строк, как их отдаёт FORMATTED_VALUE."""
+
+    def __init__(self, spreadsheet: "FakeSpreadsheet", sheet_id: int, title: str, rows: List[List]):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self._rows: List[List[str]] = [[str(value) for value in row] for row in rows]
+
+    # ——— Чтение ———
+
+    def row_values(self, row: int) -> List[str]:
+        with self.spreadsheet.request():
+            return self._trim(list(self._rows[row - 1])) if row <= len(self._rows) else []
+
+    def col_values(self, col: int) -> List[str]:
+        with self.spreadsheet.request():
+            values = [row[col - 1] if col <= len(row) else "" for row in self._rows]
+            return self._trim(values)
+
+    def batch_get(self, ranges: Iterable[str], **kwargs) -> List[List[List[str]]]:
+        with self.spreadsheet.request():
+            return [self._get_range(a1) for a1 in ranges]
+
+    def get_all_records(self, **kwargs) -> List[Dict]:
+        with self.spreadsheet.request():
+            if not self._rows:
+                return []
+            headers, values = self._rows[0], self._rows[1:]
+            return to_records(headers, [numericise_all(list(row)) for row in values])
+
+    # ——— Запись ———
+
+    def batch_update(self, data: List[dict], **kwargs) -> dict:
+        with self.spreadsheet.request(write=True):
+            for item in data:
+                self._set_range(item["range"], item["values"])
+            return {"totalUpdatedCells": sum(len(row) for item in data for row in item["values"])}
+
+    def update(self, values: List[List], range_name: str = "A1", **kwargs) -> dict:
+        with self.spreadsheet.request(write=True):
+            self._set_range(range_name, values)
+            return {"updatedRange": range_name}
+
+    def append_rows(self, values: List[List], **kwargs) -> dict:
+        with self.spreadsheet.request(write=True):
+            self._rows.extend([str(value) for value in row] for row in values)
+            return {"updates": {"updatedRows": len(values)}}
+
+    # ——— Диапазоны ———
+
+    @staticmethod
+    def _trim(values: List[str]) -> List[str]:
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def _grid(self, a1: str):
+        grid = a1_range_to_grid_range(a1)
+        return (grid.get("startRowIndex", 0), grid.get("endRowIndex", len(self._rows)),
+                grid.get("startColumnIndex", 0), grid.get("endColumnIndex"))
+
+    def _get_range(self, a1: str) -> List[List[str]]:
+        row_start, row_end, col_start, col_end = self._grid(a1)
+        values = [self._trim(list(row[col_start:col_end])) for row in self._rows[row_start:row_end]]
+        # Как и настоящий API, не возвращаем пустые строки в конце диапазона
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _set_range(self, a1: str, values: List[List]) -> None:
+        row_start, _, col_start, _ = self._grid(a1)
+        for offset, row_values in enumerate(values):
+            index = row_start + offset
+            while len(self._rows) <= index:
+                self._rows.append([])
+            row = self._rows[index]
+            needed = col_start + len(row_values)
+            if len(row) < needed:
+                row.extend([""] * (needed - len(row)))
+            row[col_start:needed] = [str(value) for value in row_values]
+
+    def _delete_rows(self, start_index: int, end_index: int) -> None:
+        del self._rows[start_index:end_index]
+
+
+class FakeSpreadsheet:
+    """Таблица с листами, счётчиком версий и имитацией задержки, ошибок и квоты."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, quota_per_minute: int = 0):
+        self.id = "fake-spreadsheet"
+        self.latency = latency
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.version = 1
+
+        self._sheets: Dict[str, FakeWorksheet] = {}
+        self._lock = threading.RLock()
+        self._recent: deque = deque()  # время запросов за последнюю минуту
+
+        # Метрики
+        self.requests = 0
+        self.writes = 0
+        self.injected_errors = 0
+        self.quota_errors = 0
+
+    def request(self, write: bool = False) -> "_FakeRequest":
+        return _FakeRequest(self, write)
+
+    def _admit(self) -> None:
+        """Задержка, квота и случайные ошибки одного запроса (вызывается до выполнения)."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.quota_per_minute and len(self._recent) >= self.quota_per_minute:
+                self.quota_errors += 1
+                raise _api_error(429, "Quota exceeded for quota metric 'Read requests' (fake)")
+            self._recent.append(now)
+        if self.error_rate and random.random() < self.error_rate:
+            self.injected_errors += 1
+            raise _api_error(503, "The service is currently unavailable (fake)")
+
+    # ——— Листы ———
+
+    def add_worksheet(self, title: str, rows: int = 1, cols: int = 1, **kwargs) -> FakeWorksheet:
+        with self.request(write=True):
+            return self._add(title, [])
+
+    def _add(self, title: str, rows: List[List]) -> FakeWorksheet:
+        sheet = FakeWorksheet(self, len(self._sheets), title, rows)
+        self._sheets[title] = sheet
+        return sheet
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        with self.request():
+            sheet = self._sheets.get(title)
+        if sheet is None:
+            raise WorksheetNotFound(title)
+        return sheet
+
+    def batch_update(self, body: dict) -> dict:
+        """Поддерживается только deleteDimension по строкам."""
+        with self.request(write=True):
+            by_id = {sheet.id: sheet for sheet in self._sheets.values()}
+            for request in body.get("requests", []):
+                grid = request["deleteDimension"]["range"]
+                by_id[grid["sheetId"]]._delete_rows(grid["startIndex"], grid["endIndex"])
+            return {"replies": [{} for _ in body.get("requests", [])]}
+
+    def metadata(self) -> dict:
+        with self.request():
+            return {"version": str(self.version), "modifiedTime": f"fake-{self.version}"}
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "writes": self.writes,
+            "injected_errors": self.injected_errors,
+            "quota_errors": self.quota_errors,
+            "version": self.version,
+        }
+
+    # ——— Демо-данные ———
+
+    @classmethod
+    def with_demo_data(cls, days: int = 14, trainers: Iterable[str] = ("Екатерина", "Анна", "Ольга"),
+                       times: Iterable[str] = ("09:00", "10:00", "11:00", "18:00", "19:00"),
+                       seats: int = 4, **kwargs) -> "FakeSpreadsheet":
+        """Таблица с расписанием на days дней вперёд, FAQ и пустым листом Events."""
+        spreadsheet = cls(**kwargs)
+        schedule = [SCHEDULE_HEADERS]
+        today = date.today()
+        for offset in range(days):
+            slot_date = (today + timedelta(days=offset)).strftime("%d.%m.%Y")
+            for trainer in trainers:
+                for slot_time in times:
+                    schedule.append([slot_date, slot_time, trainer, seats, 1000, ""])
+        spreadsheet._add("Schedule", schedule)
+        spreadsheet._add("FAQ", [
+            FAQ_HEADERS,
+            ["Сколько длится занятие?", "Занятие длится 55 минут."],
+            ["Что взять с собой?", "Удобную одежду и носки с нескользящей подошвой."],
+        ])
+        spreadsheet._add("Events", [EVENTS_HEADERS])
+        return spreadsheet
+
+
+class _FakeRequest:
+    """Контекст одного запроса к таблице: имитация сети и блокировка данных."""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet, write: bool):
+        self._spreadsheet = spreadsheet
+        self._write = write
+
+    def __enter__(self):
+        self._spreadsheet._admit()
+        self._spreadsheet._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self._write:
+            self._spreadsheet.writes += 1
+            self._spreadsheet.version += 1
+        self._spreadsheet._lock.release()
+        return False
+
+
+class _FakeHTTPClient:
+    """Заглушка http_client для запроса метаданных файла в Drive."""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self._spreadsheet = spreadsheet
+
+    def request(self, method: str, url: str, params: Optional[dict] = None, **kwargs) -> _Response:
+        return _Response(self._spreadsheet.metadata())
+
+
+class FakeClient:
+    """Замена gspread.Client: любая таблица открывается как один и тот же FakeSpreadsheet."""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+        self.http_client = _FakeHTTPClient(spreadsheet)
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.spreadsheet
@@ -0,0 +1,160 @@
+"""
+FAQ в памяти с постоянными числовыми id.
+
+Раньше открытие FAQ и каждый ответ читали весь лист FAQ, а callback_data
+собиралась из первых 50 символов вопроса: кириллица занимает 2 байта, и
+строка вылезала за лимит Telegram в 64 байта. Теперь лист загружается
+в снимок (FaqSnapshot) с id у каждого вопроса. id — короткий хэш текста
+вопроса (faq_id), он не зависит от порядка строк в листе и от рестартов
+бота, поэтому кнопки в старых сообщениях открывают тот же вопрос, пока
+не поменяется его текст. Снимок обновляется в фоне при смене ревизии таблицы, а
+пользователю всегда отдаётся то, что уже в памяти.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.split()).casefold()
+
+
+def faq_id(question: str, occurrence: int = 0) -> int:
+    """
+    Постоянный id вопроса: 48 бит blake2b от нормализованного текста
+    (регистр и лишние пробелы не важны). occurrence различает одинаковые
+    вопросы в листе.
+    """
+    key = _normalize_question(question)
+    if occurrence:
+        key = f"{key}#{occurrence}"
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=6).digest(), "big")
+
+
+class FaqEntry:
+    """Один вопрос FAQ."""
+
+    __slots__ = ("id", "question", "answer")
+
+    def __init__(self, entry_id: int, question: str, answer: str):
+        self.id = entry_id
+        self.question = question
+        self.answer = answer
+
+
+class FaqSnapshot:
+    """Неизменяемая версия FAQ; клавиатура строится один раз на версию."""
+
+    __slots__ = ("version", "entries", "by_id", "keyboard")
+
+    def __init__(self, version: int, entries: List[FaqEntry]):
+        self.version = version
+        self.entries = entries
+        self.by_id: Dict[int, FaqEntry] = {entry.id: entry for entry in entries}
+        self.keyboard = None  # InlineKeyboardMarkup, заполняется роутером FAQ при первом показе
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def build_entries(pairs: List[Tuple[str, str]]) -> List[FaqEntry]:
+    """Пары (вопрос, ответ) из листа → записи с постоянными id."""
+    entries, used = [], set()
+    for question, answer in pairs:
+        occurrence = 0
+        entry_id = faq_id(question)
+        while entry_id in used:
+            occurrence += 1
+            entry_id = faq_id(question, occurrence)
+        used.add(entry_id)
+        entries.append(FaqEntry(entry_id, question, answer))
+    return entries
+
+
+class FaqCache:
+    """Снимок FAQ с фоновым обновлением (stale-while-revalidate)."""
+
+    def __init__(self, loader: Callable[[], Awaitable[List[Tuple[str, str]]]], max_age: float):
+        self._loader = loader
+        self.max_age = max_age
+
+        self._snapshot: Optional[FaqSnapshot] = None
+        self._loaded_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._listeners: List[Callable[[FaqSnapshot, Optional[FaqSnapshot]], None]] = []
+
+        # Метрики
+        self.hits = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    def on_change(self, callback: Callable[[FaqSnapshot, Optional[FaqSnapshot]], None]) -> None:
+        """Колбэк (новый снимок, старый снимок) после каждой загрузки, изменившей FAQ."""
+        self._listeners.append(callback)
+
+    async def get(self) -> FaqSnapshot:
+        """
+        Текущий снимок. Ждёт загрузку только при самом первом обращении;
+        устаревший снимок отдаётся сразу, а обновление идёт в фоне.
+        """
+        if self._snapshot is None:
+            return await self.refresh()
+        self.hits += 1
+        if time.monotonic() - self._loaded_at >= self.max_age:
+            self._start_refresh()
+        return self._snapshot
+
+    def _start_refresh(self) -> asyncio.Future:
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+        return self._inflight
+
+    async def refresh(self) -> FaqSnapshot:
+        """Перечитывает лист (параллельные вызовы ждут одну загрузку)."""
+        try:
+            return await asyncio.shield(self._start_refresh())
+        except Exception as e:
+            if self._snapshot is not None:
+                logger.warning(f"FAQ: обновление не удалось, используется старый снимок: {e}")
+                return self._snapshot
+            raise
+
+    def warm(self) -> None:
+        """Загружает FAQ в фоне, чтобы первый пользователь не ждал Sheets."""
+        self._start_refresh().add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def _load(self) -> FaqSnapshot:
+        try:
+            pairs = await self._loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            self._inflight = None
+        self.loads += 1
+        self._loaded_at = time.monotonic()
+
+        entries = build_entries(pairs)
+
+        old = self._snapshot
+        if old is not None and [(e.id, e.answer) for e in old.entries] == [(e.id, e.answer) for e in entries]:
+            return old  # содержимое не изменилось — клавиатура и индексы остаются прежними
+        self._snapshot = FaqSnapshot((old.version + 1) if old else 1, entries)
+        logger.info(f"FAQ: загружено {len(entries)} вопросов (версия {self._snapshot.version})")
+        for callback in self._listeners:
+            callback(self._snapshot, old)
+        return self._snapshot
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._snapshot) if self._snapshot else 0,
+            "version": self._snapshot.version if self._snapshot else 0,
+            "hits": self.hits,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+        }
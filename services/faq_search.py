@@ -0,0 +1,282 @@
+"""
+Полнотекстовый поиск по FAQ для вопросов, написанных своими словами.
+
+Вопросы и ответы FAQ разбиваются на слова, слова приводятся к основе
+облегчённым стеммером Snowball для русского языка ("занятия", "занятие",
+"занятий" → "занят"), и по основам строится инвертированный индекс.
+Стеммер без словаря иногда режет однокоренные слова по-разному
+("отменить" → "отмен", "отмена" → "отм"), поэтому к основе добавляется
+ещё и префикс слова из PREFIX_LENGTH букв ("отмен").
+Запрос ранжируется по BM25; слова из вопроса FAQ весят больше слов из
+ответа. Индекс обновляется по разнице между версиями FAQ: переиндексируются
+только добавленные и изменённые записи. Весь индекс при правке не
+пересчитывается: нормировка по длине записи обновляется лениво (раз на пакет
+изменений), а веса слова (idf × нормированная частота) — при первом
+запросе с этим словом. Частые слова запроса не перебирают все свои
+вхождения: как только новая запись уже не может догнать лучшие limit
+(оценка MaxScore), они лишь досчитывают кандидатов.
+"""
+
+import heapq
+import math
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.faq_cache import FaqEntry, FaqSnapshot
+
+WORD_RE = re.compile(r"[а-яёa-z0-9]+")
+
+STOP_WORDS = frozenset(
+    "а без бы в во вы да для до же за и из или им их к как ко ли мне мы на над не нет ни но "
+    "о об он она они от по под при про с со так то у уже что чтобы это я ли ну вот где когда "
+    "можно нужно ваш ваши вас вам мой моя мои у меня есть".split()
+)
+
+# Вес слова из текста вопроса относительно слова из ответа
+QUESTION_WEIGHT = 3
+PREFIX_LENGTH = 5
+RESULT_CACHE_SIZE = 256
+
+VOWELS = "аеиоуыэюя"
+# Группы окончаний: первая допустима только после "а"/"я", вторая — после любой буквы
+PERFECTIVE_GERUND = (("вшись", "вши", "в"), ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв"))
+ADJECTIVE = ("ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+             "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею")
+PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+REFLEXIVE = ("ся", "сь")
+VERB = (("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н"),
+        ("ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют",
+         "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю"))
+NOUN = ("иями", "ями", "ами", "иях", "иям", "ием", "ией", "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой",
+        "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья", "а", "е", "и", "й", "о", "у",
+        "ы", "ь", "ю", "я")
+SUPERLATIVE = ("ейше", "ейш")
+
+
+def _longest_first(*groups: Tuple[str, ...]) -> Tuple[Tuple[str, ...], ...]:
+    return tuple(tuple(sorted(group, key=len, reverse=True)) for group in groups)
+
+
+PERFECTIVE_GERUND = _longest_first(*PERFECTIVE_GERUND)
+PARTICIPLE = _longest_first(*PARTICIPLE)
+VERB = _longest_first(*VERB)
+(ADJECTIVE, REFLEXIVE, NOUN, SUPERLATIVE) = _longest_first(ADJECTIVE, REFLEXIVE, NOUN, SUPERLATIVE)
+
+
+def _strip(word: str, start: int, endings: Iterable[str], after_a_ya: bool = False) -> Optional[str]:
+    """Отрезает самое длинное окончание из endings (отсортированы по длине), не заходя левее start (RV)."""
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            if after_a_ya:
+                # Окончания первой группы допустимы только после "а" или "я"
+                prefix = word[:-len(ending)]
+                if not prefix.endswith(("а", "я")) or len(prefix) - 1 < start:
+                    continue
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_group(word: str, start: int, groups: Tuple[Tuple[str, ...], ...]) -> Optional[str]:
+    first, *rest = groups
+    result = _strip(word, start, first, after_a_ya=True)
+    if result is not None:
+        return result
+    for group in rest:
+        result = _strip(word, start, group)
+        if result is not None:
+            return result
+    return None
+
+
+@lru_cache(maxsize=20000)
+def stem(word: str) -> str:
+    """Основа русского слова по упрощённому алгоритму Snowball."""
+    word = word.lower().replace("ё", "е")
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in VOWELS), len(word))
+    if rv >= len(word):
+        return word
+
+    # Шаг 1: деепричастия, иначе возвратность + прилагательные/причастия/глаголы/существительные
+    result = _strip_group(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip_group(result, rv, PARTICIPLE) or result
+        else:
+            result = _strip_group(word, rv, VERB)
+            if result is None:
+                result = _strip(word, rv, NOUN)
+    word = result if result is not None else word
+
+    # Шаг 2-4: "и", превосходная степень, "нн" → "н", мягкий знак
+    word = _strip(word, rv, ("и",)) or word
+    word = _strip(word, rv, SUPERLATIVE) or word
+    if word.endswith("нн") and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, rv, ("ь",)) or word
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Основы значимых слов текста плюс их префиксы (если префикс не совпал с основой)."""
+    tokens = []
+    for word in WORD_RE.findall(text.lower().replace("ё", "е")):
+        if word in STOP_WORDS:
+            continue
+        base = stem(word)
+        tokens.append(base)
+        if len(word) > PREFIX_LENGTH and base != word[:PREFIX_LENGTH]:
+            tokens.append(word[:PREFIX_LENGTH])
+    return tokens
+
+
+class FaqSearchIndex:
+    """Инвертированный индекс по FAQ с ранжированием BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}   # основа → {id записи: частота}
+        self._lengths: Dict[int, int] = {}
+        self._terms: Dict[int, Dict[str, int]] = {}      # id → частоты основ (для удаления)
+        self._entries: Dict[int, FaqEntry] = {}
+        self._total_length = 0
+        # Нормировка BM25 по длине записи: зависит от средней длины, поэтому
+        # пересчитывается лениво при первом поиске после изменений — O(записей)
+        self._norms: Dict[int, float] = {}
+        # основа → (веса BM25 по записям, их максимум): кэш до следующего изменения индекса
+        self._weights: Dict[str, Tuple[Dict[int, float], float]] = {}
+        self._dirty = False
+        # (основы запроса, limit) → ответ; живёт до следующего изменения индекса,
+        # повторные вопросы ("как отменить запись") не пересчитываются
+        self._results: OrderedDict = OrderedDict()
+
+        # Метрики
+        self.searches = 0
+        self.cache_hits = 0
+        self.reindexed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: FaqEntry) -> None:
+        if entry.id in self._entries:
+            self.remove(entry.id)
+        terms: Dict[str, int] = {}
+        for term in tokenize(entry.question):
+            terms[term] = terms.get(term, 0) + QUESTION_WEIGHT
+        for term in tokenize(entry.answer):
+            terms[term] = terms.get(term, 0) + 1
+        for term, freq in terms.items():
+            self._postings.setdefault(term, {})[entry.id] = freq
+        length = sum(terms.values())
+        self._entries[entry.id] = entry
+        self._terms[entry.id] = terms
+        self._lengths[entry.id] = length
+        self._total_length += length
+        self._dirty = True
+        self.reindexed += 1
+
+    def remove(self, entry_id: int) -> None:
+        terms = self._terms.pop(entry_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(entry_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(entry_id)
+        del self._entries[entry_id]
+        self._dirty = True
+
+    def apply(self, snapshot: FaqSnapshot, previous: Optional[FaqSnapshot] = None) -> None:
+        """Приводит индекс к новой версии FAQ, переиндексируя только изменившиеся записи."""
+        for entry_id in [entry_id for entry_id in self._entries if entry_id not in snapshot.by_id]:
+            self.remove(entry_id)
+        for entry in snapshot.entries:
+            current = self._entries.get(entry.id)
+            if current is None or current.question != entry.question or current.answer != entry.answer:
+                self.add(entry)
+            else:
+                self._entries[entry.id] = entry
+        if self._dirty:
+            self._results.clear()
+
+    def _refresh_norms(self) -> None:
+        count = len(self._entries)
+        avg_length = self._total_length / count if count else 1.0
+        self._norms = {
+            entry_id: self.k1 * (1 - self.b + self.b * length / avg_length)
+            for entry_id, length in self._lengths.items()
+        }
+        self._weights.clear()
+        self._results.clear()
+        self._dirty = False
+
+    def _term_weights(self, term: str, postings: Dict[int, int]) -> Tuple[Dict[int, float], float]:
+        """Веса BM25 основы по записям и их максимум (считаются при первом запросе с основой)."""
+        cached = self._weights.get(term)
+        if cached is None:
+            count, norms = len(self._entries), self._norms
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            scale = idf * (self.k1 + 1)
+            weights = {entry_id: scale * freq / (freq + norms[entry_id]) for entry_id, freq in postings.items()}
+            cached = self._weights[term] = (weights, max(weights.values()))
+        return cached
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[FaqEntry, float]]:
+        """Лучшие записи по BM25 (по убыванию релевантности)."""
+        self.searches += 1
+        if not self._entries:
+            return []
+        if self._dirty:
+            self._refresh_norms()
+        terms = frozenset(tokenize(query))
+        cached = self._results.get((terms, limit))
+        if cached is not None:
+            self._results.move_to_end((terms, limit))
+            self.cache_hits += 1
+            return cached
+        best = heapq.nlargest(limit, self._score(terms, limit).items(), key=lambda item: item[1])
+        result = [(self._entries[entry_id], score) for entry_id, score in best]
+        self._results[(terms, limit)] = result
+        if len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return result
+
+    def _score(self, terms: frozenset, limit: int) -> Dict[int, float]:
+        # (верхняя граница вклада основы, веса); самые весомые — первыми
+        plan = [self._term_weights(term, self._postings[term]) for term in terms if term in self._postings]
+        plan.sort(key=lambda item: item[1], reverse=True)
+
+        scores: Dict[int, float] = {}
+        remaining = sum(bound for _, bound in plan)
+        pruned = False
+        for weights, bound in plan:
+            if not pruned and len(scores) >= limit:
+                # Порог только растёт, а остаток только убывает — после переключения не проверяем
+                pruned = heapq.nlargest(limit, scores.values())[-1] >= remaining
+            if pruned:
+                # Запись без набранных очков уже не догонит лучшие limit — досчитываем только кандидатов
+                for entry_id in scores.keys() & weights.keys():
+                    scores[entry_id] += weights[entry_id]
+            else:
+                get = scores.get
+                for entry_id, weight in weights.items():
+                    scores[entry_id] = get(entry_id, 0.0) + weight
+            remaining -= bound
+        return scores
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "terms": len(self._postings),
+            "searches": self.searches,
+            "cache_hits": self.cache_hits,
+            "reindexed": self.reindexed,
+        }
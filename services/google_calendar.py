@@ -1,67 +1,420 @@
+"""
+Синхронизация броней с календарями тренеров в Google Calendar.
+
+Событие брони получает детерминированный id (calendar_event_id): повтор
+вставки после таймаута не создаёт дубль, а возвращает 409, и вставка
+превращается в patch. Хэндлеры только ставят id брони в outbox
+(services/outbox.py) — в той же транзакции, что и изменение брони.
+Синхронизация сама решает, что сделать с событием по текущему состоянию
+брони в БД: создать, обновить (перенос) или удалить (отмена). Операции
+пачки уходят одним BatchHttpRequest. Ночная сверка (reconcile_calendar)
+читает календарь каждого тренера одним events.list за диапазон дат и
+досинхронизирует всё, что разошлось с БД.
+
+События броней создаются прозрачными (transparency=transparent): они не
+занимают время тренера во freebusy, и trainer_busy видит только его
+собственные дела.
+"""
+
 import logging
-from datetime import datetime, timedelta
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import google_auth_httplib2
+import httplib2
+import pytz
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from config import GOOGLE_SERVICE_ACCOUNT_FILE, TIMEZONE
+from config import (
+    GOOGLE_SERVICE_ACCOUNT_FILE, TIMEZONE, TRAINER_CALENDAR_IDS, CALENDAR_EVENT_ID_PREFIX,
+    CALENDAR_BATCH_SIZE, SCHEDULE_WINDOW_DAYS,
+    FREEBUSY_NEAR_DAYS, FREEBUSY_REFRESH_INTERVAL, FREEBUSY_FULL_REFRESH_INTERVAL,
+)
+from db import AsyncSessionLocal, Booking
+from db.queries import bookings_between
+from services.google_executor import google_io
+from services.google_quota import Priority, error_status
+from services.outbox import PermanentError, enqueue, outbox
+from services.trainer_busy import Interval, TrainerBusyCache
+from utils.helpers import booking_lesson_start
 
 logger = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Метка событий бота (приватное extendedProperty): сверка читает только их
+CALENDAR_SOURCE = "pilates-bot"
+# Брони в этих статусах не должны висеть в календаре тренера
+CANCELLED_STATUSES = ("cancelled", "late_cancel")
+LESSON_DURATION = timedelta(hours=1)
+
+# Операция над событием: (id брони, "insert" | "patch" | "delete", календарь, id события, тело)
+CalendarOp = Tuple[int, str, str, str, Optional[dict]]
+
+# Сервис (discovery-документ) и ключ сервисного аккаунта загружаются один раз.
+# httplib2.Http не потокобезопасен, поэтому у каждого потока пула google_io свой HTTP-клиент.
+_service = None
+_credentials: Optional[Credentials] = None
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def calendar_configured() -> bool:
+    """False, если нет ключа сервисного аккаунта — обращаться к Google Calendar бессмысленно."""
+    return os.path.exists(GOOGLE_SERVICE_ACCOUNT_FILE)
+
+
 def _get_calendar_service():
-    creds = Credentials.from_service_account_file(GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('calendar', 'v3', credentials=creds)
+    global _service, _credentials
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _credentials = Credentials.from_service_account_file(GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+                _service = build('calendar', 'v3', credentials=_credentials, cache_discovery=False)
+    return _service
+
 
+def _thread_http() -> google_auth_httplib2.AuthorizedHttp:
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        _get_calendar_service()
+        http = _thread_local.http = google_auth_httplib2.AuthorizedHttp(_credentials, http=httplib2.Http())
+    return http
 
-async def create_calendar_event(booking) -> bool:
+
+def calendar_event_id(booking_id: int) -> str:
     """
-    Создаёт событие в Google Calendar конкретного тренера
-    booking — объект модели Booking из БД
+    Детерминированный id события брони. Google допускает в id только
+    цифры и латиницу a-v, поэтому префикс задаётся в том же алфавите.
     """
-    try:
-        # Находим Calendar ID тренера из Google Sheets (мы сохраним его при чтении слота)
-        # Временно — заглушка: нужно будет доработать при интеграции с Schedule
-        trainer_to_calendar = {
-            "Екатерина": "c_ekaterina@example.com",
-            "Анна": "c_anna@example.com",
-            "Ольга": "c_olga@example.com",
-        }
-        calendar_id = trainer_to_calendar.get(booking.trainer)
+    return f"{CALENDAR_EVENT_ID_PREFIX}{booking_id:08d}"
+
+
+def lesson_start(booking) -> datetime:
+    """Начало занятия в TIMEZONE (aware datetime)."""
+    return booking_lesson_start(booking).astimezone(pytz.timezone(TIMEZONE))
+
+
+def build_event(booking) -> dict:
+    """Событие календаря для брони (booking.user должен быть загружен)."""
+    start_time = lesson_start(booking).replace(tzinfo=None)
+    end_time = start_time + LESSON_DURATION
+    full_name = booking.user.full_name if booking.user is not None else None
+    return {
+        'summary': f'Пилатес • {full_name or "Клиент"}',
+        'description': f'Telegram: @{booking.user_id}\nОплата: {booking.payment_type}',
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'attendees': [],
+        'transparency': 'transparent',
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': 120},
+                {'method': 'popup', 'minutes': 30},
+            ],
+        },
+        'extendedProperties': {
+            'private': {'source': CALENDAR_SOURCE, 'booking_id': str(booking.id)},
+        },
+    }
+
+
+def _request(service, op: str, calendar_id: str, event_id: str, body: Optional[dict]):
+    events = service.events()
+    if op == "insert":
+        return events.insert(calendarId=calendar_id, body=dict(body, id=event_id))
+    if op == "patch":
+        # status=confirmed восстанавливает событие, удалённое вручную
+        return events.patch(calendarId=calendar_id, eventId=event_id, body=dict(body, status="confirmed"))
+    return events.delete(calendarId=calendar_id, eventId=event_id)
+
+
+def _execute_ops_sync(ops: List[CalendarOp]) -> Dict[int, Optional[BaseException]]:
+    """
+    Выполняет операции одним BatchHttpRequest (одиночную — обычным запросом).
+    Возвращает ошибку по каждой брони (None — успех).
+    """
+    service = _get_calendar_service()
+    http = _thread_http()
+    if len(ops) == 1:
+        booking_id, op, calendar_id, event_id, body = ops[0]
+        try:
+            _request(service, op, calendar_id, event_id, body).execute(http=http)
+        except Exception as e:
+            if error_status(e) is None:
+                raise  # сетевая ошибка — как у batch-запроса целиком
+            return {booking_id: e}
+        return {booking_id: None}
+
+    results: Dict[int, Optional[BaseException]] = {}
+
+    def on_response(request_id, response, exception):
+        results[ops[int(request_id)][0]] = exception
+
+    batch = service.new_batch_http_request(callback=on_response)
+    for position, (_, op, calendar_id, event_id, body) in enumerate(ops):
+        batch.add(_request(service, op, calendar_id, event_id, body), request_id=str(position))
+    batch.execute(http=http)
+    return results
+
+
+async def _run_ops(ops: List[CalendarOp], priority: Priority = Priority.NORMAL) -> Dict[int, Optional[BaseException]]:
+    """Выполняет операции пачками по CALENDAR_BATCH_SIZE."""
+    results: Dict[int, Optional[BaseException]] = {}
+    for i in range(0, len(ops), CALENDAR_BATCH_SIZE):
+        chunk = ops[i:i + CALENDAR_BATCH_SIZE]
+        results.update(await google_io.run(
+            _execute_ops_sync, chunk, api="calendar", priority=priority, cost=len(chunk)
+        ))
+    return results
+
+
+async def _sync_events(booking_ids: List[int]) -> Dict[int, Optional[BaseException]]:
+    """Приводит события броней к их текущему состоянию в БД."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Booking).options(selectinload(Booking.user)).where(Booking.id.in_(booking_ids))
+        )
+        bookings = result.scalars().all()
+
+    results: Dict[int, Optional[BaseException]] = {booking_id: None for booking_id in booking_ids}  # удалённые брони пропускаем
+    ops: List[CalendarOp] = []
+    for booking in bookings:
+        calendar_id = TRAINER_CALENDAR_IDS.get(booking.trainer)
         if not calendar_id:
-            logger.warning(f"Calendar ID не найден для тренера {booking.trainer}")
-            return False
-
-        service = _get_calendar_service()
-
-        event_date = datetime.strptime(f"{booking.date} 2025", "%d %B %Y").strftime("%Y-%m-%d")
-        start_time = datetime.strptime(f"{event_date} {booking.time}", "%Y-%m-%d %H:%M")
-        end_time = start_time + timedelta(hours=1)
-
-        event = {
-            'summary': f'Пилатес • {booking.user.full_name or "Клиент"}',
-            'description': f'Telegram: @{booking.user.telegram_id}\nОплата: {booking.payment_type}',
-            'start': {
-                'dateTime': start_time.isoformat(),
-                'timeZone': TIMEZONE,
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': TIMEZONE,
-            },
-            'attendees': [],
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'popup', 'minutes': 120},
-                    {'method': 'popup', 'minutes': 30},
-                ],
-            },
-        }
-
-        service.events().insert(calendarId=calendar_id, body=event).execute()
-        logger.info(f"Событие создано в календаре {booking.trainer}: {booking.date} {booking.time}")
-        return True
-
-    except Exception as e:
-        logger.error(f"Ошибка создания события в Google Calendar: {e}")
-        return False
+            results[booking.id] = PermanentError(f"Calendar ID не найден для тренера {booking.trainer}")
+            continue
+        event_id = booking.calendar_event_id or calendar_event_id(booking.id)
+        if booking.status in CANCELLED_STATUSES:
+            # Удаляем и без сохранённого id: вставка могла дойти до Google, не дождавшись ответа
+            ops.append((booking.id, "delete", calendar_id, event_id, None))
+            continue
+        try:
+            body = build_event(booking)
+        except ValueError as e:
+            results[booking.id] = PermanentError(str(e))
+            continue
+        ops.append((booking.id, "patch" if booking.calendar_event_id else "insert", calendar_id, event_id, body))
+    if not ops:
+        return results
+
+    done = await _run_ops(ops)
+    # Повторная вставка того же id → 409: событие уже есть, обновляем его; пропавшее событие создаём заново
+    fallback = []
+    for booking_id, op, calendar_id, event_id, body in ops:
+        status = error_status(done[booking_id]) if done.get(booking_id) is not None else None
+        if op == "insert" and status == 409:
+            fallback.append((booking_id, "patch", calendar_id, event_id, body))
+        elif op == "patch" and status == 404:
+            fallback.append((booking_id, "insert", calendar_id, event_id, body))
+        elif op == "delete" and status in (404, 410):
+            done[booking_id] = None  # события уже нет
+    if fallback:
+        done.update(await _run_ops(fallback))
+    results.update(done)
+
+    saved = [
+        {"id": booking.id, "calendar_event_id": calendar_event_id(booking.id)}
+        for booking in bookings
+        if booking.calendar_event_id is None and booking.status not in CANCELLED_STATUSES
+        and results.get(booking.id) is None
+    ]
+    if saved:
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(Booking), saved)
+            await session.commit()
+
+    synced = sum(1 for booking_id, *_ in ops if results.get(booking_id) is None)
+    logger.info(f"Calendar: синхронизировано событий {synced} из {len(ops)}")
+    return results
+
+
+async def _deliver_calendar(payloads: List[dict]) -> List[Optional[BaseException]]:
+    results = await _sync_events(list({payload["booking_id"] for payload in payloads}))
+    return [results.get(payload["booking_id"]) for payload in payloads]
+
+
+outbox.register("calendar", _deliver_calendar, concurrency=1, batch_size=CALENDAR_BATCH_SIZE)
+
+
+async def sync_calendar_event(booking_id: int, session: Optional[AsyncSession] = None) -> None:
+    """
+    Ставит бронь в outbox на синхронизацию с календарём тренера: после записи,
+    отмены или переноса. С session сообщение пишется в транзакцию вызывающего
+    кода — коммит и outbox.wake() за ним; без неё — отдельной транзакцией.
+    """
+    if session is not None:
+        await enqueue(session, "calendar", {"booking_id": booking_id}, dedup_key=f"calendar:{booking_id}")
+        return
+    async with AsyncSessionLocal() as own_session:
+        await enqueue(own_session, "calendar", {"booking_id": booking_id}, dedup_key=f"calendar:{booking_id}")
+        await own_session.commit()
+    outbox.wake()
+
+
+def _list_events_sync(calendar_id: str, time_min: str, time_max: str) -> List[dict]:
+    service = _get_calendar_service()
+    http = _thread_http()
+    events, page_token = [], None
+    while True:
+        response = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True,
+            privateExtendedProperty=f"source={CALENDAR_SOURCE}",
+            maxResults=2500,
+            pageToken=page_token,
+            fields="items(id,start,extendedProperties),nextPageToken",
+        ).execute(http=http)
+        events.extend(response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return events
+
+
+def _parse_rfc3339(value: str) -> datetime:
+    """
+    Время из ответа Google API. Google отдаёт UTC как "...Z", а
+    datetime.fromisoformat понимает суффикс Z только с Python 3.11.
+    """
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _event_start(event: dict) -> Optional[datetime]:
+    try:
+        return _parse_rfc3339(event["start"]["dateTime"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def reconcile_calendar(start: date, end: date) -> dict:
+    """
+    Сверяет брони с датой занятия в [start, end) с календарями тренеров:
+    одно events.list на тренера. Брони без события, с событием не на том
+    времени или отменённые, но всё ещё в календаре, ставятся в outbox.
+    События бота без брони в БД удаляются.
+    """
+    tz = pytz.timezone(TIMEZONE)
+    range_start = tz.localize(datetime.combine(start, time.min))
+    range_end = tz.localize(datetime.combine(end, time.min))
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(bookings_between(range_start, range_end))
+        bookings = {booking.id: booking for booking in result.scalars().all()}
+
+    to_sync = set()
+    foreign: List[Tuple[int, str, str]] = []  # (id брони, календарь, id события) — чужие для этого календаря
+    listed = 0
+    for trainer, calendar_id in TRAINER_CALENDAR_IDS.items():
+        events = await google_io.run(
+            _list_events_sync, calendar_id, range_start.isoformat(), range_end.isoformat(),
+            api="calendar", priority=Priority.LOW,
+        )
+        listed += len(events)
+        seen = set()
+        for event in events:
+            try:
+                booking_id = int(event.get("extendedProperties", {}).get("private", {}).get("booking_id", ""))
+            except ValueError:
+                continue
+            booking = bookings.get(booking_id)
+            if booking is None:
+                # Бронь перенесена за пределы диапазона или удалена — выясним ниже
+                foreign.append((booking_id, calendar_id, event["id"]))
+                continue
+            if booking.trainer != trainer:
+                foreign.append((booking_id, calendar_id, event["id"]))
+                continue
+            seen.add(booking_id)
+            if booking.status in CANCELLED_STATUSES or _event_start(event) != lesson_start(booking):
+                to_sync.add(booking_id)
+        for booking in bookings.values():
+            if booking.trainer == trainer and booking.id not in seen and booking.status not in CANCELLED_STATUSES:
+                to_sync.add(booking.id)
+
+    # Событие в календаре не того тренера или без брони — удаляем; у живой брони событие пересоздаст синхронизация
+    orphans: List[CalendarOp] = []
+    if foreign:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Booking.id, Booking.trainer).where(Booking.id.in_({booking_id for booking_id, _, _ in foreign}))
+            )
+            trainers = dict(result.all())
+        for booking_id, calendar_id, event_id in foreign:
+            if booking_id in trainers and TRAINER_CALENDAR_IDS.get(trainers[booking_id]) == calendar_id:
+                to_sync.add(booking_id)  # та же бронь, просто занятие теперь вне диапазона сверки
+            else:
+                orphans.append((booking_id, "delete", calendar_id, event_id, None))
+                if booking_id in trainers:
+                    to_sync.add(booking_id)
+    deleted = 0
+    if orphans:
+        results = await _run_ops(orphans, priority=Priority.LOW)
+        deleted = sum(1 for error in results.values() if error is None)
+
+    if to_sync:
+        async with AsyncSessionLocal() as session:
+            for booking_id in to_sync:
+                await sync_calendar_event(booking_id, session)
+            await session.commit()
+        outbox.wake()
+    stats = {"bookings": len(bookings), "events": listed, "resynced": len(to_sync), "orphans_deleted": deleted}
+    logger.info(f"Calendar: сверка {start}..{end}: {stats}")
+    return stats
+
+
+# ——— Занятость тренеров (freebusy) ———
+
+def _query_freebusy_sync(calendar_ids: List[str], time_min: str, time_max: str) -> dict:
+    return _get_calendar_service().freebusy().query(body={
+        "timeMin": time_min,
+        "timeMax": time_max,
+        "items": [{"id": calendar_id} for calendar_id in calendar_ids],
+    }).execute(http=_thread_http())
+
+
+async def _fetch_trainer_busy(start: datetime, end: datetime) -> Dict[str, List[Interval]]:
+    """Занятые интервалы всех тренеров одним freebusy.query."""
+    calendars = {calendar_id: trainer for trainer, calendar_id in TRAINER_CALENDAR_IDS.items() if calendar_id}
+    if not calendars:
+        return {}
+    response = await google_io.run(
+        _query_freebusy_sync, list(calendars), start.isoformat(), end.isoformat(),
+        api="calendar", priority=Priority.LOW,
+    )
+    busy: Dict[str, List[Interval]] = {}
+    for calendar_id, info in response.get("calendars", {}).items():
+        trainer = calendars.get(calendar_id)
+        if trainer is None:
+            continue
+        if info.get("errors"):
+            logger.warning(f"freebusy: календарь тренера {trainer} недоступен: {info['errors']}")
+            continue
+        busy[trainer] = [
+            (_parse_rfc3339(period["start"]), _parse_rfc3339(period["end"]))
+            for period in info.get("busy", [])
+        ]
+    return busy
+
+
+trainer_busy = TrainerBusyCache(
+    _fetch_trainer_busy,
+    window_days=SCHEDULE_WINDOW_DAYS,
+    near_days=FREEBUSY_NEAR_DAYS,
+    interval=FREEBUSY_REFRESH_INTERVAL,
+    full_interval=FREEBUSY_FULL_REFRESH_INTERVAL,
+)
@@ -0,0 +1,189 @@
+"""
+Долгоживущий клиент Google Sheets.
+
+Авторизуется один раз на процесс, держит открытые handles Spreadsheet/Worksheet
+и обновляет OAuth-токен в фоне до истечения срока. После ошибок соединения
+handles сбрасываются, и следующий вызов переподключается с нуля.
+Вместо gspread.authorize можно передать client_factory — например,
+таблицу в памяти из services/fake_sheets.py.
+"""
+
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+from services.google_executor import google_io
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых клиент нужно пересоздать (токен отозван, доступ изменён)
+RECONNECT_STATUS_CODES = {401, 403}
+
+
+class SheetsClientManager:
+    """Кэширует авторизованный gspread-клиент, таблицу и её листы."""
+
+    def __init__(
+        self,
+        service_account_file: str,
+        spreadsheet_id: str,
+        scopes: list[str],
+        refresh_margin: int = 300,
+        client_factory: Optional[Callable[[], gspread.Client]] = None,
+    ):
+        self.service_account_file = service_account_file
+        self.spreadsheet_id = spreadsheet_id
+        self.scopes = scopes
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._client_factory = client_factory
+
+        self._lock = threading.RLock()
+        self._credentials: Optional[Credentials] = None
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+        self._connected_once = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        # Счётчики для мониторинга
+        self.connects = 0
+        self.reconnects = 0
+        self.token_refreshes = 0
+        self.token_refresh_errors = 0
+
+    # ——— Handles ———
+
+    @property
+    def credentials(self) -> Credentials:
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = Credentials.from_service_account_file(
+                    self.service_account_file, scopes=self.scopes
+                )
+            return self._credentials
+
+    @property
+    def client(self) -> gspread.Client:
+        with self._lock:
+            if self._client is None:
+                if self._client_factory is not None:
+                    self._client = self._client_factory()
+                else:
+                    self._client = gspread.authorize(self.credentials)
+                self.connects += 1
+                if self._connected_once:
+                    self.reconnects += 1
+                    logger.info(f"Google Sheets: переподключение #{self.reconnects}")
+                self._connected_once = True
+            return self._client
+
+    @property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        with self._lock:
+            if self._spreadsheet is None:
+                self._spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+            return self._spreadsheet
+
+    def worksheet(self, title: str) -> gspread.Worksheet:
+        """Возвращает закэшированный лист, открывая его при первом обращении."""
+        with self._lock:
+            sheet = self._worksheets.get(title)
+            if sheet is None:
+                sheet = self.spreadsheet.worksheet(title)
+                self._worksheets[title] = sheet
+            return sheet
+
+    def reset(self, reason: str = "") -> None:
+        """Сбрасывает все handles — следующий вызов авторизуется заново."""
+        with self._lock:
+            if self._client is None and self._credentials is None:
+                return
+            self._credentials = None
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets.clear()
+        logger.warning(f"Google Sheets: клиент сброшен{f' ({reason})' if reason else ''}")
+
+    def handle_error(self, error: Exception) -> None:
+        """
+        Решает, нужно ли переподключаться после ошибки.
+
+        Ошибки авторизации и транспорта сбрасывают клиент; ошибки данных
+        (нет листа, неверный диапазон) оставляют handles как есть.
+        """
+        if isinstance(error, (gspread.exceptions.WorksheetNotFound, TimeoutError)):
+            return
+        if isinstance(error, gspread.exceptions.APIError):
+            status = getattr(error.response, "status_code", None)
+            if status in RECONNECT_STATUS_CODES:
+                self.reset(f"APIError {status}")
+            return
+        if isinstance(error, (ConnectionError, OSError)) or error.__class__.__module__.startswith(
+            ("requests", "urllib3", "google.auth")
+        ):
+            self.reset(error.__class__.__name__)
+
+    # ——— Токен ———
+
+    def refresh_token_if_needed(self, force: bool = False) -> bool:
+        """
+        Обновляет OAuth-токен, если до истечения осталось меньше refresh_margin.
+
+        Returns:
+            True, если токен был обновлён
+        """
+        with self._lock:
+            if self._client_factory is not None or (self._client is None and not force):
+                return False
+            creds = self.credentials
+            expiry = creds.expiry
+            if not force and creds.token and expiry and expiry - datetime.utcnow() > self.refresh_margin:
+                return False
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                self.token_refresh_errors += 1
+                logger.error(f"Google Sheets: не удалось обновить токен: {e}")
+                self.handle_error(e)
+                return False
+            self.token_refreshes += 1
+            logger.debug(f"Google Sheets: токен обновлён, действует до {creds.expiry}")
+            return True
+
+    async def _refresh_loop(self, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Обновление токена идёт в OAuth, а не в Sheets — квоту не расходует
+                await google_io.run(self.refresh_token_if_needed, api=None)
+            except Exception as e:
+                logger.error(f"Google Sheets: ошибка фонового обновления токена: {e}")
+
+    def start_token_refresher(self, interval: int = 60) -> None:
+        """Запускает фоновую задачу обновления токена (вызывать из event loop)."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def stop_token_refresher(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self) -> dict:
+        return {
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "token_refreshes": self.token_refreshes,
+            "token_refresh_errors": self.token_refresh_errors,
+            "open_worksheets": len(self._worksheets),
+        }
@@ -0,0 +1,170 @@
+"""
+Выполнение блокирующих вызовов Google API вне event loop.
+
+gspread и googleapiclient делают синхронные HTTP-запросы: если вызвать их
+прямо в хэндлере, один медленный ответ Sheets останавливает обработку всех
+остальных апдейтов. Все такие вызовы идут через ограниченный пул потоков
+с таймаутом на вызов и отменой ещё не начатых задач. Перед отправкой в пул
+вызов проходит квоту своего API и circuit breaker (services/google_quota.py).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import (
+    GOOGLE_IO_WORKERS, GOOGLE_IO_MAX_QUEUE, GOOGLE_IO_TIMEOUT,
+    SHEETS_QUOTA_PER_MINUTE, DRIVE_QUOTA_PER_MINUTE, CALENDAR_QUOTA_PER_MINUTE,
+    GOOGLE_BREAKER_FAILURES, GOOGLE_BREAKER_RESET,
+)
+from services.google_quota import CircuitBreaker, GoogleIOBusyError, Priority, QuotaBucket
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleIOExecutor:
+    """Ограниченный пул потоков для Google I/O с метрикой глубины очереди."""
+
+    def __init__(self, max_workers: int, max_queue: int, default_timeout: float,
+                 quotas: Dict[str, QuotaBucket], breakers: Dict[str, CircuitBreaker]):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self.quotas = quotas
+        self.breakers = breakers
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.queued = 0       # ждут свободного потока (глубина очереди)
+        self.running = 0      # выполняются прямо сейчас
+        self.max_queued = 0   # пиковая глубина очереди
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="google-io")
+        return self._pool
+
+    def _wrap(self, func: Callable, args: tuple, kwargs: dict) -> Callable[[], Any]:
+        def call():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+        return call
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None,
+                  api: Optional[str] = "sheets", priority: Priority = Priority.NORMAL,
+                  cost: int = 1, **kwargs) -> Any:
+        """
+        Выполняет func(*args, **kwargs) в пуле и ждёт результат не дольше timeout.
+
+        Args:
+            api: Чью квоту расходует вызов ("sheets", "drive", "calendar"; None — без квоты)
+            priority: Приоритет вызова при нехватке квоты
+            cost: Сколько запросов квоты расходует вызов (для batch-запросов — число частей)
+
+        Raises:
+            GoogleIOBusyError: очередь заполнена, квота исчерпана или breaker разомкнут
+            asyncio.TimeoutError: вызов не уложился в таймаут
+        """
+        breaker = self.breakers.get(api)
+        if breaker is not None:
+            breaker.before_call()
+        if api in self.quotas:
+            try:
+                await self.quotas[api].acquire(priority, cost)
+            except BaseException as e:
+                if breaker is not None:
+                    breaker.record_failure(e)  # освобождает пробный вызов
+                raise
+
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                if breaker is not None:
+                    breaker.record_failure(GoogleIOBusyError())
+                raise GoogleIOBusyError(
+                    f"Очередь Google I/O переполнена ({self.queued} задач в ожидании)"
+                )
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            self.calls += 1
+
+        cf_future = self._get_pool().submit(self._wrap(func, args, kwargs))
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(cf_future), timeout or self.default_timeout)
+        except BaseException as e:
+            if breaker is not None:
+                breaker.record_failure(e)
+            self._count_error(e, func, started)
+            raise
+        finally:
+            # Если задача ещё не начала выполняться — снимаем её с очереди
+            if cf_future.cancel():
+                with self._lock:
+                    self.queued -= 1
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    def _count_error(self, error: BaseException, func: Callable, started: float) -> None:
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+            logger.warning(
+                f"Google I/O: {getattr(func, '__name__', func)} не завершился за "
+                f"{time.monotonic() - started:.1f} с (в очереди {self.queued})"
+            )
+        elif isinstance(error, asyncio.CancelledError):
+            self.cancelled += 1
+        else:
+            self.errors += 1
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "max_queued": self.max_queued,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "quotas": {name: bucket.stats() for name, bucket in self.quotas.items()},
+            "breakers": {name: breaker.stats() for name, breaker in self.breakers.items()},
+        }
+
+
+google_io = GoogleIOExecutor(
+    max_workers=GOOGLE_IO_WORKERS,
+    max_queue=GOOGLE_IO_MAX_QUEUE,
+    default_timeout=GOOGLE_IO_TIMEOUT,
+    quotas={
+        "sheets": QuotaBucket("Sheets", SHEETS_QUOTA_PER_MINUTE),
+        "drive": QuotaBucket("Drive", DRIVE_QUOTA_PER_MINUTE),
+        "calendar": QuotaBucket("Calendar", CALENDAR_QUOTA_PER_MINUTE),
+    },
+    breakers={
+        name: CircuitBreaker(name, GOOGLE_BREAKER_FAILURES, GOOGLE_BREAKER_RESET)
+        for name in ("sheets", "drive", "calendar")
+    },
+)
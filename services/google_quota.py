@@ -0,0 +1,178 @@
+"""
+Квоты Google API: token bucket с приоритетами и circuit breaker.
+
+У Sheets общая поминутная квота на все хэндлеры: всплеск /start с
+логированием в Events мог выбрать её целиком, и бронирования падали с
+APIError 429. Каждый вызов через google_io сначала берёт токен из ведра
+своего API. Вызовы низкого приоритета не могут опустошить ведро ниже
+резерва, оставленного для более важных, и ждут меньше. Если Google
+отвечает 429/5xx или не укладывается в таймаут несколько раз подряд,
+breaker размыкается: вызовы сразу отклоняются, а вызывающий код работает
+на закэшированных данных (зеркало Schedule, кэш FAQ, очередь Events).
+"""
+
+import asyncio
+import logging
+import time
+from enum import IntEnum
+from typing import Optional
+
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Чем меньше значение, тем важнее вызов."""
+    HIGH = 0        # запись броней в Schedule, события календаря
+    NORMAL = 1      # чтение расписания, FAQ, ревизии таблицы
+    LOW = 2         # журнал Events, архивирование
+
+
+# Доля ведра, которую вызов данного приоритета не может занять, и сколько он готов ждать токен
+RESERVE_FRACTION = {Priority.HIGH: 0.0, Priority.NORMAL: 0.1, Priority.LOW: 0.3}
+MAX_WAIT = {Priority.HIGH: 10.0, Priority.NORMAL: 5.0, Priority.LOW: 2.0}
+
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GoogleIOBusyError(RuntimeError):
+    """Вызов Google отклонён сразу, не дойдя до API."""
+
+
+class QuotaExceededError(GoogleIOBusyError):
+    """Токен квоты не освободился за допустимое для приоритета время."""
+
+
+class CircuitOpenError(GoogleIOBusyError):
+    """Google недавно отвечал 429/5xx — вызов отклонён без обращения к API."""
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP-статус ошибки gspread или googleapiclient (None, если это не HTTP-ошибка)."""
+    response = getattr(error, "response", None)       # gspread.exceptions.APIError
+    status = getattr(response, "status_code", None)
+    if status is None:
+        resp = getattr(error, "resp", None)           # googleapiclient.errors.HttpError
+        status = getattr(resp, "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_overload(error: BaseException) -> bool:
+    """Ошибка означает, что Google перегружен или ограничивает нас (повод разомкнуть breaker)."""
+    return isinstance(error, asyncio.TimeoutError) or error_status(error) in OVERLOAD_STATUSES
+
+
+class QuotaBucket(TokenBucket):
+    """Поминутная квота API: токены с резервом под более важные вызовы."""
+
+    def __init__(self, name: str, per_minute: float, capacity: Optional[float] = None):
+        super().__init__(name, per_minute, capacity)
+
+        # Метрики
+        self.granted = 0
+        self.throttled = 0   # вызов ждал токен
+        self.rejected = 0    # не дождался
+
+    async def acquire(self, priority: Priority = Priority.NORMAL, cost: float = 1) -> None:
+        """
+        Ждёт токены не дольше MAX_WAIT[priority].
+        cost — сколько запросов к API входит в вызов (batch-запрос считается по частям).
+
+        Raises:
+            QuotaExceededError: квота исчерпана дольше допустимого ожидания
+        """
+        deadline = time.monotonic() + MAX_WAIT[priority]
+        waited = False
+        while True:
+            delay = self.try_take(min(cost, self.capacity), RESERVE_FRACTION[priority])
+            if delay == 0.0:
+                self.granted += 1
+                if waited:
+                    self.throttled += 1
+                return
+            if time.monotonic() + delay > deadline:
+                self.rejected += 1
+                raise QuotaExceededError(
+                    f"Квота {self.name} исчерпана: {priority.name} не дождался токена"
+                )
+            waited = True
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreaker:
+    """
+    Размыкается после failure_threshold перегрузок подряд и reset_timeout
+    секунд отклоняет вызовы; затем пропускает один пробный вызов.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        # Метрики
+        self.opened = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError, если вызов нужно отклонить без обращения к API."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self.short_circuited += 1
+        raise CircuitOpenError(f"{self.name}: Google перегружен, повтор через {self.reset_timeout:.0f} с")
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info(f"{self.name}: Google снова отвечает, breaker замкнут")
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException) -> None:
+        if not is_overload(error):
+            # Прочие ошибки (404, 403, битые данные) не говорят о перегрузке
+            self._probe_in_flight = False
+            return
+        self._failures += 1
+        if self._probe_in_flight or self._failures >= self.failure_threshold:
+            if self._opened_at is None or self._probe_in_flight:
+                self.opened += 1
+                logger.warning(f"{self.name}: breaker разомкнут после ошибки {error!r}")
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
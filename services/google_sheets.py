@@ -1,11 +1,36 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict
+from functools import partial
+from typing import List, Dict, Optional, Tuple
 
 import gspread
-from google.oauth2.service_account import Credentials
-
-from config import GOOGLE_SERVICE_ACCOUNT_FILE, GOOGLE_SHEET_ID
+import pytz
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import AsyncSessionLocal
+from config import (
+    GOOGLE_SERVICE_ACCOUNT_FILE, GOOGLE_SHEET_ID, SCHEDULE_CACHE_TTL, SCHEDULE_SYNC_INTERVAL,
+    SCHEDULE_WINDOW_DAYS, SCHEDULE_ARCHIVE_AFTER_DAYS, SHEET_POLL_INTERVAL,
+    SHEETS_BACKEND, FAKE_SHEETS_LATENCY, FAKE_SHEETS_ERROR_RATE, FAKE_SHEETS_QUOTA_PER_MINUTE,
+    EVENTS_BATCH_SIZE, EVENTS_FLUSH_INTERVAL, EVENTS_QUEUE_SIZE, SLOT_WRITE_MERGE_WINDOW, TIMEZONE,
+)
+from services.event_log import EventSink
+from services.fake_sheets import FakeClient, FakeSpreadsheet
+from services.faq_cache import FaqCache, FaqEntry, FaqSnapshot
+from services.faq_search import FaqSearchIndex
+from services.google_calendar import LESSON_DURATION, trainer_busy
+from services.google_client import SheetsClientManager
+from services.google_executor import google_io
+from services.google_quota import Priority
+from services.outbox import enqueue, outbox
+from services.schedule_cache import ScheduleCache
+from services.schedule_index import ScheduleIndex, SlotRecord, parse_day_month
+from services.schedule_mirror import ScheduleMirror
+from services.schedule_sheet import ScheduleSheetReader, shift_row
+from services.sheet_watcher import SheetChangeWatcher
+from services.slot_writer import SlotWriter
+from utils.constants import MONTHS_RU, WEEKDAYS_RU_SHORT
 
 logger = logging.getLogger(__name__)
 
@@ -14,18 +39,33 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
-MONTHS_RU = {
-    1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-    5: "мая", 6: "июня", 7: "июля", 8: "августа",
-    9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-}
 
-WEEKDAYS_RU_SHORT = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+# SHEETS_BACKEND=fake — та же логика поверх таблицы в памяти, без сети и сервисного аккаунта
+fake_spreadsheet: Optional[FakeSpreadsheet] = None
+if SHEETS_BACKEND == "fake":
+    fake_spreadsheet = FakeSpreadsheet.with_demo_data(
+        latency=FAKE_SHEETS_LATENCY,
+        error_rate=FAKE_SHEETS_ERROR_RATE,
+        quota_per_minute=FAKE_SHEETS_QUOTA_PER_MINUTE,
+    )
+
+# Один авторизованный клиент на процесс: токен обновляется в фоне,
+# handles таблицы и листов переиспользуются между вызовами
+sheets_client = SheetsClientManager(
+    GOOGLE_SERVICE_ACCOUNT_FILE, GOOGLE_SHEET_ID, SCOPES,
+    client_factory=(lambda: FakeClient(fake_spreadsheet)) if fake_spreadsheet is not None else None,
+)
+
+
+def sheet_configured() -> bool:
+    """False, если GOOGLE_SHEET_ID не задан или остался тестовым — бот работает на демо-данных."""
+    if fake_spreadsheet is not None:
+        return True
+    return bool(GOOGLE_SHEET_ID) and not GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ")
 
 
-def _get_client():
-    creds = Credentials.from_service_account_file(GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return gspread.authorize(creds)
+def _get_client() -> gspread.Client:
+    return sheets_client.client
 
 
 def _open_worksheet(title: str):
@@ -34,7 +74,7 @@ def _open_worksheet(title: str):
     Бросает исключение дальше, чтобы вызывающий код мог обработать ошибку.
     """
     # Проверяем валидность GOOGLE_SHEET_ID
-    if not GOOGLE_SHEET_ID or GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ"):
+    if not sheet_configured():
         logger.error(
             f"⚠️ КРИТИЧЕСКАЯ ОШИБКА: GOOGLE_SHEET_ID содержит тестовый ID '{GOOGLE_SHEET_ID}'.\n"
             f"Для использования бота необходимо:\n"
@@ -49,7 +89,7 @@ def _open_worksheet(title: str):
         )
     
     try:
-        client = _get_client()
+        sheets_client.client  # авторизуемся один раз на процесс
     except FileNotFoundError as e:
         logger.error(f"Файл сервисного аккаунта не найден: {GOOGLE_SERVICE_ACCOUNT_FILE} — {e}")
         raise
@@ -58,7 +98,7 @@ def _open_worksheet(title: str):
         raise
 
     try:
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        sheets_client.spreadsheet
     except gspread.exceptions.SpreadsheetNotFound:
         logger.error(
             f"Google Sheet с ID '{GOOGLE_SHEET_ID}' не найден. Проверьте переменную GOOGLE_SHEET_ID и доступ сервисного аккаунта."
@@ -68,10 +108,11 @@ def _open_worksheet(title: str):
         logger.error(
             f"API Error при доступе к Google Sheets: {e}. Проверьте права доступа сервисного аккаунта и что sheet id корректен."
         )
+        sheets_client.handle_error(e)
         raise
 
     try:
-        sheet = spreadsheet.worksheet(title)
+        sheet = sheets_client.worksheet(title)
     except gspread.exceptions.WorksheetNotFound:
         logger.error(f"Лист с названием '{title}' не найден в таблице {GOOGLE_SHEET_ID}.")
         raise
@@ -79,110 +120,166 @@ def _open_worksheet(title: str):
     return sheet
 
 
+def _read_records(title: str) -> List[Dict]:
+    """Читает все записи листа (блокирующий вызов — только через google_io)."""
+    return _open_worksheet(title).get_all_records()
+
+
+# Schedule читается только в окне дат: колонка "Дата" + нужные диапазоны одним batch_get
+schedule_reader = ScheduleSheetReader(lambda: _open_worksheet("Schedule"))
+
+ARCHIVE_SHEET = "Archive"
+
+
+async def _fetch_schedule() -> ScheduleIndex:
+    today = datetime.today().date()
+    try:
+        rows = await google_io.run(
+            schedule_reader.read_window_sync,
+            today - timedelta(days=1), today + timedelta(days=SCHEDULE_WINDOW_DAYS),
+        )
+    except Exception as e:
+        sheets_client.handle_error(e)
+        raise
+    return ScheduleIndex.from_rows(rows)
+
+
+# Зеркало листа Schedule в SQLite: сверяется при смене ревизии таблицы
+# и полностью — раз в SCHEDULE_SYNC_INTERVAL секунд на случай, если опрос ревизии не работает
+schedule_mirror = ScheduleMirror(AsyncSessionLocal, _fetch_schedule, interval=SCHEDULE_SYNC_INTERVAL)
+
+# Снимок зеркала, общий для всех хэндлеров
+schedule_cache = ScheduleCache(schedule_mirror.load_index, ttl=SCHEDULE_CACHE_TTL)
+schedule_mirror.on_synced(schedule_cache.refresh)
+
+
+def _read_revision() -> str:
+    """Версия таблицы из Drive API (блокирующий вызов — только через google_io)."""
+    response = sheets_client.client.http_client.request(
+        "get",
+        f"{DRIVE_FILES_API_V3_URL}/{GOOGLE_SHEET_ID}",
+        params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+    )
+    metadata = response.json()
+    return str(metadata.get("version") or metadata["modifiedTime"])
+
+
+async def _fetch_revision() -> str:
+    try:
+        return await google_io.run(_read_revision, api="drive")
+    except Exception as e:
+        sheets_client.handle_error(e)
+        raise
+
+
+# Листы перечитываются только когда меняется ревизия таблицы
+sheet_watcher = SheetChangeWatcher(_fetch_revision, interval=SHEET_POLL_INTERVAL)
+sheet_watcher.subscribe(schedule_mirror.sync)
+
+
+def start_sheet_sync() -> None:
+    if not sheet_configured():
+        logger.info("Schedule: GOOGLE_SHEET_ID не настроен — синхронизация зеркала отключена, используются демо-данные")
+        return
+    schedule_mirror.start()
+    sheet_watcher.start()
+    faq_cache.warm()
+
+
+async def stop_sheet_sync() -> None:
+    await sheet_watcher.stop()
+    await schedule_mirror.stop()
+
+
+# ——— Демо-данные (только когда таблица не настроена) ———
+
+DEMO_TRAINERS = ["Екатерина", "Анна", "Ольга"]
+# Групповые занятия: 9:00-12:00, 14:00-20:00; индивидуальные: 15:00-20:00
+DEMO_GROUP_TIMES = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
+DEMO_INDIVIDUAL_TIMES = ["15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
+
+
+def _demo_dates(days: int = 7) -> List[str]:
+    today = datetime.today().date()
+    result = []
+    for i in range(days):
+        date = today + timedelta(days=i)
+        result.append(f"{date.day} {MONTHS_RU[date.month]}|{WEEKDAYS_RU_SHORT[date.weekday()]}")
+    return result
+
+
+def _demo_times(lesson_type: str = None) -> List[Dict]:
+    test_times = []
+    # Групповые занятия (1000₽, 2-3 свободных места)
+    for idx, time_slot in enumerate(DEMO_GROUP_TIMES, start=2):
+        test_times.append({
+            "time": time_slot,
+            "free": 3 if idx % 2 == 0 else 2,
+            "price": 1000,
+            "lesson_type": "group_single",
+            "row_index": idx
+        })
+    # Индивидуальные занятия (1800₽, 1-2 свободных места)
+    for idx, time_slot in enumerate(DEMO_INDIVIDUAL_TIMES, start=15):
+        test_times.append({
+            "time": time_slot,
+            "free": 2 if idx % 2 == 0 else 1,
+            "price": 1800,
+            "lesson_type": "individual",
+            "row_index": idx
+        })
+    if lesson_type:
+        return [t for t in test_times if t["lesson_type"] == lesson_type]
+    return test_times
+
+
 async def get_available_trainers() -> List[str]:
     """Возвращает список тренеров у которых есть хотя бы одно свободное место в ближайшие 30 дней"""
+    if not sheet_configured():
+        logger.debug("Google Sheets не настроен - используются демо-данные")
+        return list(DEMO_TRAINERS)
     try:
-        if not GOOGLE_SHEET_ID or GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ"):
-            logger.debug("Google Sheets недоступен - используются тестовые данные")
-            return ["Екатерина", "Анна", "Ольга"]
-        
-        client = _get_client()
-        sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet("Schedule")
-        records = sheet.get_all_records()
-        trainers = {
-            row["Тренер"] for row in records
-            if int(row.get("Свободно", 0)) > 0
-        }
-        return sorted(list(trainers)) if trainers else ["Екатерина", "Анна", "Ольга"]
-    except ValueError as e:
-        logger.debug(f"Google Sheets недоступен - используются тестовые данные: {e}")
-        return ["Екатерина", "Анна", "Ольга"]
+        index = await schedule_cache.get()
+        today = datetime.today().date()
+        return index.trainers_with_free_seats(today, today + timedelta(days=30))
     except Exception as e:
-        logger.error(f"Ошибка чтения тренеров из Google Sheets: {e}")
-        return ["Екатерина", "Анна", "Ольга"]
+        logger.error(f"Ошибка чтения тренеров из зеркала Schedule: {e}")
+        return []
 
 
-async def get_available_dates(trainer: str, days_ahead: int = 30) -> List[str]:
-    """Возвращает список дат в формате '15 марта|пт' для красивых кнопок"""
+def _trainer_busy_at(slot: SlotRecord) -> bool:
+    """Тренер занят в своём календаре на время слота (проверка по памяти, без запросов к Google)."""
+    if not trainer_busy.tracks(slot.trainer):
+        return False
     try:
-        if not GOOGLE_SHEET_ID or GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ"):
-            logger.debug(f"Google Sheets недоступен - генерируем тестовые даты для {trainer}")
-            # Генерируем тестовые даты (сегодня и на 7 дней вперед)
-            result = []
-            today = datetime.today().date()
-            for i in range(7):
-                date = today + timedelta(days=i)
-                day = date.day
-                month_name = MONTHS_RU[date.month]
-                weekday = WEEKDAYS_RU_SHORT[date.weekday()]
-                pretty_date = f"{day} {month_name}|{weekday}"
-                result.append(pretty_date)
-            logger.debug(f"Возвращаем {len(result)} тестовых дат: {result}")
-            return result
-        
-        client = _get_client()
-        sheet = client.open_by_key(GOOGLE_SHEET_ID).worksheet("Schedule")
-        records = sheet.get_all_records()
+        start = pytz.timezone(TIMEZONE).localize(
+            datetime.combine(slot.date, datetime.strptime(slot.time, "%H:%M").time())
+        )
+    except ValueError:
+        return False
+    return trainer_busy.is_busy(slot.trainer, start, start + LESSON_DURATION)
 
-        result = []
-        today = datetime.today().date()
-        for row in records:
-            if row["Тренер"] != trainer:
-                continue
-            try:
-                slot_date = datetime.strptime(row["Дата"], "%d.%m.%Y").date()
-            except:
-                continue
 
-            if today <= slot_date <= today + timedelta(days=days_ahead):
-                if int(row.get("Свободно", 0)) > 0:
-                    day = slot_date.day
-                    month_name = MONTHS_RU[slot_date.month]
-                    weekday = WEEKDAYS_RU_SHORT[slot_date.weekday()]
-                    pretty_date = f"{day} {month_name}|{weekday}"
-                    result.append(pretty_date)
-
-        if result:
-            return sorted(list(set(result)), key=lambda x: datetime.strptime(x.split("|")[0], "%d %B"))
-        else:
-            # Если нет данных в Google Sheets, возвращаем тестовые
-            logger.debug("Google Sheets нет данных - возвращаем тестовые даты")
-            result = []
-            today = datetime.today().date()
-            for i in range(7):
-                date = today + timedelta(days=i)
-                day = date.day
-                month_name = MONTHS_RU[date.month]
-                weekday = WEEKDAYS_RU_SHORT[date.weekday()]
-                pretty_date = f"{day} {month_name}|{weekday}"
-                result.append(pretty_date)
-            return result
-    except ValueError as e:
-        logger.debug(f"Google Sheets недоступен - генерируем тестовые даты: {e}")
-        # Генерируем тестовые даты
-        result = []
-        today = datetime.today().date()
-        for i in range(7):
-            date = today + timedelta(days=i)
-            day = date.day
-            month_name = MONTHS_RU[date.month]
-            weekday = WEEKDAYS_RU_SHORT[date.weekday()]
-            pretty_date = f"{day} {month_name}|{weekday}"
-            result.append(pretty_date)
-        return result
+async def get_available_dates(trainer: str, days_ahead: int = 30) -> List[str]:
+    """Возвращает список дат в формате '15 марта|пт' для красивых кнопок"""
+    if not sheet_configured():
+        logger.debug(f"Google Sheets не настроен - демо-даты для {trainer}")
+        return _demo_dates()
+    try:
+        index = await schedule_cache.get()
     except Exception as e:
         logger.error(f"Ошибка получения дат: {e}")
-        # Генерируем тестовые даты
-        result = []
-        today = datetime.today().date()
-        for i in range(7):
-            date = today + timedelta(days=i)
-            day = date.day
-            month_name = MONTHS_RU[date.month]
-            weekday = WEEKDAYS_RU_SHORT[date.weekday()]
-            pretty_date = f"{day} {month_name}|{weekday}"
-            result.append(pretty_date)
-        return result
+        return []
+
+    result = []
+    today = datetime.today().date()
+    # Даты уже отсортированы и уникальны — окно выбирается через bisect
+    for slot_date in index.free_dates(trainer, today, today + timedelta(days=days_ahead), skip=_trainer_busy_at):
+        day = slot_date.day
+        month_name = MONTHS_RU[slot_date.month]
+        weekday = WEEKDAYS_RU_SHORT[slot_date.weekday()]
+        result.append(f"{day} {month_name}|{weekday}")
+    return result
 
 
 async def get_available_times(trainer: str, date_str: str, lesson_type: str = None) -> List[Dict]:
@@ -200,147 +297,151 @@ async def get_available_times(trainer: str, date_str: str, lesson_type: str = No
     
     Режим: 9:00-20:00, каждый час (1-часовые слоты)
     """
+    if not sheet_configured():
+        logger.debug(f"Google Sheets не настроен - демо-слоты 9:00-20:00 для {trainer}")
+        return _demo_times(lesson_type)
     try:
-        if not GOOGLE_SHEET_ID or GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ"):
-            logger.debug(f"Google Sheets недоступен - генерируем тестовые времена 9:00-20:00 для {trainer}")
-            # Генерируем полное расписание 9:00-20:00 (каждый час)
-            # Групповые занятия: 9:00-12:00, 14:00-20:00
-            # Индивидуальные: 15:00-20:00
-            test_times = []
-            
-            # Групповые занятия (1000₽, 3-5 свободных мест)
-            group_slots = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
-            for idx, time_slot in enumerate(group_slots, start=2):
-                test_times.append({
-                    "time": time_slot,
-                    "free": 3 if idx % 2 == 0 else 2,
-                    "price": 1000,
-                    "lesson_type": "group_single",
-                    "row_index": idx
-                })
-            
-            # Индивидуальные занятия (1800₽, 1-2 свободных места)
-            individual_slots = ["15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
-            for idx, time_slot in enumerate(individual_slots, start=15):
-                test_times.append({
-                    "time": time_slot,
-                    "free": 2 if idx % 2 == 0 else 1,
-                    "price": 1800,
-                    "lesson_type": "individual",
-                    "row_index": idx
-                })
-            
-            # Фильтруем по типу если нужно
-            if lesson_type:
-                filtered = [t for t in test_times if t["lesson_type"] == lesson_type]
-                logger.debug(f"Возвращаем {len(filtered)} тестовых слотов для {lesson_type}")
-                return filtered
-            
-            logger.debug(f"Возвращаем {len(test_times)} тестовых слотов")
-            return test_times
-        
-        client = _get_client()
-        sheet = _open_worksheet("Schedule")
-        all_records = sheet.get_all_records()
-
-        target_day = int(date_str.split()[0])
-        target_month = list(MONTHS_RU.values()).index(date_str.split()[1]) + 1
-
-        result = []
-        for idx, row in enumerate(all_records, start=2):
-            if row["Тренер"] != trainer:
-                continue
-            try:
-                row_date = datetime.strptime(row["Дата"], "%d.%m.%Y")
-                if row_date.day == target_day and row_date.month == target_month:
-                    free = int(row.get("Свободно", 0))
-                    
-                    # Логика фильтрации по типу (slot-logic-update.md п.3.2)
-                    # Показываем слот если:
-                    # 1. Свободно > 0
-                    # 2. Типтренировки пустой (первое бронирование) ИЛИ совпадает с выбранным типом
-                    row_lesson_type = row.get("Типтренировки", "").strip().lower()
-                    
-                    # Если слот имеет тип и он не совпадает с выбранным — пропускаем слот
-                    if row_lesson_type and lesson_type and row_lesson_type != lesson_type.lower():
-                        logger.debug(f"Пропуск слота: тип '{row_lesson_type}' не совпадает с '{lesson_type}'")
-                        continue
-                    
-                    if free > 0:
-                        result.append({
-                            "time": row["Время"],
-                            "free": free,
-                            "price": int(row.get("Цена", 0)),
-                            "lesson_type": row_lesson_type or "group_single",
-                            "row_index": idx
-                        })
-            except ValueError:
-                continue
-        
-        if result:
-            return result
-        else:
-            # Если нет данных в Google Sheets, возвращаем тестовые 9:00-20:00
-            logger.debug(f"Google Sheets нет данных для {trainer} на {date_str} - возвращаем тестовые слоты")
-            test_times = []
-            
-            group_slots = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
-            for idx, time_slot in enumerate(group_slots, start=2):
-                test_times.append({
-                    "time": time_slot,
-                    "free": 3 if idx % 2 == 0 else 2,
-                    "price": 1000,
-                    "lesson_type": "group_single",
-                    "row_index": idx
-                })
-            
-            if lesson_type:
-                return [t for t in test_times if t["lesson_type"] == lesson_type]
-            return test_times
-    except ValueError as e:
-        logger.debug(f"Google Sheets недоступен - генерируем тестовые времена: {e}")
-        test_times = []
-        
-        group_slots = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00", "20:00"]
-        for idx, time_slot in enumerate(group_slots, start=2):
-            test_times.append({
-                "time": time_slot,
-                "free": 3 if idx % 2 == 0 else 2,
-                "price": 1000,
-                "lesson_type": "group_single",
-                "row_index": idx
-            })
-        
-        if lesson_type:
-            return [t for t in test_times if t["lesson_type"] == lesson_type]
-        return test_times
+        index = await schedule_cache.get()
+        target_day, target_month = parse_day_month(date_str)
     except Exception as e:
         logger.error(f"Ошибка получения времени: {e}")
-        # Возвращаем основные слоты
-        return [
-            {"time": "09:00", "free": 3, "price": 1000, "lesson_type": "group_single", "row_index": 2},
-            {"time": "10:00", "free": 2, "price": 1000, "lesson_type": "group_single", "row_index": 3},
-            {"time": "15:00", "free": 2, "price": 1800, "lesson_type": "individual", "row_index": 5},
-            {"time": "16:00", "free": 1, "price": 1800, "lesson_type": "individual", "row_index": 6},
-        ]
-        return test_times
-    except Exception as e:
-        logger.error(f"Ошибка получения времени: {e}")
-        return [
-            {"time": "09:00", "free": 3, "price": 1000, "lesson_type": "group_single", "row_index": 2},
-            {"time": "15:00", "free": 2, "price": 1800, "lesson_type": "individual", "row_index": 5},
-        ]
+        return []
 
+    result = []
+    for slot_date in index.dates_for_day_month(trainer, target_day, target_month):
+        for slot in index.slots_on(trainer, slot_date):
+            # Логика фильтрации по типу (slot-logic-update.md п.3.2)
+            # Показываем слот если:
+            # 1. Свободно > 0
+            # 2. Типтренировки пустой (первое бронирование) ИЛИ совпадает с выбранным типом
+            if slot.lesson_type and lesson_type and slot.lesson_type != lesson_type.lower():
+                logger.debug(f"Пропуск слота: тип '{slot.lesson_type}' не совпадает с '{lesson_type}'")
+                continue
 
-async def get_faq_answers() -> list[tuple[str, str]]:
+            if slot.free > 0 and not _trainer_busy_at(slot):
+                result.append(slot.as_dict())
+    return result
+
+
+async def _load_faq() -> List[Tuple[str, str]]:
     try:
-        client = _get_client()
-        sheet = _open_worksheet("FAQ")
-        records = sheet.get_all_records()
-        return [(row["Вопрос"], row["Ответ"]) for row in records if row.get("Вопрос") and row.get("Ответ")]
+        records = await google_io.run(_read_records, "FAQ")
     except Exception as e:
+        sheets_client.handle_error(e)
         logger.error(f"Ошибка чтения FAQ: {e}")
+        raise
+    return [
+        (str(row["Вопрос"]).strip(), str(row["Ответ"]).strip())
+        for row in records if row.get("Вопрос") and row.get("Ответ")
+    ]
+
+
+# FAQ живёт в памяти: перечитывается при смене ревизии таблицы, а при сбоях опроса —
+# не реже раза в SCHEDULE_SYNC_INTERVAL секунд
+faq_cache = FaqCache(_load_faq, max_age=SCHEDULE_SYNC_INTERVAL)
+sheet_watcher.subscribe(faq_cache.refresh)
+
+# Поиск по FAQ для вопросов свободным текстом: индекс догоняет каждую новую версию FAQ
+faq_index = FaqSearchIndex()
+faq_cache.on_change(faq_index.apply)
+
+
+async def get_faq() -> Optional[FaqSnapshot]:
+    """Снимок FAQ из памяти (None — FAQ ещё ни разу не удалось загрузить)."""
+    try:
+        return await faq_cache.get()
+    except Exception:
+        return None
+
+
+async def search_faq(query: str, limit: int = 3) -> List[Tuple[FaqEntry, float]]:
+    """Записи FAQ, лучше всего отвечающие на вопрос пользователя (по убыванию релевантности)."""
+    if not await get_faq():
         return []
+    return faq_index.search(query, limit=limit)
+
+
+async def get_faq_answers() -> list[tuple[str, str]]:
+    snapshot = await get_faq()
+    return [(entry.question, entry.answer) for entry in snapshot.entries] if snapshot else []
+
+
+def _slot_free(row_index: int) -> Optional[int]:
+    index = schedule_cache.current
+    slot = index.by_row.get(row_index) if index is not None else None
+    return slot.free if slot is not None else None
+
+
+def _slot_applied(row_index: int, free: Optional[int], lesson_type: Optional[str]) -> None:
+    schedule_cache.apply_update(row_index, free=free, lesson_type=lesson_type)
+    schedule_mirror.record_local(row_index, free=free, lesson_type=lesson_type)
+
+
+# Изменения строк Schedule копятся SLOT_WRITE_MERGE_WINDOW секунд и уходят одним batch_update
+slot_writer = SlotWriter(
+    open_sheet=lambda: _open_worksheet("Schedule"),
+    run=partial(google_io.run, priority=Priority.HIGH),
+    free_lookup=_slot_free,
+    on_applied=_slot_applied,
+    merge_window=SLOT_WRITE_MERGE_WINDOW,
+    on_error=sheets_client.handle_error,
+)
+
+
+def _open_archive(headers: List[str]) -> gspread.Worksheet:
+    """Лист архива; создаётся с заголовками Schedule при первом переносе."""
+    try:
+        return sheets_client.worksheet(ARCHIVE_SHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        sheet = sheets_client.spreadsheet.add_worksheet(ARCHIVE_SHEET, rows=1, cols=len(headers))
+        sheet.update([headers], "A1")
+        logger.info(f"Создан лист {ARCHIVE_SHEET} для прошедших слотов")
+        return sheet
+
+
+async def archive_schedule() -> int:
+    """
+    Переносит слоты старше SCHEDULE_ARCHIVE_AFTER_DAYS дней на лист Archive.
+
+    На время переноса останавливаются синхронизация зеркала и запись слотов:
+    после удаления строк номера сдвигаются, поэтому накопленные изменения,
+    зеркало и учёт мест перенумеровываются до того, как запись продолжится.
+
+    Returns:
+        Количество перенесённых строк
+    """
+    if not sheet_configured():
+        return 0
+    before = datetime.today().date() - timedelta(days=SCHEDULE_ARCHIVE_AFTER_DAYS)
+    async with schedule_mirror.lock, slot_writer.lock:
+        try:
+            removed = await google_io.run(
+                schedule_reader.archive_sync, before, _open_archive, priority=Priority.LOW,
+            )
+        except Exception as e:
+            sheets_client.handle_error(e)
+            logger.error(f"Ошибка архивирования Schedule: {e}")
+            return 0
+        if removed:
+            mapper = lambda row_index: shift_row(row_index, removed)
+            slot_writer.remap_rows(mapper)
+            await schedule_mirror.remap_rows(mapper)
+    return len(removed)
+
+
+async def update_slot(row_index: int, free_delta: int = 0, lesson_type: Optional[str] = None) -> bool:
+    """
+    Изменяет слот одним запросом: тип занятия и/или количество свободных мест.
+
+    Args:
+        row_index: Номер строки в листе Schedule (1-based индексация для Sheets API)
+        free_delta: Дельта свободных мест (-1 при броне, +1 при отмене)
+        lesson_type: Тип занятия, который нужно записать в слот (None — не менять)
+
+    Returns:
+        True, если успешно, False в случае ошибки
+    """
+    return await slot_writer.mutate(row_index, free_delta=free_delta, lesson_type=lesson_type)
 
 
 async def update_free_slots(row_index: int, delta: int) -> bool:
@@ -354,26 +455,19 @@ async def update_free_slots(row_index: int, delta: int) -> bool:
     Returns:
         True, если успешно, False в случае ошибки
     """
+    return await update_slot(row_index, free_delta=delta)
+
+
+async def get_slot(row_index: int) -> Optional[SlotRecord]:
+    """Слот из снимка Schedule по номеру строки (None — нет в снимке или таблица не настроена)."""
+    if not row_index or not sheet_configured():
+        return None
     try:
-        client = _get_client()
-        sheet = _open_worksheet("Schedule")
-        
-        # Находим столбец "Свободно"
-        headers = sheet.row_values(1)
-        free_col = headers.index("Свободно") + 1 if "Свободно" in headers else 5
-        
-        # Получаем текущее значение
-        cell = sheet.cell(row_index, col=free_col)
-        current = int(cell.value or 0)
-        new_value = max(0, current + delta)
-        
-        # Обновляем значение
-        sheet.update_cell(row_index, free_col, new_value)
-        logger.info(f"Обновлены свободные места: строка {row_index}, было {current}, стало {new_value}")
-        return True
+        index = await schedule_cache.get()
     except Exception as e:
-        logger.error(f"Ошибка обновления свободных мест: {e}")
-        return False
+        logger.error(f"Ошибка чтения слота {row_index}: {e}")
+        return None
+    return index.by_row.get(row_index)
 
 
 async def get_lesson_type_from_sheet(trainer: str, date_str: str, time_str: str) -> str:
@@ -389,23 +483,13 @@ async def get_lesson_type_from_sheet(trainer: str, date_str: str, time_str: str)
         Тип занятия (trial, group_single, group_subscription, individual) или "group_single" по умолчанию
     """
     try:
-        client = _get_client()
-        sheet = _open_worksheet("Schedule")
-        all_records = sheet.get_all_records()
+        index = await schedule_cache.get()
+        target_day, target_month = parse_day_month(date_str)
 
-        target_day = int(date_str.split()[0])
-        target_month = list(MONTHS_RU.values()).index(date_str.split()[1]) + 1
-
-        for row in all_records:
-            if row.get("Тренер") != trainer or row.get("Время") != time_str:
-                continue
-            try:
-                row_date = datetime.strptime(row["Дата"], "%d.%m.%Y")
-                if row_date.day == target_day and row_date.month == target_month:
-                    lesson_type = row.get("Типтренировки", "group_single").lower()
-                    return lesson_type if lesson_type in ["trial", "group_single", "group_subscription", "individual"] else "group_single"
-            except ValueError:
-                continue
+        for slot_date in index.dates_for_day_month(trainer, target_day, target_month):
+            for slot in index.get_slots(trainer, slot_date, time_str):
+                lesson_type = slot.lesson_type or "group_single"
+                return lesson_type if lesson_type in ["trial", "group_single", "group_subscription", "individual"] else "group_single"
         
         return "group_single"
     except Exception as e:
@@ -424,49 +508,65 @@ async def update_lesson_type(row_index: int, lesson_type: str) -> bool:
     Returns:
         True, если успешно
     """
-    try:
-        client = _get_client()
-        sheet = _open_worksheet("Schedule")
-        
-        headers = sheet.row_values(1)
-        lesson_type_col = headers.index("Типтренировки") + 1 if "Типтренировки" in headers else 6
-        
-        sheet.update_cell(row_index, lesson_type_col, lesson_type)
-        logger.info(f"Обновлен тип занятия: строка {row_index} → {lesson_type}")
-        return True
-    except Exception as e:
-        logger.error(f"Ошибка обновления типа занятия: {e}")
-        return False
+    return await update_slot(row_index, lesson_type=lesson_type)
+
+
+def _append_events_sync(rows: List[list]) -> None:
+    _open_worksheet("Events").append_rows(rows)
+
+
+async def _write_events(rows: List[list]) -> None:
+    await google_io.run(_append_events_sync, rows, priority=Priority.LOW)
+
+
+# Очередь событий для листа Events: пишется пачками в фоне
+event_sink = EventSink(
+    _write_events,
+    max_queue=EVENTS_QUEUE_SIZE,
+    batch_size=EVENTS_BATCH_SIZE,
+    flush_interval=EVENTS_FLUSH_INTERVAL,
+)
 
 
 async def log_event_to_sheet(telegram_id: int, action_text: str) -> bool:
     """
     Логирует действие пользователя в лист Events.
+
+    Строка ставится в очередь event_sink и записывается пачкой в фоне —
+    хэндлер не ждёт ответа Google.
     
     Args:
         telegram_id: Telegram ID пользователя
         action_text: Текст действия (например, "click: Записаться на занятие")
     
     Returns:
-        True, если успешно, False в случае ошибки
+        True, если событие принято в очередь, False если оно пропущено
     """
-    try:
-        if not GOOGLE_SHEET_ID or GOOGLE_SHEET_ID.startswith("1aBcDeFgHiJkLmNoPqRsTuVwXyZ"):
-            logger.debug(f"Логирование пропущено: GOOGLE_SHEET_ID не установлен корректно (тестовый ID)")
-            return False
-        
-        client = _get_client()
-        sheet = _open_worksheet("Events")
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Добавляем новую строку: Telegram ID, Время, Действие
-        sheet.append_row([telegram_id, timestamp, action_text])
-        logger.debug(f"Логировано действие: {telegram_id} — {action_text}")
-        return True
-    except ValueError as e:
-        logger.debug(f"⚠️ Google Sheets недоступен: {e}")
+    if not sheet_configured():
+        logger.debug(f"Логирование пропущено: GOOGLE_SHEET_ID не установлен корректно (тестовый ID)")
         return False
-    except Exception as e:
-        logger.debug(f"Ошибка логирования действия (некритично): {e}")
-        return False  # Логирование не должно ломать основной функционал
+
+    return event_sink.emit(_event_row(telegram_id, action_text))
+
+
+def _event_row(telegram_id: int, action_text: str) -> list:
+    # Строка листа Events: Telegram ID, Время, Действие
+    return [telegram_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), action_text]
+
+
+async def enqueue_event(session: AsyncSession, telegram_id: int, action_text: str) -> None:
+    """
+    Ставит строку Events в outbox в транзакции вызывающего кода: событие брони
+    записывается в лист, только если бронь сохранена, и не теряется при рестарте.
+    Время действия фиксируется сейчас, а не в момент доставки.
+    """
+    await enqueue(session, "events", {"row": _event_row(telegram_id, action_text)})
+
+
+async def _deliver_events(payloads: List[dict]) -> List[Optional[BaseException]]:
+    if sheet_configured():
+        await _write_events([payload["row"] for payload in payloads])
+    return [None] * len(payloads)
+
+
+outbox.register("events", _deliver_events, concurrency=1, batch_size=100)
@@ -0,0 +1,294 @@
+"""
+Outbox: надёжная доставка внешних последствий брони (Sheets, Calendar, Events).
+
+confirm_booking раньше по очереди ходил в Google: любая задержка Google
+задерживала ответ пользователю, а падение на полпути оставляло лист,
+календарь и БД рассинхронизированными. Теперь хэндлер в одной транзакции
+с бронью пишет в таблицу outbox сообщения «что сделать снаружи» и сразу
+отвечает. OutboxDispatcher забирает готовые сообщения, группирует их по
+получателю (target) и отдаёт обработчику пачкой. Одновременных пачек на
+получателя не больше его concurrency. Неудачи повторяются с
+экспоненциальной задержкой, после max_attempts сообщение помечается failed.
+Сообщения с одинаковым dedup_key, ещё ждущие отправки, схлопываются в одно;
+взятое в доставку сообщение получает статус sending, и изменение, пришедшее
+во время доставки, встаёт в очередь заново. Взятое сообщение арендовано на
+sending_lease секунд (срок хранится в next_attempt_at): если результат
+доставки так и не удалось записать, по истечении аренды оно возвращается в
+очередь без рестарта. После рестарта недоставленное подхватывается из БД
+(доставка «хотя бы раз», поэтому обработчики идемпотентны).
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    OUTBOX_POLL_INTERVAL, OUTBOX_BATCH_WINDOW, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX,
+    OUTBOX_SENDING_LEASE,
+)
+from db import AsyncSessionLocal
+from db.models import OutboxMessage
+from db.queries import due_outbox
+
+logger = logging.getLogger(__name__)
+
+# Попытки записать результат доставки (блокировка БД обычно проходит за доли секунды)
+RECORD_ATTEMPTS = 4
+
+# Обработчик пачки: payload'ы сообщений → ошибка по каждому (None — доставлено)
+OutboxHandler = Callable[[List[dict]], Awaitable[List[Optional[BaseException]]]]
+
+
+class PermanentError(Exception):
+    """Ошибка, которую повтор не исправит (нет календаря тренера, битые данные брони)."""
+
+
+async def enqueue(session: AsyncSession, target: str, payload: dict, dedup_key: Optional[str] = None) -> None:
+    """
+    Добавляет сообщение в outbox в транзакции вызывающего кода (коммитит вызывающий).
+    Если ждущее сообщение с тем же dedup_key уже есть, новое не добавляется.
+    """
+    await session.execute(
+        sqlite_insert(OutboxMessage)
+        .values(target=target, payload=payload, dedup_key=dedup_key, next_attempt_at=datetime.utcnow())
+        .on_conflict_do_nothing()
+    )
+
+
+class _Target:
+    __slots__ = ("handler", "semaphore", "batch_size")
+
+    def __init__(self, handler: OutboxHandler, concurrency: int, batch_size: int):
+        self.handler = handler
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.batch_size = batch_size
+
+
+class OutboxDispatcher:
+    """Фоновая доставка сообщений outbox с повторами и лимитами на получателя."""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        poll_interval: float,
+        batch_window: float,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        sending_lease: float,
+    ):
+        self._session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.sending_lease = sending_lease
+
+        self._targets: Dict[str, _Target] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, target: str, handler: OutboxHandler, concurrency: int = 1, batch_size: int = 20) -> None:
+        self._targets[target] = _Target(handler, concurrency, batch_size)
+
+    def wake(self) -> None:
+        """Сообщает, что в outbox появились сообщения (вызывать после commit)."""
+        self._wakeup.set()
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)  # разносим повторы, чтобы не бить в Google разом
+
+    async def recover(self, expired_only: bool = False) -> int:
+        """
+        Возвращает в очередь сообщения, чья доставка прервалась: при запуске — все
+        в статусе sending (их доставку оборвала остановка бота), с expired_only —
+        только с истёкшей арендой. Если за это время появилось такое же ждущее
+        сообщение, старое не нужно. Возвращает число возвращённых.
+        """
+        stuck = OutboxMessage.status == "sending"
+        if expired_only:
+            stuck = stuck & (OutboxMessage.next_attempt_at <= datetime.utcnow())
+        async with self._session_factory() as session:
+            if expired_only:
+                # Проверка без блокировки записи: обычно зависших сообщений нет
+                result = await session.execute(select(OutboxMessage.id).where(stuck).limit(1))
+                if result.first() is None:
+                    return 0
+            pending = select(OutboxMessage.dedup_key).where(
+                OutboxMessage.status == "pending", OutboxMessage.dedup_key.is_not(None)
+            )
+            await session.execute(delete(OutboxMessage).where(stuck, OutboxMessage.dedup_key.in_(pending)))
+            result = await session.execute(
+                update(OutboxMessage).where(stuck).values(status="pending", next_attempt_at=datetime.utcnow())
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.warning(f"Outbox: возвращено в очередь прерванных сообщений: {result.rowcount}")
+        return result.rowcount
+
+    async def dispatch_due(self) -> int:
+        """Забирает готовые сообщения и запускает их доставку. Возвращает число запущенных."""
+        async with self._session_factory() as session:
+            result = await session.execute(due_outbox(datetime.utcnow(), limit=500))
+            rows = [row for row in result.all() if row.target in self._targets]
+            if not rows:
+                return 0
+            # "sending" выводит сообщение из-под уникального dedup_key: изменение, пришедшее
+            # во время доставки, встанет в очередь отдельно, а не потеряется
+            await session.execute(
+                update(OutboxMessage).where(OutboxMessage.id.in_([row.id for row in rows]))
+                .values(status="sending", next_attempt_at=datetime.utcnow() + timedelta(seconds=self.sending_lease))
+            )
+            await session.commit()
+
+        by_target: Dict[str, list] = {}
+        for row in rows:
+            by_target.setdefault(row.target, []).append(row)
+        for target, messages in by_target.items():
+            batch_size = self._targets[target].batch_size
+            for i in range(0, len(messages), batch_size):
+                task = asyncio.create_task(self._deliver(target, messages[i:i + batch_size]))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return len(rows)
+
+    async def _deliver(self, target: str, messages: list) -> None:
+        spec = self._targets[target]
+        async with spec.semaphore:
+            try:
+                errors = await spec.handler([row.payload for row in messages])
+            except Exception as e:
+                errors = [e] * len(messages)
+        for attempt in range(1, RECORD_ATTEMPTS + 1):
+            try:
+                await self._record(target, messages, errors)
+                return
+            except Exception as e:
+                if attempt == RECORD_ATTEMPTS:
+                    # Сообщения останутся в "sending" и вернутся в очередь по истечении аренды
+                    logger.error(f"Outbox: не удалось записать результат доставки {target}: {e}")
+                    return
+                logger.warning(f"Outbox: запись результата доставки {target} не удалась (попытка {attempt}): {e}")
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    async def _record(self, target: str, messages: list, errors: List[Optional[BaseException]]) -> None:
+        now = datetime.utcnow()
+        retried = failed = 0
+        done = [row.id for row, error in zip(messages, errors) if error is None]
+        async with self._session_factory() as session:
+            if done:
+                await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(done)))
+            retry_keys = {row.dedup_key for row, error in zip(messages, errors) if error is not None and row.dedup_key}
+            superseded = set()
+            if retry_keys:
+                # Пока шла доставка, появилось свежее сообщение с тем же ключом — повтор старого не нужен
+                result = await session.execute(
+                    select(OutboxMessage.dedup_key)
+                    .where(OutboxMessage.status == "pending", OutboxMessage.dedup_key.in_(retry_keys))
+                )
+                superseded = set(result.scalars().all())
+            for row, error in zip(messages, errors):
+                if error is None:
+                    continue
+                if row.dedup_key in superseded:
+                    await session.execute(delete(OutboxMessage).where(OutboxMessage.id == row.id))
+                    continue
+                attempts = row.attempts + 1
+                values = {"attempts": attempts, "last_error": str(error)[:500]}
+                if attempts >= self.max_attempts or isinstance(error, PermanentError):
+                    values["status"] = "failed"
+                    failed += 1
+                    logger.error(f"Outbox: {target} #{row.id} не доставлено за {attempts} попыток: {error}")
+                else:
+                    values["status"] = "pending"
+                    values["next_attempt_at"] = now + timedelta(seconds=self._retry_delay(attempts))
+                    retried += 1
+                    logger.warning(f"Outbox: {target} #{row.id} — попытка {attempts} не удалась: {error}")
+                await session.execute(update(OutboxMessage).where(OutboxMessage.id == row.id).values(**values))
+            await session.commit()
+        # Метрики — только после коммита: _record может повторяться
+        self.delivered += len(done)
+        self.retried += retried
+        self.failed += failed
+
+    async def _run(self) -> None:
+        try:
+            await self.recover()
+        except Exception as e:
+            logger.error(f"Outbox: не удалось вернуть прерванные сообщения: {e}")
+        loop = asyncio.get_running_loop()
+        next_recover = loop.time() + self.sending_lease / 2
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                # Даём соседним сообщениям попасть в ту же пачку
+                await asyncio.sleep(self.batch_window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if loop.time() >= next_recover:
+                    next_recover = loop.time() + self.sending_lease / 2
+                    await self.recover(expired_only=True)
+                await self.dispatch_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox: ошибка выборки сообщений: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._wakeup.set()  # сразу подхватываем то, что не успели доставить до рестарта
+
+    async def stop(self) -> None:
+        """Останавливает выборку и дожидается начатых доставок; остальное дождётся следующего запуска."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stats(self) -> dict:
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+            )
+            counts = dict(result.all())
+        return {
+            "pending": counts.get("pending", 0),
+            "failed": counts.get("failed", 0),
+            "sending": counts.get("sending", 0),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failures": self.failed,
+        }
+
+
+outbox = OutboxDispatcher(
+    AsyncSessionLocal,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    batch_window=OUTBOX_BATCH_WINDOW,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    retry_base=OUTBOX_RETRY_BASE,
+    retry_max=OUTBOX_RETRY_MAX,
+    sending_lease=OUTBOX_SENDING_LEASE,
+)
@@ -0,0 +1,260 @@
+"""
+Бронирование мест без гонок.
+
+Раньше update_free_slots читал "Свободно" из листа, прибавлял дельту и писал
+обратно: два клиента, подтверждающие один слот одновременно, оба получали
+место, а счётчик расходился с реальностью. Теперь источник правды —
+локальная таблица slot_seats: на каждый слот свой asyncio.Lock, а место
+списывается атомарным UPDATE ... WHERE free >= :seats. Ответ «да/нет»
+получается сразу, без чтения из Google, а новое значение уходит в Sheets
+в фоне — сразу или через outbox (services/outbox.py). Брони, отмены и
+переносы меняют места в транзакции хэндлера (session=...) вместе с самой
+бронью и задачей outbox: падение между ними не оставит списанного места без
+брони. Слоты с отправкой в полёте не пересчитываются синхронизацией
+зеркала Schedule (services/schedule_mirror.py).
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import AsyncSessionLocal
+from db.models import SlotSeat
+from db.queries import slot_free
+from services.google_sheets import schedule_mirror, slot_writer
+from services.outbox import enqueue, outbox
+from services.schedule_index import SlotRecord
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationEngine:
+    """Атомарный учёт мест по слотам в SQLite с фоновой отправкой в Sheets."""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        push: Callable[[int, int, Optional[str]], Awaitable[bool]],
+    ):
+        self._session_factory = session_factory
+        self._push = push
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Последнее известное значение free по слоту: распроданный слот отклоняется без запроса к БД
+        self._known_free: Dict[str, int] = {}
+        self._push_tasks: Set[asyncio.Task] = set()
+        self._pushing: Dict[str, int] = {}  # slot_key → сколько отправок в Sheets ещё не завершено
+
+        # Метрики
+        self.reserved = 0
+        self.rejected = 0
+        self.released = 0
+        self.push_errors = 0
+
+    def _lock(self, slot_key: str) -> asyncio.Lock:
+        lock = self._locks.get(slot_key)
+        if lock is None:
+            lock = self._locks[slot_key] = asyncio.Lock()
+        return lock
+
+    async def _change(
+        self, slot_key: str, delta: int, seed: Optional[SlotRecord] = None, session: Optional[AsyncSession] = None,
+    ) -> Optional[SlotSeat]:
+        """Атомарно меняет free на delta; списание не уходит ниже нуля. Без session — в своей транзакции."""
+        if session is None:
+            async with self._session_factory() as own:
+                seat = await self._change(slot_key, delta, seed, own)
+                await own.commit()
+            return seat
+        if seed is not None:
+            # Первое обращение к слоту — берём стартовое значение из снимка Schedule
+            await session.execute(
+                sqlite_insert(SlotSeat)
+                .values(slot_key=slot_key, row_index=seed.row_index, free=seed.free, synced_free=seed.free)
+                .on_conflict_do_nothing(index_elements=["slot_key"])
+            )
+        stmt = update(SlotSeat).where(SlotSeat.slot_key == slot_key)
+        if delta < 0:
+            stmt = stmt.where(SlotSeat.free >= -delta)
+        result = await session.execute(
+            stmt.values(free=SlotSeat.free + delta).returning(SlotSeat.free, SlotSeat.row_index)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return SlotSeat(slot_key=slot_key, free=row.free, row_index=row.row_index)
+
+    def _remember(self, slot_key: str, free: int, session: Optional[AsyncSession]) -> None:
+        if session is None:
+            self._known_free[slot_key] = free
+        else:
+            # Транзакцию вызывающего кода могут откатить — незакоммиченному значению не верим
+            self._known_free.pop(slot_key, None)
+
+    async def reserve(
+        self, slot: SlotRecord, seats: int = 1, lesson_type: Optional[str] = None, push: bool = True,
+        session: Optional[AsyncSession] = None,
+    ) -> Optional[int]:
+        """
+        Списывает места в слоте.
+
+        Args:
+            slot: Слот из снимка Schedule
+            seats: Сколько мест занять
+            lesson_type: Тип занятия, который нужно записать в слот вместе с местами
+            push: Отправить новое значение в Sheets сразу; False — отправку ставит
+                вызывающий код через outbox (enqueue_seat_push)
+            session: Транзакция вызывающего кода: место спишется только вместе с её
+                коммитом (откат вернёт его сам). None — списание коммитится сразу
+
+        Returns:
+            Оставшееся количество мест или None, если мест не хватило
+        """
+        async with self._lock(slot.slot_key):
+            known = self._known_free.get(slot.slot_key)
+            if known is not None and known < seats:
+                seat = None
+            else:
+                seat = await self._change(slot.slot_key, -seats, seed=slot, session=session)
+                if seat is not None:
+                    self._remember(slot.slot_key, seat.free, session)
+                else:
+                    # Списание не прошло — значит, мест меньше seats (верхняя оценка)
+                    self._known_free[slot.slot_key] = seats - 1
+        if seat is None:
+            self.rejected += 1
+            logger.info(f"Слот {slot.slot_key}: мест нет")
+            return None
+        self.reserved += 1
+        if push:
+            self._schedule_push(seat, lesson_type)
+        return seat.free
+
+    async def release(
+        self, slot_key: str, seats: int = 1, push: bool = True, session: Optional[AsyncSession] = None,
+    ) -> Optional[int]:
+        """Возвращает места в слот (отмена). None — слот не найден в учёте. session — как в reserve()."""
+        async with self._lock(slot_key):
+            seat = await self._change(slot_key, seats, session=session)
+            if seat is not None:
+                self._remember(slot_key, seat.free, session)
+        if seat is None:
+            logger.warning(f"Слот {slot_key} не найден в локальном учёте мест")
+            return None
+        self.released += 1
+        if push:
+            self._schedule_push(seat, None)
+        return seat.free
+
+    def forget(self, slot_key: str) -> None:
+        """Сбрасывает закэшированное значение free (после внешнего изменения учёта)."""
+        self._known_free.pop(slot_key, None)
+
+    async def get_free(self, slot_key: str) -> Optional[int]:
+        async with self._session_factory() as session:
+            result = await session.execute(slot_free(slot_key))
+            return result.scalar_one_or_none()
+
+    # ——— Отправка в Sheets ———
+
+    def busy_slots(self) -> Set[str]:
+        """Слоты, чьё значение free ещё не подтверждено записью в Sheets."""
+        return set(self._pushing)
+
+    def _schedule_push(self, seat: SlotSeat, lesson_type: Optional[str]) -> None:
+        slot_key = seat.slot_key
+        self._pushing[slot_key] = self._pushing.get(slot_key, 0) + 1
+        task = asyncio.create_task(self._push_seat(slot_key, lesson_type))
+        self._push_tasks.add(task)
+        task.add_done_callback(self._push_tasks.discard)
+        task.add_done_callback(lambda _: self._push_done(slot_key))
+
+    def _push_done(self, slot_key: str) -> None:
+        left = self._pushing.get(slot_key, 1) - 1
+        if left > 0:
+            self._pushing[slot_key] = left
+        else:
+            self._pushing.pop(slot_key, None)
+
+    async def push(self, slot_key: str, lesson_type: Optional[str] = None) -> bool:
+        """Отправляет текущее значение free слота в Sheets (доставка из outbox). False — не удалось."""
+        self._pushing[slot_key] = self._pushing.get(slot_key, 0) + 1
+        try:
+            return await self._push_seat(slot_key, lesson_type)
+        finally:
+            self._push_done(slot_key)
+
+    async def push_batch(self, payloads: List[dict]) -> List[Optional[BaseException]]:
+        """Обработчик outbox "seat": все слоты пачки отправляются разом — SlotWriter сольёт их в один batch_update."""
+        results = await asyncio.gather(
+            *(self.push(payload["slot_key"], payload.get("lesson_type")) for payload in payloads),
+            return_exceptions=True,
+        )
+        return [
+            result if isinstance(result, BaseException)
+            else None if result else RuntimeError(f"не удалось записать места слота {payload['slot_key']} в Sheets")
+            for payload, result in zip(payloads, results)
+        ]
+
+    async def _push_seat(self, slot_key: str, lesson_type: Optional[str]) -> bool:
+        # Отправляем актуальное значение из учёта, а не то, что было на момент брони:
+        # так параллельные отправки одного слота не перезапишут друг друга старыми данными.
+        # Номер строки тоже читаем заново — после архивирования строки сдвигаются
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(SlotSeat.free, SlotSeat.row_index).where(SlotSeat.slot_key == slot_key)
+            )
+            row = result.first()
+        if row is None:
+            return True  # слота нет в учёте — отправлять нечего
+        free, row_index = row
+        try:
+            ok = await self._push(row_index, free, lesson_type)
+        except Exception as e:
+            ok = False
+            logger.error(f"Ошибка отправки мест слота {slot_key} в Sheets: {e}")
+        if not ok:
+            self.push_errors += 1
+            return False
+        async with self._session_factory() as session:
+            await session.execute(
+                update(SlotSeat).where(SlotSeat.slot_key == slot_key).values(synced_free=free)
+            )
+            await session.commit()
+        return True
+
+    async def drain(self) -> None:
+        """Дожидается фоновых отправок в Sheets (при остановке бота)."""
+        if self._push_tasks:
+            await asyncio.gather(*self._push_tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "reserved": self.reserved,
+            "rejected": self.rejected,
+            "released": self.released,
+            "push_errors": self.push_errors,
+            "pending_pushes": len(self._push_tasks),
+        }
+
+
+async def _push_to_sheet(row_index: int, free: int, lesson_type: Optional[str]) -> bool:
+    return await slot_writer.mutate(row_index, free=free, lesson_type=lesson_type)
+
+
+reservations = ReservationEngine(AsyncSessionLocal, _push_to_sheet)
+schedule_mirror.attach_ledger(reservations.busy_slots, reservations.forget)
+
+
+async def enqueue_seat_push(session: AsyncSession, slot_key: str, lesson_type: Optional[str] = None) -> None:
+    """Ставит отправку мест слота в Sheets в outbox (в транзакции вызывающего кода)."""
+    await enqueue(
+        session, "seat", {"slot_key": slot_key, "lesson_type": lesson_type},
+        dedup_key=f"seat:{slot_key}:{lesson_type or ''}",
+    )
+
+
+outbox.register("seat", reservations.push_batch, concurrency=2, batch_size=50)
@@ -0,0 +1,121 @@
+"""
+Общий снимок листа Schedule в памяти.
+
+Один сценарий записи читает расписание несколько раз (тренеры → даты → время
+→ тип слота). Снимок живёт ttl секунд, одновременные промахи ждут одну и ту
+же загрузку (single-flight), а собственные записи бота применяются к снимку
+локально, без перечитывания. Загружается снимок из локального зеркала
+schedule_slots (см. services/schedule_mirror.py), а не из Sheets напрямую.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from services.schedule_index import ScheduleIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleCache:
+    """Снимок Schedule (разобранный в ScheduleIndex) с TTL и single-flight обновлением."""
+
+    def __init__(self, loader: Callable[[], Awaitable[ScheduleIndex]], ttl: float):
+        self._loader = loader
+        self.ttl = ttl
+
+        self._index: Optional[ScheduleIndex] = None
+        self._loaded_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self.version = 0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.local_updates = 0
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._index is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def get(self) -> ScheduleIndex:
+        """Возвращает индекс слотов, при необходимости обновляя снимок."""
+        if self.is_fresh:
+            self.hits += 1
+            return self._index
+        self.misses += 1
+        return await self.refresh()
+
+    async def refresh(self) -> ScheduleIndex:
+        """
+        Перезагружает снимок. Параллельные вызовы ждут одну и ту же загрузку.
+
+        Если загрузка не удалась, а старый снимок есть — отдаёт его.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+        inflight = self._inflight
+        try:
+            return await asyncio.shield(inflight)
+        except Exception as e:
+            if self._index is not None:
+                logger.warning(f"Schedule: обновление не удалось, используется старый снимок: {e}")
+                return self._index
+            raise
+
+    async def _load(self) -> ScheduleIndex:
+        try:
+            index = await self._loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            self._inflight = None
+        return self._set_index(index)
+
+    def _set_index(self, index: ScheduleIndex) -> ScheduleIndex:
+        # Слоты разбираются один раз на обновление, а не на каждый запрос
+        self._index = index
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        self.version += 1
+        logger.debug(f"Schedule: снимок обновлён ({len(self._index)} слотов, версия {self.version})")
+        return self._index
+
+    @property
+    def current(self) -> Optional[ScheduleIndex]:
+        """Текущий снимок без обновления (может быть устаревшим или None)."""
+        return self._index
+
+    def apply_update(self, row_index: int, free: Optional[int] = None,
+                     lesson_type: Optional[str] = None) -> None:
+        """
+        Применяет собственную запись бота к снимку (write-through).
+
+        Args:
+            row_index: Номер строки в листе (1-based, строка 1 — заголовки)
+            free: Новое значение "Свободно"
+            lesson_type: Новое значение "Типтренировки"
+        """
+        if self._index is None:
+            return
+        if self._index.apply_update(row_index, free=free, lesson_type=lesson_type):
+            self.local_updates += 1
+            self.version += 1
+
+    def invalidate(self) -> None:
+        """Помечает снимок устаревшим — следующее чтение перезагрузит его."""
+        self._loaded_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "local_updates": self.local_updates,
+            "version": self.version,
+        }
@@ -0,0 +1,208 @@
+"""
+Типизированные слоты листа Schedule и индексы по ним.
+
+Строки get_all_records() разбираются один раз на обновление снимка:
+дата, места и цена приводятся к типам, а слоты раскладываются по индексам
+тренер → дата → время. Поиск по тренеру, дате или ключу слота идёт по словарям
+и отсортированному списку дат (bisect), без прохода по всему листу.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.constants import MONTH_NUMBERS_RU
+
+DEFAULT_LESSON_TYPE = "group_single"
+
+
+def parse_sheet_date(value) -> Optional[date]:
+    """'15.03.2025' → date(2025, 3, 15); None, если формат не распознан."""
+    try:
+        day, month, year = str(value).strip().split(".")
+        return date(int(year), int(month), int(day))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_day_month(date_str: str) -> Tuple[int, int]:
+    """'15 марта' → (15, 3). Бросает ValueError для неизвестного формата."""
+    parts = date_str.split()
+    if len(parts) < 2 or parts[1] not in MONTH_NUMBERS_RU:
+        raise ValueError(f"Некорректная дата: {date_str!r}")
+    return int(parts[0]), MONTH_NUMBERS_RU[parts[1]]
+
+
+def resolve_day_month(date_str: str, today: Optional[date] = None) -> date:
+    """
+    '15 марта' → дата с годом. Брони хранят дату без года, а расписание
+    покрывает несколько недель вокруг сегодняшнего дня, поэтому берётся
+    ближайший к today год (запись на 5 января, сделанная в декабре, — следующий).
+    """
+    day, month = parse_day_month(date_str)
+    today = today or date.today()
+    candidate = date(today.year, month, day)
+    if (today - candidate).days > 183:
+        return date(today.year + 1, month, day)
+    if (candidate - today).days > 183:
+        return date(today.year - 1, month, day)
+    return candidate
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class SlotRecord:
+    """Одна строка листа Schedule."""
+
+    __slots__ = ("row_index", "trainer", "date", "time", "free", "price", "lesson_type", "ordinal")
+
+    def __init__(self, row_index: int, trainer: str, date: date, time: str,
+                 free: int, price: int, lesson_type: str):
+        self.row_index = row_index
+        self.trainer = trainer
+        self.date = date
+        self.time = time
+        self.free = free
+        self.price = price
+        self.lesson_type = lesson_type  # "" — тип ещё не задан первым бронированием
+        self.ordinal = 0                # номер среди слотов с тем же тренером/датой/временем
+
+    @classmethod
+    def from_row(cls, row_index: int, row: Dict) -> Optional["SlotRecord"]:
+        slot_date = parse_sheet_date(row.get("Дата"))
+        if slot_date is None:
+            return None
+        return cls(
+            row_index=row_index,
+            trainer=str(row.get("Тренер", "")).strip(),
+            date=slot_date,
+            time=str(row.get("Время", "")).strip(),
+            free=_to_int(row.get("Свободно")),
+            price=_to_int(row.get("Цена")),
+            lesson_type=str(row.get("Типтренировки", "")).strip().lower(),
+        )
+
+    @property
+    def slot_key(self) -> str:
+        """
+        Стабильный ключ слота: не зависит от номера строки, который меняется
+        при удалении строк выше.
+        """
+        return f"{self.trainer}|{self.date.isoformat()}|{self.time}|{self.ordinal}"
+
+    def as_dict(self) -> Dict:
+        """Формат, который ожидают клавиатуры и хэндлеры бронирования."""
+        return {
+            "time": self.time,
+            "free": self.free,
+            "price": self.price,
+            "lesson_type": self.lesson_type or DEFAULT_LESSON_TYPE,
+            "row_index": self.row_index,
+        }
+
+    def __repr__(self) -> str:
+        return f"SlotRecord({self.trainer} {self.date} {self.time}, free={self.free}, row={self.row_index})"
+
+
+class ScheduleIndex:
+    """Индексы по слотам одного снимка Schedule."""
+
+    def __init__(self, slots: Iterable[SlotRecord]):
+        self.by_row: Dict[int, SlotRecord] = {}
+        self.by_trainer: Dict[str, Dict[date, Dict[str, List[SlotRecord]]]] = {}
+        self.dates_by_trainer: Dict[str, List[date]] = {}
+        self._by_day_month: Dict[str, Dict[Tuple[int, int], List[date]]] = {}
+
+        for slot in slots:
+            self._add(slot)
+
+        for trainer, dates in self.by_trainer.items():
+            self.dates_by_trainer[trainer] = sorted(dates)
+            # Несколько слотов на одно время (группа + индивидуальное) — в порядке строк
+            for day in dates.values():
+                for slots in day.values():
+                    slots.sort(key=lambda s: s.row_index)
+                    for ordinal, slot in enumerate(slots):
+                        slot.ordinal = ordinal
+            by_dm = self._by_day_month.setdefault(trainer, {})
+            for d in self.dates_by_trainer[trainer]:
+                by_dm.setdefault((d.day, d.month), []).append(d)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "ScheduleIndex":
+        """Строит индекс из строк get_all_records() (строка 1 листа — заголовки)."""
+        return cls.from_rows(enumerate(records, start=2))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, Dict]]) -> "ScheduleIndex":
+        """Строит индекс из пар (номер строки, запись) — например, прочитанных диапазонами."""
+        slots = (SlotRecord.from_row(row_index, row) for row_index, row in rows)
+        return cls(slot for slot in slots if slot is not None)
+
+    @property
+    def slots(self) -> List[SlotRecord]:
+        return list(self.by_row.values())
+
+    def _add(self, slot: SlotRecord) -> None:
+        self.by_row[slot.row_index] = slot
+        (self.by_trainer
+            .setdefault(slot.trainer, {})
+            .setdefault(slot.date, {})
+            .setdefault(slot.time, [])
+            .append(slot))
+
+    def __len__(self) -> int:
+        return len(self.by_row)
+
+    # ——— Поиск ———
+
+    def slots_on(self, trainer: str, slot_date: date) -> List[SlotRecord]:
+        """Все слоты тренера на дату, отсортированные по времени."""
+        day = self.by_trainer.get(trainer, {}).get(slot_date)
+        if not day:
+            return []
+        return [slot for time_key in sorted(day) for slot in day[time_key]]
+
+    def dates_for_day_month(self, trainer: str, day: int, month: int) -> List[date]:
+        """Даты тренера с заданными днём и месяцем (кнопки содержат дату без года)."""
+        return self._by_day_month.get(trainer, {}).get((day, month), [])
+
+    def get_slots(self, trainer: str, slot_date: date, time: str) -> List[SlotRecord]:
+        """Слоты по ключу тренер/дата/время."""
+        return self.by_trainer.get(trainer, {}).get(slot_date, {}).get(time, [])
+
+    def dates_in_range(self, trainer: str, start: date, end: date) -> List[date]:
+        """Даты тренера в окне [start, end] (bisect по отсортированному списку)."""
+        dates = self.dates_by_trainer.get(trainer, [])
+        return dates[bisect_left(dates, start):bisect_right(dates, end)]
+
+    def free_dates(self, trainer: str, start: date, end: date,
+                   skip: Optional[Callable[["SlotRecord"], bool]] = None) -> List[date]:
+        """Даты в окне, где у тренера есть хотя бы одно свободное место (слоты, для которых skip() истинно, не считаются)."""
+        day_slots = self.by_trainer.get(trainer, {})
+        return [
+            d for d in self.dates_in_range(trainer, start, end)
+            if any(slot.free > 0 and not (skip and skip(slot)) for slots in day_slots[d].values() for slot in slots)
+        ]
+
+    def trainers_with_free_seats(self, start: date, end: date) -> List[str]:
+        """Тренеры, у которых в окне [start, end] есть свободные места."""
+        return sorted(trainer for trainer in self.by_trainer if self.free_dates(trainer, start, end))
+
+    # ——— Локальные изменения (write-through) ———
+
+    def apply_update(self, row_index: int, free: Optional[int] = None,
+                     lesson_type: Optional[str] = None) -> bool:
+        slot = self.by_row.get(row_index)
+        if slot is None:
+            return False
+        if free is not None:
+            slot.free = free
+        if lesson_type is not None:
+            slot.lesson_type = lesson_type.strip().lower()
+        return True
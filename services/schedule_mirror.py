@@ -0,0 +1,267 @@
+"""
+Локальное зеркало листа Schedule в таблице schedule_slots.
+
+Раньше каждое чтение расписания шло в Google, а при медленном или
+недоступном Sheets бот показывал выдуманные тестовые слоты. Теперь фоновая
+синхронизация раз в interval секунд читает лист, сравнивает его с зеркалом
+и применяет только изменившиеся строки. Все чтения (ScheduleCache) идут в
+индексированную локальную таблицу и продолжают работать, пока Sheets лежит.
+
+Свободные места слотов, по которым уже были брони, берутся из учёта
+slot_seats (services/reservations.py). Если администратор поменял
+"Свободно" прямо в листе, учёт пересчитывается: к новому значению из листа
+применяются брони, ещё не отправленные в Sheets.
+"""
+
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select
+
+from db.models import ScheduleSlot, SlotSeat
+from db.queries import schedule_slots_since, update_schedule_row
+from services.schedule_index import ScheduleIndex, SlotRecord
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = ("row_index", "trainer", "slot_date", "time", "free", "price", "lesson_type")
+
+
+def _slot_values(slot: SlotRecord) -> Tuple:
+    return (slot.row_index, slot.trainer, slot.date, slot.time, slot.free, slot.price, slot.lesson_type)
+
+
+class ScheduleMirror:
+    """Зеркало Schedule в SQLite с периодической синхронизацией по разнице."""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        fetch: Callable[[], Awaitable[ScheduleIndex]],
+        interval: float,
+    ):
+        self._session_factory = session_factory
+        self._fetch = fetch
+        self.interval = interval
+
+        self._task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()  # одна синхронизация за раз; архивирование берёт его на всё время переноса
+        self._local_tasks: Set[asyncio.Task] = set()
+        # Учёт мест: слоты с отправкой в полёте и уведомление о пересчёте
+        self._busy_slots: Callable[[], Set[str]] = set
+        self._seat_listeners: List[Callable[[str], None]] = []
+        self._sync_listeners: List[Callable[[], Awaitable]] = []
+
+        # Метрики
+        self.syncs = 0
+        self.sync_errors = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.rebased = 0
+        self.last_sync_ms = 0.0
+
+    def attach_ledger(self, busy_slots: Callable[[], Set[str]], on_rebase: Callable[[str], None]) -> None:
+        """Подключает учёт мест: какие слоты сейчас отправляются в Sheets и кого уведомить о пересчёте."""
+        self._busy_slots = busy_slots
+        self._seat_listeners.append(on_rebase)
+
+    def on_synced(self, callback: Callable[[], Awaitable]) -> None:
+        """Колбэк после синхронизации, изменившей зеркало (например, обновить снимок)."""
+        self._sync_listeners.append(callback)
+
+    # ——— Чтение ———
+
+    async def load_index(self, since: Optional[date] = None) -> ScheduleIndex:
+        """
+        Индекс слотов из зеркала, начиная с даты since (по умолчанию — вчера).
+
+        Места берутся из учёта slot_seats, если по слоту уже были брони.
+        """
+        since = since or date.today() - timedelta(days=1)
+        async with self._session_factory() as session:
+            result = await session.execute(schedule_slots_since(since))
+            rows = result.all()
+        return ScheduleIndex(
+            SlotRecord(
+                row_index=row.row_index, trainer=row.trainer, date=row.slot_date, time=row.time,
+                free=free, price=row.price, lesson_type=row.lesson_type,
+            )
+            for row, free in rows
+        )
+
+    # ——— Синхронизация ———
+
+    async def apply(self, index: ScheduleIndex) -> int:
+        """
+        Приводит зеркало к содержимому листа одной транзакцией.
+
+        Returns:
+            Сколько строк зеркала изменилось плюс сколько слотов учёта пересчитано
+        """
+        incoming: Dict[str, SlotRecord] = {slot.slot_key: slot for slot in index.slots}
+        busy = self._busy_slots()
+        rebased: List[str] = []
+
+        async with self._session_factory() as session:
+            current = {
+                row.slot_key: row
+                for row in (await session.execute(select(ScheduleSlot))).scalars()
+            }
+            seats = {
+                seat.slot_key: seat
+                for seat in (await session.execute(
+                    select(SlotSeat).where(SlotSeat.slot_key.in_(list(incoming)))
+                )).scalars()
+            } if incoming else {}
+
+            inserted = updated = 0
+            for key, slot in incoming.items():
+                row = current.get(key)
+                values = _slot_values(slot)
+                if row is None:
+                    session.add(ScheduleSlot(slot_key=key, **dict(zip(_FIELDS, values))))
+                    inserted += 1
+                elif tuple(getattr(row, field) for field in _FIELDS) != values:
+                    for field, value in zip(_FIELDS, values):
+                        setattr(row, field, value)
+                    updated += 1
+
+                seat = seats.get(key)
+                if seat is None:
+                    continue
+                seat.row_index = slot.row_index
+                if key in busy:
+                    continue
+                if seat.synced_free is not None and seat.synced_free != slot.free:
+                    # "Свободно" поменяли в листе вручную: сохраняем брони, ещё не отправленные в Sheets
+                    unsent = seat.synced_free - seat.free
+                    seat.free = max(0, slot.free - unsent)
+                    seat.synced_free = slot.free
+                    rebased.append(key)
+
+            stale = [key for key in current if key not in incoming]
+            if stale:
+                await session.execute(delete(ScheduleSlot).where(ScheduleSlot.slot_key.in_(stale)))
+            await session.commit()
+
+        for key in rebased:
+            for listener in self._seat_listeners:
+                listener(key)
+
+        self.inserted += inserted
+        self.updated += updated
+        self.deleted += len(stale)
+        self.rebased += len(rebased)
+        changes = inserted + updated + len(stale) + len(rebased)
+        if changes:
+            logger.info(
+                f"Schedule: зеркало обновлено (+{inserted} ~{updated} -{len(stale)}, "
+                f"пересчитано мест: {len(rebased)})"
+            )
+        return changes
+
+    async def sync(self) -> int:
+        """Читает лист и применяет разницу к зеркалу."""
+        async with self.lock:
+            return await self._sync()
+
+    async def _sync(self) -> int:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            index = await self._fetch()
+            changes = await self.apply(index)
+        except Exception as e:
+            self.sync_errors += 1
+            logger.warning(f"Schedule: синхронизация зеркала не удалась, чтения идут из локальной копии: {e}")
+            raise
+        self.syncs += 1
+        self.last_sync_ms = (loop.time() - started) * 1000
+        if changes:
+            for callback in self._sync_listeners:
+                await callback()
+        return changes
+
+    async def remap_rows(self, mapper: Callable[[int], Optional[int]]) -> None:
+        """
+        Перенумеровывает строки зеркала и учёта мест после удаления строк из листа.
+
+        Вызывается под self.lock, чтобы параллельная синхронизация не вернула старые номера.
+        """
+        async with self._session_factory() as session:
+            for row in (await session.execute(select(ScheduleSlot))).scalars():
+                new_index = mapper(row.row_index)
+                if new_index is None:
+                    await session.delete(row)
+                elif new_index != row.row_index:
+                    row.row_index = new_index
+            for seat in (await session.execute(select(SlotSeat))).scalars():
+                new_index = mapper(seat.row_index)
+                if new_index is not None and new_index != seat.row_index:
+                    seat.row_index = new_index
+            await session.commit()
+        for callback in self._sync_listeners:
+            await callback()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # уже залогировано в sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._local_tasks:
+            await asyncio.gather(*self._local_tasks, return_exceptions=True)
+
+    # ——— Собственные записи бота ———
+
+    def record_local(self, row_index: int, free: Optional[int] = None,
+                     lesson_type: Optional[str] = None) -> None:
+        """Переносит в зеркало значения, которые бот только что записал в лист."""
+        if free is None and lesson_type is None:
+            return
+        task = asyncio.create_task(self._apply_local(row_index, free, lesson_type))
+        self._local_tasks.add(task)
+        task.add_done_callback(self._local_tasks.discard)
+
+    async def _apply_local(self, row_index: int, free: Optional[int], lesson_type: Optional[str]) -> None:
+        values = {}
+        if free is not None:
+            values["free"] = free
+        if lesson_type is not None:
+            values["lesson_type"] = lesson_type.strip().lower()
+        try:
+            async with self._session_factory() as session:
+                await session.execute(update_schedule_row(row_index, **values))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Schedule: не удалось обновить строку {row_index} в зеркале: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "rebased": self.rebased,
+            "last_sync_ms": round(self.last_sync_ms, 1),
+        }
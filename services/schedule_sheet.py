@@ -0,0 +1,150 @@
+"""
+Чтение листа Schedule по окну дат и архивирование прошедших строк.
+
+get_all_records() скачивает и разбирает весь лист, хотя боту нужны только
+слоты от вчера до today + window_days. ScheduleSheetReader читает одну
+колонку "Дата", вычисляет непрерывные диапазоны строк, попадающих в окно,
+и забирает только их одним batch_get. Прошедшие строки раз в сутки
+переносятся на лист Archive, поэтому и колонка дат остаётся короткой.
+"""
+
+import logging
+from bisect import bisect_left
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from services.schedule_index import parse_sheet_date
+
+logger = logging.getLogger(__name__)
+
+DATE_COLUMN = "Дата"
+
+
+def contiguous_ranges(rows: Iterable[int]) -> List[Tuple[int, int]]:
+    """[2, 3, 4, 7, 8] → [(2, 4), (7, 8)]: непрерывные диапазоны из отсортированных номеров строк."""
+    ranges: List[Tuple[int, int]] = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1] = (ranges[-1][0], row)
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+def shift_row(row_index: int, removed: List[int]) -> Optional[int]:
+    """Новый номер строки после удаления строк removed (отсортированы); None — строка удалена."""
+    pos = bisect_left(removed, row_index)
+    if pos < len(removed) and removed[pos] == row_index:
+        return None
+    return row_index - pos
+
+
+class ScheduleSheetReader:
+    """Чтение и архивирование строк Schedule диапазонами (только блокирующие вызовы — через google_io)."""
+
+    def __init__(self, open_sheet: Callable[[], gspread.Worksheet]):
+        self._open_sheet = open_sheet
+        self._headers: Optional[List[str]] = None
+        self.window_ranges: List[Tuple[int, int]] = []  # диапазоны последнего чтения окна
+
+        # Метрики
+        self.reads = 0
+        self.rows_scanned = 0
+        self.rows_fetched = 0
+        self.rows_archived = 0
+
+    def _headers_sync(self, sheet: gspread.Worksheet, fresh: bool = False) -> List[str]:
+        if self._headers is None or fresh:
+            self._headers = sheet.row_values(1)
+        return self._headers
+
+    def _rows_where(self, sheet: gspread.Worksheet, headers: List[str],
+                    match: Callable[[date], bool]) -> List[int]:
+        if DATE_COLUMN not in headers:
+            raise ValueError(f"В листе Schedule нет колонки '{DATE_COLUMN}'")
+        dates = sheet.col_values(headers.index(DATE_COLUMN) + 1)
+        self.rows_scanned += max(0, len(dates) - 1)
+        rows = []
+        for row_index, value in enumerate(dates[1:], start=2):
+            slot_date = parse_sheet_date(value)
+            if slot_date is not None and match(slot_date):
+                rows.append(row_index)
+        return rows
+
+    def _fetch_ranges(self, sheet: gspread.Worksheet, width: int,
+                      ranges: List[Tuple[int, int]]) -> List[Tuple[int, List]]:
+        if not ranges:
+            return []
+        value_ranges = sheet.batch_get([
+            f"{rowcol_to_a1(first, 1)}:{rowcol_to_a1(last, width)}" for first, last in ranges
+        ])
+        rows: List[Tuple[int, List]] = []
+        for (first, _), value_range in zip(ranges, value_ranges):
+            # batch_get отбрасывает пустые строки в конце диапазона — номера считаем от начала
+            for offset, values in enumerate(value_range):
+                rows.append((first + offset, list(values) + [""] * (width - len(values))))
+        return rows
+
+    def read_window_sync(self, start: date, end: date) -> List[Tuple[int, Dict]]:
+        """
+        Строки с датой в окне [start, end].
+
+        Returns:
+            Пары (номер строки, запись в формате get_all_records())
+        """
+        sheet = self._open_sheet()
+        try:
+            headers = self._headers_sync(sheet)
+            rows = self._rows_where(sheet, headers, lambda d: start <= d <= end)
+            self.window_ranges = contiguous_ranges(rows)
+            fetched = self._fetch_ranges(sheet, len(headers), self.window_ranges)
+        except Exception:
+            self._headers = None  # возможно, структура листа изменилась
+            raise
+        self.reads += 1
+        self.rows_fetched += len(fetched)
+        return [(row_index, dict(zip(headers, values))) for row_index, values in fetched]
+
+    def archive_sync(self, before: date,
+                     open_archive: Callable[[List[str]], gspread.Worksheet]) -> List[int]:
+        """
+        Переносит строки с датой раньше before на лист архива и удаляет их из Schedule.
+
+        Строки сначала дописываются в архив и только потом удаляются: при сбое
+        между шагами строка может задвоиться в архиве, но не потеряется.
+
+        Returns:
+            Отсортированные номера удалённых строк (для пересчёта row_index)
+        """
+        sheet = self._open_sheet()
+        headers = self._headers_sync(sheet, fresh=True)
+        removed = self._rows_where(sheet, headers, lambda d: d < before)
+        if not removed:
+            return []
+        ranges = contiguous_ranges(removed)
+        rows = [values for _, values in self._fetch_ranges(sheet, len(headers), ranges)]
+
+        open_archive(headers).append_rows(rows, value_input_option="RAW")
+        # Удаляем снизу вверх, чтобы номера ещё не удалённых диапазонов не сдвигались
+        sheet.spreadsheet.batch_update({"requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": sheet.id, "dimension": "ROWS",
+                "startIndex": first - 1, "endIndex": last,
+            }}}
+            for first, last in reversed(ranges)
+        ]})
+        self.rows_archived += len(removed)
+        logger.info(f"Schedule: в архив перенесено {len(removed)} строк (до {before:%d.%m.%Y})")
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "reads": self.reads,
+            "rows_scanned": self.rows_scanned,
+            "rows_fetched": self.rows_fetched,
+            "rows_archived": self.rows_archived,
+            "window_ranges": len(self.window_ranges),
+        }
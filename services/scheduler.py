@@ -1,24 +1,43 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
 import pytz
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
-from config import TIMEZONE
+from config import ADMIN_CHAT_ID, TIMEZONE, SCHEDULE_WINDOW_DAYS, REMINDER_SWEEP_INTERVAL, REMINDER_BATCH_SIZE
 from db.models import Booking, User
-from db.database import AsyncSessionLocal
+from db.database import AsyncSessionLocal, run_maintenance
+from db.queries import inactive_users, reminder_candidates
+from services.activity import activity
+from services.broadcast import broadcasts
+from services.google_calendar import reconcile_calendar
+from services.google_sheets import archive_schedule
 from utils.constants import REMINDER_12H, REMINDER_2H
-from sqlalchemy import select
+from sqlalchemy import update
 
 logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler(timezone=TIMEZONE)
 
+INACTIVE_REMINDER_TEXT = (
+    "👋 Давно тебя не видели!\n\n"
+    "Приходи на пилатес — новых ощущений ждём! 🧘‍♀️\n\n"
+    "Нажми /start чтобы записаться на занятие."
+)
+
+# Брони в этих статусах не получают напоминаний
+INACTIVE_STATUSES = ("cancelled", "late_cancel", "done")
 
-async def send_reminder(bot: Bot, booking: Booking, text: str, buttons: list):
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+async def send_reminder(bot: Bot, booking, text: str, buttons: list) -> str:
+    """Отправляет напоминание. Возвращает статус: sent, blocked (повторять бесполезно) или failed."""
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     try:
         await bot.send_message(
@@ -27,85 +46,115 @@ async def send_reminder(bot: Bot, booking: Booking, text: str, buttons: list):
             reply_markup=keyboard
         )
         logger.info(f"Напоминание отправлено: user {booking.user_id}, booking {booking.id}")
+        return "sent"
+    except TelegramForbiddenError as e:
+        logger.warning(f"Пользователь {booking.user_id} заблокировал бота, напоминание не отправлено: {e}")
+        return "blocked"
     except Exception as e:
         logger.error(f"Не удалось отправить напоминание пользователю {booking.user_id}: {e}")
+        return "failed"
 
 
-async def schedule_reminders(bot: Bot, booking: Booking):
-    """
-    Планирует напоминания за 12 и 2 часа до начала занятия.
-    
-    Args:
-        bot: Экземпляр aiogram Bot
-        booking: Объект бронирования
-    """
-    # Парсируем дату и время занятия
-    lesson_dt_naive = datetime.strptime(f"{booking.date} {booking.time}", "%d %B %Y %H:%M")
-    
-    # Делаем datetime timezone-aware в зоне TIMEZONE
-    tz = pytz.timezone(TIMEZONE)
-    lesson_dt = tz.localize(lesson_dt_naive)
-    
-    # Рассчитываем время напоминаний
-    reminder_12 = lesson_dt - timedelta(hours=12)
-    reminder_2 = lesson_dt - timedelta(hours=2)
-
-    # Получаем текущее время в TIMEZONE
-    now_tz = datetime.now(tz=tz)
-
-    if reminder_12 > now_tz:
-        scheduler.add_job(
-            send_12h_reminder,
-            DateTrigger(run_date=reminder_12),
-            args=[bot, booking.id],
-            id=f"reminder_12h_{booking.id}",
-            replace_existing=True
-        )
-        logger.debug(f"Запланировано напоминание за 12ч: booking {booking.id}, время {reminder_12}")
-
-    if reminder_2 > now_tz:
-        scheduler.add_job(
-            send_2h_reminder,
-            DateTrigger(run_date=reminder_2),
-            args=[bot, booking.id],
-            id=f"reminder_2h_{booking.id}",
-            replace_existing=True
-        )
-        logger.debug(f"Запланировано напоминание за 2ч: booking {booking.id}, время {reminder_2}")
+def _reminder_12h_buttons(booking_id: int) -> list:
+    return [
+        [InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"confirm_{booking_id}")],
+        [InlineKeyboardButton(text="🔄 Перенести", callback_data=f"reschedule_{booking_id}")],
+        [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_{booking_id}")]
+    ]
 
 
-async def send_12h_reminder(bot: Bot, booking_id: int):
-    """Отправляет напоминание за 12 часов до занятия."""
-    async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        if not booking or booking.status in ["cancelled", "done"]:
-            return
-        booking.reminder_12_sent = True
-        await session.commit()
+def _reminder_2h_buttons(booking_id: int) -> list:
+    return [[InlineKeyboardButton(text="Я здесь! 💪", callback_data=f"im_here_{booking_id}")]]
 
-        buttons = [
-            [InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"confirm_{booking.id}")],
-            [InlineKeyboardButton(text="🔄 Перенести", callback_data=f"reschedule_{booking.id}")],
-            [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_{booking.id}")]
-        ]
-        await send_reminder(bot, booking, REMINDER_12H, buttons)
 
+def due_reminders(rows, now: datetime) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """
+    Раскладывает брони по напоминаниям, которые пора отправить.
 
-async def send_24h_reminder(bot: Bot, booking_id: int):
-    """Отправляет напоминание за 12 часов до занятия (старое имя, для совместимости)."""
-    await send_12h_reminder(bot, booking_id)
+    Returns:
+        (отправить за 12ч, отправить за 2ч, пропустить за 12ч, пропустить за 2ч).
+        Напоминание пропускается, если бронь сделана позже его момента — клиент и так помнит.
+    """
+    send_12, send_2, skip_12, skip_2 = [], [], [], []
+    for row in rows:
+        start = row.lesson_start
+        if start <= now:
+            continue
+        created = row.created_at.replace(tzinfo=timezone.utc) if row.created_at else None
+        if not row.reminder_2_sent and now >= start - timedelta(hours=2):
+            # За 2 часа до начала 12-часовое напоминание уже не отправляем
+            fresh = created is not None and created >= start - timedelta(hours=2)
+            (skip_2 if fresh else send_2).append(row.id)
+        elif not row.reminder_12_sent and now >= start - timedelta(hours=12):
+            fresh = created is not None and created >= start - timedelta(hours=12)
+            (skip_12 if fresh else send_12).append(row.id)
+    return send_12, send_2, skip_12, skip_2
 
 
-async def send_2h_reminder(bot: Bot, booking_id: int):
+async def sweep_reminders(bot: Bot) -> dict:
+    """
+    Один проход по напоминаниям: брони с началом в ближайшие 12 часов и
+    неотправленными флагами (диапазон по индексу ix_bookings_lesson_start_reminders),
+    отметка флагов одним UPDATE до отправки — повторный проход или рестарт
+    не пришлют напоминание дважды. Флаги напоминаний, которые не удалось
+    отправить, после рассылки снимаются: их повторит следующий проход (пока
+    занятие не началось). Пропущенные и заблокированные остаются отмеченными.
+    """
+    now = datetime.now(timezone.utc)
     async with AsyncSessionLocal() as session:
-        booking = await session.get(Booking, booking_id)
-        if not booking or booking.status in ["cancelled", "done"]:
-            return
-        booking.reminder_2_sent = True
+        result = await session.execute(reminder_candidates(now, now + timedelta(hours=12), INACTIVE_STATUSES))
+        rows = {row.id: row for row in result.all()}
+        send_12, send_2, skip_12, skip_2 = due_reminders(rows.values(), now)
+        if send_2 or skip_2:
+            await session.execute(
+                update(Booking).where(Booking.id.in_(send_2 + skip_2))
+                .values(reminder_12_sent=True, reminder_2_sent=True)
+                .execution_options(synchronize_session=False)
+            )
+        if send_12 or skip_12:
+            await session.execute(
+                update(Booking).where(Booking.id.in_(send_12 + skip_12))
+                .values(reminder_12_sent=True)
+                .execution_options(synchronize_session=False)
+            )
         await session.commit()
 
-        buttons = [[InlineKeyboardButton(text="Я здесь! 💪", callback_data=f"im_here_{booking.id}")]]
-        await send_reminder(bot, booking, REMINDER_2H, buttons)
+    messages = [(rows[i], REMINDER_12H, _reminder_12h_buttons(i)) for i in send_12]
+    messages += [(rows[i], REMINDER_2H, _reminder_2h_buttons(i)) for i in send_2]
+    statuses = []
+    for offset in range(0, len(messages), REMINDER_BATCH_SIZE):
+        if offset:
+            await asyncio.sleep(1)  # лимит Telegram — около 30 сообщений в секунду
+        statuses += await asyncio.gather(*(
+            send_reminder(bot, row, text, buttons)
+            for row, text, buttons in messages[offset:offset + REMINDER_BATCH_SIZE]
+        ))
+
+    failed = [row.id for (row, _, _), status in zip(messages, statuses) if status == "failed"]
+    if failed:
+        twelve = set(send_12)
+        retry_12 = [i for i in failed if i in twelve]
+        retry_2 = [i for i in failed if i not in twelve]
+        async with AsyncSessionLocal() as session:
+            if retry_12:
+                await session.execute(
+                    update(Booking).where(Booking.id.in_(retry_12))
+                    .values(reminder_12_sent=False)
+                    .execution_options(synchronize_session=False)
+                )
+            if retry_2:
+                await session.execute(
+                    update(Booking).where(Booking.id.in_(retry_2))
+                    .values(reminder_2_sent=False)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+    stats = {"checked": len(rows), "sent_12h": len(send_12), "sent_2h": len(send_2), "skipped": len(skip_12) + len(skip_2),
+             "blocked": statuses.count("blocked"), "failed": len(failed)}
+    if messages or skip_12 or skip_2:
+        logger.info(f"Напоминания: {stats}")
+    return stats
 
 
 async def setup_scheduler(bot: Bot):
@@ -125,45 +174,98 @@ async def setup_scheduler(bot: Bot):
         replace_existing=True
     )
     
+    # Напоминания за 12 и 2 часа: один периодический проход по БД вместо задачи на каждую бронь —
+    # состояние хранится во флагах броней и переживает рестарт
+    scheduler.add_job(
+        sweep_reminders,
+        IntervalTrigger(seconds=REMINDER_SWEEP_INTERVAL),
+        args=[bot],
+        id="sweep_reminders",
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+    )
+
+    # Ночью переносим прошедшие слоты из Schedule в Archive, чтобы чтение листа не росло со временем
+    scheduler.add_job(
+        archive_past_slots,
+        CronTrigger(hour=4, minute=0),
+        id="archive_past_slots",
+        replace_existing=True
+    )
+
+    # Ночное обслуживание SQLite: статистика для планировщика запросов, возврат свободных страниц, усечение WAL
+    scheduler.add_job(
+        maintain_database,
+        CronTrigger(hour=4, minute=30),
+        id="maintain_database",
+        replace_existing=True
+    )
+
+    # Ночная сверка календарей тренеров с бронями (исправляет пропущенные и ручные правки)
+    scheduler.add_job(
+        reconcile_trainer_calendars,
+        CronTrigger(hour=3, minute=30),
+        id="reconcile_trainer_calendars",
+        replace_existing=True
+    )
+
     logger.info(f"APScheduler запущен: таймзона={TIMEZONE}, напоминания и проверка неактивности активны")
 
 
+async def archive_past_slots():
+    """Переносит прошедшие слоты с листа Schedule на лист Archive."""
+    moved = await archive_schedule()
+    logger.info(f"Архивирование Schedule завершено: перенесено строк {moved}")
+
+
+async def maintain_database():
+    """Запускает обслуживание БД; время шагов пишется в лог."""
+    try:
+        await run_maintenance()
+    except Exception as e:
+        logger.error(f"Обслуживание БД не удалось: {e}")
+
+
+async def reconcile_trainer_calendars():
+    """Сверяет календари тренеров с бронями от вчерашнего дня до конца окна расписания."""
+    today = datetime.now(tz=pytz.timezone(TIMEZONE)).date()
+    try:
+        await reconcile_calendar(today - timedelta(days=1), today + timedelta(days=SCHEDULE_WINDOW_DAYS))
+    except Exception as e:
+        logger.error(f"Сверка Google Calendar не удалась: {e}")
+
+
 async def check_inactive_users(bot: Bot):
     """
     Проверяет неактивных пользователей (не заходили 14+ дней).
-    Отправляет им одно напоминание о повторном обращении.
+    Ставит им в рассылку одно напоминание о повторном обращении.
     """
     tz = pytz.timezone(TIMEZONE)
     cutoff_date = datetime.now(tz=tz) - timedelta(days=14)
     
+    # Активность, накопленная в памяти с последнего сброса, должна попасть в выборку
+    await activity.flush()
+
     async with AsyncSessionLocal() as session:
-        # Получаем пользователей, которые не активны 14+ дней
-        # И которым еще не отправляли напоминание о неактивности
-        result = await session.execute(
-            select(User).where(
-                (User.last_activity < cutoff_date) &
-                ((User.last_inactivity_message_sent == None) |
-                 (User.last_inactivity_message_sent < cutoff_date))
-            )
-        )
-        inactive_users = result.scalars().all()
-        
-        sent_count = 0
-        for user in inactive_users:
-            try:
-                await bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=(
-                        "👋 Давно тебя не видели!\n\n"
-                        "Приходи на пилатес — новых ощущений ждём! 🧘‍♀️\n\n"
-                        "Нажми /start чтобы записаться на занятие."
-                    )
-                )
-                user.last_inactivity_message_sent = datetime.now(tz=tz)
-                await session.commit()
-                sent_count += 1
-                logger.info(f"Напоминание о неактивности отправлено пользователю {user.telegram_id}")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {e}")
-        
-        logger.info(f"Проверка неактивности завершена: напоминания отправлены {sent_count} пользователям")
+        # Пользователи, которые не активны 14+ дней, которым ещё не отправляли
+        # напоминание о неактивности и которые не заблокировали бота
+        result = await session.execute(inactive_users(cutoff_date))
+        chat_ids = result.scalars().all()
+
+    if not chat_ids:
+        logger.info("Проверка неактивности завершена: напоминать некому")
+        return
+    # Время напоминания проставляется в on_sent по мере доставки
+    await broadcasts.create("inactive_users", INACTIVE_REMINDER_TEXT, chat_ids, requested_by=ADMIN_CHAT_ID)
+    logger.info(f"Проверка неактивности завершена: напоминание поставлено в рассылку {len(chat_ids)} пользователям")
+
+
+async def _mark_inactivity_message_sent(session, chat_ids: List[int]) -> None:
+    await session.execute(
+        update(User).where(User.telegram_id.in_(chat_ids))
+        .values(last_inactivity_message_sent=datetime.now(tz=pytz.timezone(TIMEZONE)))
+    )
+
+
+broadcasts.on_sent("inactive_users", _mark_inactivity_message_sent)
@@ -0,0 +1,89 @@
+"""
+Дешёвое отслеживание изменений таблицы через метаданные Drive.
+
+Чтобы заметить правку администратора, не нужно перечитывать листы:
+files.get с fields=version,modifiedTime — крошечный запрос, а version
+растёт при любом изменении таблицы. SheetChangeWatcher опрашивает его раз
+в interval секунд и только при смене версии вызывает подписчиков
+(синхронизация зеркала Schedule, сброс кэша FAQ). В простое таблица
+почти не тратит квоту, а правки видны через несколько секунд.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SheetChangeWatcher:
+    """Опрос ревизии таблицы с уведомлением подписчиков об изменениях."""
+
+    def __init__(self, fetch_revision: Callable[[], Awaitable[str]], interval: float):
+        self._fetch_revision = fetch_revision
+        self.interval = interval
+        self.revision: Optional[str] = None
+
+        self._listeners: List[Callable[[], Awaitable]] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self.listener_errors = 0
+
+    def subscribe(self, callback: Callable[[], Awaitable]) -> None:
+        """Колбэк, который вызывается при каждой смене ревизии таблицы."""
+        self._listeners.append(callback)
+
+    async def check(self) -> bool:
+        """Запрашивает ревизию; True, если таблица изменилась с прошлой проверки."""
+        revision = await self._fetch_revision()
+        self.polls += 1
+        previous, self.revision = self.revision, revision
+        # Первая проверка только запоминает ревизию: начальную загрузку делают сами подписчики
+        if previous is None or previous == revision:
+            return False
+        self.changes += 1
+        logger.info(f"Таблица изменилась (ревизия {previous} → {revision}), обновляем данные")
+        for callback in self._listeners:
+            try:
+                await callback()
+            except Exception as e:
+                self.listener_errors += 1
+                logger.warning(f"Ошибка обработчика изменения таблицы {callback!r}: {e}")
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.debug(f"Не удалось получить ревизию таблицы: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "revision": self.revision,
+            "polls": self.polls,
+            "changes": self.changes,
+            "errors": self.errors,
+            "listener_errors": self.listener_errors,
+        }
@@ -0,0 +1,189 @@
+"""
+Пакетные изменения строк листа Schedule.
+
+Раньше одно бронирование делало до шести запросов: дважды row_values(1)
+за заголовками, чтение ячейки "Свободно" и два update_cell. SlotWriter
+кэширует позиции колонок, копит изменения строк в течение merge_window
+секунд (изменения одной строки сливаются) и отправляет их одним batch_update.
+Пока lock взят (архивирование строк Schedule), пачки не пишутся, а
+накопленные изменения можно перенумеровать через remap_rows.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+FREE_COLUMN = "Свободно"
+LESSON_TYPE_COLUMN = "Типтренировки"
+
+# Позиции колонок по умолчанию, если заголовок не найден
+DEFAULT_COLUMNS = {FREE_COLUMN: 5, LESSON_TYPE_COLUMN: 6}
+
+
+class SlotMutation:
+    """Накопленные изменения одной строки."""
+
+    __slots__ = ("free_delta", "free", "lesson_type")
+
+    def __init__(self):
+        self.free_delta = 0
+        self.free: Optional[int] = None          # абсолютное значение, если известно
+        self.lesson_type: Optional[str] = None
+
+
+class SlotWriter:
+    """Сливает изменения строк Schedule и пишет их одним batch_update."""
+
+    def __init__(
+        self,
+        open_sheet: Callable[[], gspread.Worksheet],
+        run: Callable[..., Awaitable],
+        free_lookup: Callable[[int], Optional[int]],
+        on_applied: Callable[[int, Optional[int], Optional[str]], None],
+        merge_window: float,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        self._open_sheet = open_sheet
+        self._run = run
+        self._free_lookup = free_lookup
+        self._on_applied = on_applied
+        self._on_error = on_error
+        self.merge_window = merge_window
+
+        self._columns: Optional[Dict[str, int]] = None
+        self._pending: Dict[int, SlotMutation] = {}
+        self._batch: Optional[asyncio.Future] = None
+        self.lock = asyncio.Lock()
+
+        # Метрики
+        self.mutations = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    async def mutate(self, row_index: int, free_delta: int = 0,
+                     lesson_type: Optional[str] = None, free: Optional[int] = None) -> bool:
+        """
+        Ставит изменение строки в ближайшую пачку и ждёт её записи.
+
+        Args:
+            row_index: Номер строки в листе Schedule
+            free_delta: Изменение "Свободно" (-1 при брони, +1 при отмене)
+            lesson_type: Новое значение "Типтренировки"
+            free: Абсолютное значение "Свободно" (перекрывает накопленную дельту)
+
+        Returns:
+            True, если пачка записана успешно
+        """
+        mutation = self._pending.setdefault(row_index, SlotMutation())
+        if free is not None:
+            mutation.free = free
+            mutation.free_delta = 0
+        else:
+            mutation.free_delta += free_delta
+        if lesson_type is not None:
+            mutation.lesson_type = lesson_type
+        self.mutations += 1
+
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+            asyncio.create_task(self._flush_later())
+        return await asyncio.shield(self._batch)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.merge_window)
+        async with self.lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        batch, self._batch = self._batch, None
+
+        # Базовое значение "Свободно" берём из снимка; чего в снимке нет — прочитаем из листа
+        for row_index, mutation in pending.items():
+            if mutation.free is None and mutation.free_delta:
+                base = self._free_lookup(row_index)
+                if base is not None:
+                    mutation.free = max(0, base + mutation.free_delta)
+                    mutation.free_delta = 0
+
+        try:
+            applied = await self._run(self._write_sync, pending)
+        except Exception as e:
+            self.errors += 1
+            self._columns = None  # возможно, структура листа изменилась
+            if self._on_error is not None:
+                self._on_error(e)
+            logger.error(f"Ошибка пакетного обновления Schedule ({len(pending)} строк): {e}")
+            batch.set_result(False)
+            return
+
+        self.batches += 1
+        self.rows_written += len(applied)
+        for row_index, (free, lesson_type) in applied.items():
+            self._on_applied(row_index, free, lesson_type)
+            logger.info(f"Обновлён слот: строка {row_index}, свободно={free}, тип={lesson_type}")
+        batch.set_result(True)
+
+    def remap_rows(self, mapper: Callable[[int], Optional[int]]) -> None:
+        """Перенумеровывает накопленные изменения после удаления строк (None — строки больше нет)."""
+        remapped: Dict[int, SlotMutation] = {}
+        for row_index, mutation in self._pending.items():
+            new_index = mapper(row_index)
+            if new_index is None:
+                logger.warning(f"Изменение строки {row_index} отброшено: строка перенесена в архив")
+                continue
+            remapped[new_index] = mutation
+        self._pending = remapped
+
+    def _columns_sync(self, sheet: gspread.Worksheet) -> Dict[str, int]:
+        if self._columns is None:
+            headers = sheet.row_values(1)
+            self._columns = {
+                name: headers.index(name) + 1 if name in headers else default
+                for name, default in DEFAULT_COLUMNS.items()
+            }
+        return self._columns
+
+    def _write_sync(self, pending: Dict[int, SlotMutation]) -> Dict[int, Tuple[Optional[int], Optional[str]]]:
+        sheet = self._open_sheet()
+        columns = self._columns_sync(sheet)
+        free_col = columns[FREE_COLUMN]
+        type_col = columns[LESSON_TYPE_COLUMN]
+
+        # Строки, для которых в снимке не нашлось текущего значения, читаем одним batch_get
+        unknown = [row for row, m in pending.items() if m.free is None and m.free_delta]
+        if unknown:
+            ranges = sheet.batch_get([rowcol_to_a1(row, free_col) for row in unknown])
+            for row, value_range in zip(unknown, ranges):
+                try:
+                    current = int(value_range[0][0]) if value_range and value_range[0] else 0
+                except (TypeError, ValueError):
+                    current = 0
+                pending[row].free = max(0, current + pending[row].free_delta)
+
+        data: List[dict] = []
+        applied: Dict[int, Tuple[Optional[int], Optional[str]]] = {}
+        for row, m in pending.items():
+            if m.lesson_type is not None:
+                data.append({"range": rowcol_to_a1(row, type_col), "values": [[m.lesson_type]]})
+            if m.free is not None:
+                data.append({"range": rowcol_to_a1(row, free_col), "values": [[m.free]]})
+            applied[row] = (m.free, m.lesson_type)
+
+        if data:
+            sheet.batch_update(data)
+        return applied
+
+    def stats(self) -> dict:
+        return {
+            "mutations": self.mutations,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+        }
@@ -0,0 +1,151 @@
+"""
+Занятость тренеров из Google Calendar (freebusy) в памяти.
+
+Свободные места берутся из листа Schedule, а личные дела тренера — из его
+календаря: раньше бот записывал клиентов на время, которое тренер уже
+занял. TrainerBusyCache одним freebusy.query на все календари забирает
+занятые интервалы на окно расписания и хранит их в BusyIntervals —
+отсортированных непересекающихся интервалах, где проверка слота стоит
+один bisect. Ближайшие near_days дней обновляются каждые interval секунд,
+всё окно — раз в full_interval. Проверки идут только по памяти: пока
+Google недоступен, действует последний успешно полученный снимок.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[datetime, datetime]
+
+
+class BusyIntervals:
+    """Занятые интервалы одного тренера: слиты, не пересекаются, отсортированы."""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        merged: List[List[datetime]] = []
+        for start, end in sorted(intervals):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """Пересекается ли [start, end) с занятым временем (стык не считается)."""
+        i = bisect_right(self.ends, start)  # первый интервал, который кончается позже start
+        return i < len(self.starts) and self.starts[i] < end
+
+    def replace_range(self, start: datetime, end: datetime, intervals: Iterable[Interval]) -> "BusyIntervals":
+        """
+        Новый набор, где [start, end) заменён свежими интервалами. Всё, что
+        раньше start, отбрасывается (прошлое не проверяется), позже end — сохраняется.
+        """
+        kept = [(max(s, end), e) for s, e in zip(self.starts, self.ends) if e > end]
+        fresh = [(max(s, start), min(e, end)) for s, e in intervals]
+        return BusyIntervals(kept + fresh)
+
+
+class TrainerBusyCache:
+    """Снимок занятости тренеров с фоновым обновлением."""
+
+    def __init__(
+        self,
+        fetch: Callable[[datetime, datetime], Awaitable[Dict[str, List[Interval]]]],
+        window_days: int,
+        near_days: int,
+        interval: float,
+        full_interval: float,
+    ):
+        self._fetch = fetch
+        self.window_days = window_days
+        self.near_days = near_days
+        self.interval = interval
+        self.full_interval = full_interval
+
+        self._busy: Dict[str, BusyIntervals] = {}
+        self._full_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.refreshes = 0
+        self.full_refreshes = 0
+        self.errors = 0
+        self.checks = 0
+        self.hidden = 0
+
+    def tracks(self, trainer: str) -> bool:
+        return trainer in self._busy
+
+    def is_busy(self, trainer: str, start: datetime, end: datetime) -> bool:
+        """Занят ли тренер в [start, end) (aware datetime). Только память, без запросов к Google."""
+        self.checks += 1
+        intervals = self._busy.get(trainer)
+        if intervals is not None and intervals.overlaps(start, end):
+            self.hidden += 1
+            return True
+        return False
+
+    async def refresh(self, days: Optional[int] = None) -> None:
+        """Перечитывает занятость на days дней вперёд (по умолчанию — всё окно)."""
+        start = datetime.now(timezone.utc)
+        end = start + timedelta(days=days or self.window_days)
+        busy = await self._fetch(start, end)
+        # Тренеры, чей календарь не ответил, остаются со старыми данными
+        updated = dict(self._busy)
+        for trainer, intervals in busy.items():
+            updated[trainer] = updated.get(trainer, BusyIntervals()).replace_range(start, end, intervals)
+        self._busy = updated  # читатели видят либо старый, либо новый снимок целиком
+        self.refreshes += 1
+        logger.debug(f"Занятость тренеров обновлена на {days or self.window_days} дн.: {self.stats()['intervals']} интервалов")
+
+    async def _run(self) -> None:
+        while True:
+            full = self._full_at is None or time.monotonic() - self._full_at >= self.full_interval
+            try:
+                await self.refresh(None if full else self.near_days)
+                if full:
+                    self._full_at = time.monotonic()
+                    self.full_refreshes += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Не удалось обновить занятость тренеров из Google Calendar: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "trainers": len(self._busy),
+            "intervals": sum(len(intervals) for intervals in self._busy.values()),
+            "refreshes": self.refreshes,
+            "full_refreshes": self.full_refreshes,
+            "errors": self.errors,
+            "checks": self.checks,
+            "hidden": self.hidden,
+        }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+🧪 Отложенная запись активности: пакет, который не удалось записать —
+из-за ошибки БД или отмены задачи при остановке бота, — возвращается в
+очередь и уходит следующим сбросом.
+"""
+
+import asyncio
+
+from services.activity import ActivityTracker
+
+
+class HangingSession:
+    """Сессия, у которой запись «висит», пока задачу не отменят."""
+
+    def __init__(self, started: asyncio.Event):
+        self.started = started
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params):
+        self.started.set()
+        await asyncio.Event().wait()
+
+    async def commit(self):
+        pass
+
+
+class FailingSession(HangingSession):
+    async def execute(self, statement, params):
+        raise RuntimeError("database is locked")
+
+
+def test_cancel_during_flush_keeps_batch():
+    async def scenario():
+        started = asyncio.Event()
+        tracker = ActivityTracker(lambda: HangingSession(started), interval=60)
+        tracker.touch(1)
+        tracker.touch(2)
+
+        flush = asyncio.create_task(tracker.flush())
+        await started.wait()
+        tracker.touch(2)  # отметка, пришедшая во время записи, не должна затираться старой
+        fresh = tracker._pending[2]
+        flush.cancel()
+        try:
+            await flush
+        except asyncio.CancelledError:
+            pass
+        return tracker, fresh
+
+    tracker, fresh = asyncio.run(scenario())
+    assert set(tracker._pending) == {1, 2}
+    assert tracker._pending[2] == fresh
+    assert tracker.written == 0
+
+
+def test_failed_flush_keeps_batch():
+    async def scenario():
+        tracker = ActivityTracker(lambda: FailingSession(asyncio.Event()), interval=60)
+        tracker.touch(1)
+        try:
+            await tracker.flush()
+        except RuntimeError:
+            pass
+        return tracker
+
+    tracker = asyncio.run(scenario())
+    assert set(tracker._pending) == {1}
+    assert tracker.errors == 1
+
+
+if __name__ == "__main__":
+    test_cancel_during_flush_keeps_batch()
+    test_failed_flush_keeps_batch()
+    print("✅ Активность не теряется при сбое и отмене записи")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+🧪 Отмена брони: повторное или одновременное нажатие «Отменить» не должно
+второй раз вернуть место в слот и занятие в абонемент, а отмена
+администратором (override) возвращает место, если бронь его ещё держит.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import routers.admin as admin
+import routers.cancellation as cancellation
+from db.models import Base, Booking, SlotSeat, Subscription
+from services.reservations import ReservationEngine
+
+USER_ID = 1
+SLOT_KEY = "Анна|2025-03-15|10:00|0"
+
+
+async def noop(*args, **kwargs):
+    return True
+
+
+def make_callback(booking_id: int, data: str = "cancel_{}"):
+    async def answer(*args, **kwargs):
+        pass
+
+    return SimpleNamespace(
+        data=data.format(booking_id),
+        from_user=SimpleNamespace(id=USER_ID),
+        message=SimpleNamespace(edit_text=answer),
+        answer=answer,
+    )
+
+
+def setup(tmp_path, monkeypatch, hours_to_start: float):
+    url = f"sqlite:///{tmp_path / 'cancel.db'}"
+    Base.metadata.create_all(create_engine(url))
+    session_factory = sessionmaker(
+        create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), connect_args={"timeout": 10}),
+        class_=AsyncSession, expire_on_commit=False,
+    )
+    engine = ReservationEngine(session_factory, noop)
+    for module in (cancellation, admin):
+        monkeypatch.setattr(module, "reservations", engine)
+        monkeypatch.setattr(module, "sync_calendar_event", noop)
+        monkeypatch.setattr(module, "log_event_to_sheet", noop)
+
+    async def seed() -> int:
+        async with session_factory() as session:
+            session.add(SlotSeat(slot_key=SLOT_KEY, row_index=2, free=4, synced_free=4))
+            session.add(Subscription(user_id=USER_ID, classes_total=8, classes_left=3))
+            booking = Booking(
+                user_id=USER_ID, trainer="Анна", date="15 марта", time="10:00", price=0,
+                payment_type="subscription", lesson_type="group_subscription", status="paid",
+                slot_key=SLOT_KEY, lesson_start=datetime.now(timezone.utc) + timedelta(hours=hours_to_start),
+            )
+            session.add(booking)
+            await session.commit()
+            return booking.id
+
+    return session_factory, seed
+
+
+async def cancel(session_factory, booking_id: int, by_admin: bool = False) -> None:
+    # Как DbSessionMiddleware: своя сессия на нажатие, коммит в конце
+    async with session_factory() as session:
+        if by_admin:
+            await admin.admin_cancel_no_penalty(make_callback(booking_id, "admin_no_penalty_cancel_{}"), session)
+        else:
+            await cancellation.cancel_booking(make_callback(booking_id), session)
+        if session.in_transaction():
+            await session.commit()
+
+
+async def state(session_factory):
+    async with session_factory() as session:
+        free = (await session.execute(select(SlotSeat.free))).scalar_one()
+        left = (await session.execute(select(Subscription.classes_left))).scalar_one()
+        status = (await session.execute(select(Booking.status))).scalar_one()
+        return free, left, status
+
+
+def test_repeated_late_cancel_returns_seat_once(tmp_path, monkeypatch):
+    session_factory, seed = setup(tmp_path, monkeypatch, hours_to_start=5)
+
+    async def scenario():
+        booking_id = await seed()
+        await cancel(session_factory, booking_id)
+        await cancel(session_factory, booking_id)
+        return await state(session_factory)
+
+    assert asyncio.run(scenario()) == (5, 3, "late_cancel")
+
+
+def test_concurrent_early_cancel_refunds_once(tmp_path, monkeypatch):
+    session_factory, seed = setup(tmp_path, monkeypatch, hours_to_start=20)
+
+    async def scenario():
+        booking_id = await seed()
+        await asyncio.gather(*(cancel(session_factory, booking_id) for _ in range(5)))
+        return await state(session_factory)
+
+    assert asyncio.run(scenario()) == (5, 4, "cancelled")
+
+
+def test_admin_override_returns_seat_once(tmp_path, monkeypatch):
+    session_factory, seed = setup(tmp_path, monkeypatch, hours_to_start=5)
+
+    async def scenario():
+        booking_id = await seed()
+        await asyncio.gather(*(cancel(session_factory, booking_id, by_admin=True) for _ in range(3)))
+        return await state(session_factory)
+
+    # Override не возвращает занятие в абонемент, но место освобождает
+    assert asyncio.run(scenario()) == (5, 3, "cancelled")
+
+
+def test_admin_override_after_late_cancel_keeps_seat_count(tmp_path, monkeypatch):
+    session_factory, seed = setup(tmp_path, monkeypatch, hours_to_start=5)
+
+    async def scenario():
+        booking_id = await seed()
+        await cancel(session_factory, booking_id)  # поздняя отмена по абонементу уже вернула место
+        await cancel(session_factory, booking_id, by_admin=True)
+        return await state(session_factory)
+
+    assert asyncio.run(scenario()) == (5, 3, "cancelled")
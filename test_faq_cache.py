@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+🧪 Постоянные id вопросов FAQ: кнопка faq_{id} из старого сообщения должна
+открывать тот же вопрос после рестарта бота и после перестановки строк в листе.
+"""
+
+import asyncio
+
+from services.faq_cache import FaqCache
+
+PAIRS = [
+    ("Как записаться на занятие?", "Через кнопку «Записаться»."),
+    ("Сколько стоит абонемент?", "От 4 занятий."),
+    ("Можно ли отменить запись?", "Да, за 10 часов."),
+]
+
+
+def load_ids(pairs) -> dict:
+    """Снимок из нового экземпляра кэша (как после рестарта): вопрос → id."""
+    async def loader():
+        return pairs
+
+    snapshot = asyncio.run(FaqCache(loader, max_age=60).refresh())
+    return {entry.question: entry.id for entry in snapshot.entries}
+
+
+def test_ids_survive_restart_and_reorder():
+    first = load_ids(PAIRS)
+    assert load_ids(PAIRS) == first
+    assert load_ids(list(reversed(PAIRS))) == first
+    # Добавленный вопрос не сдвигает id остальных
+    extended = load_ids([("Где парковка?", "У входа.")] + PAIRS)
+    assert {q: extended[q] for q in first} == first
+    assert len(set(first.values())) == len(first)
+
+
+def test_callback_data_fits_telegram_limit():
+    for entry_id in load_ids(PAIRS).values():
+        assert len(f"faq_{entry_id}".encode()) <= 64
+
+
+def test_duplicate_questions_get_distinct_ids():
+    async def loader():
+        return [("Вопрос?", "Ответ 1"), ("  вопрос? ", "Ответ 2")]
+
+    snapshot = asyncio.run(FaqCache(loader, max_age=60).refresh())
+    assert len(snapshot.by_id) == 2
+
+
+if __name__ == "__main__":
+    test_ids_survive_restart_and_reorder()
+    test_callback_data_fits_telegram_limit()
+    test_duplicate_questions_get_distinct_ids()
+    print("✅ id вопросов FAQ постоянны")
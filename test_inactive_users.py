@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+🧪 Ежедневная проверка неактивности: check_inactive_users на временной БД
+ставит в рассылку только тех, кто не заходил 14+ дней, ещё не получал
+напоминания и не заблокировал бота.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import services.scheduler as scheduler_module
+from db.models import Base, User
+
+INACTIVE, ACTIVE, BLOCKED, ALREADY_REMINDED = 1, 2, 3, 4
+
+
+class FakeBroadcasts:
+    """Вместо очереди рассылок запоминает, кому поставлено напоминание."""
+
+    def __init__(self):
+        self.created = []
+
+    async def create(self, kind, text, chat_ids, requested_by=None):
+        self.created.append((kind, sorted(chat_ids)))
+        return len(self.created)
+
+
+def test_check_inactive_users_queues_reminders(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'inactive.db'}"
+    Base.metadata.create_all(create_engine(url))
+    session_factory = sessionmaker(
+        create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://")), class_=AsyncSession, expire_on_commit=False
+    )
+    broadcasts = FakeBroadcasts()
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(scheduler_module, "broadcasts", broadcasts)
+
+    async def scenario():
+        now = datetime.utcnow()
+        async with session_factory() as session:
+            session.add_all([
+                User(telegram_id=INACTIVE, last_activity=now - timedelta(days=30)),
+                User(telegram_id=ACTIVE, last_activity=now - timedelta(days=1)),
+                User(telegram_id=BLOCKED, last_activity=now - timedelta(days=30), is_blocked=True),
+                User(telegram_id=ALREADY_REMINDED, last_activity=now - timedelta(days=30),
+                     last_inactivity_message_sent=now - timedelta(days=3)),
+            ])
+            await session.commit()
+        await scheduler_module.check_inactive_users(bot=None)
+
+    asyncio.run(scenario())
+    assert broadcasts.created == [("inactive_users", [INACTIVE])]
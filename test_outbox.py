@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+🧪 Outbox: сообщение, чей результат доставки не удалось записать, не должно
+застревать в статусе sending до рестарта бота.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.models import Base, OutboxMessage
+from services.outbox import OutboxDispatcher, enqueue
+
+
+def make_outbox(tmp_path):
+    url = f"sqlite:///{tmp_path / 'outbox.db'}"
+    Base.metadata.create_all(create_engine(url))
+    session_factory = sessionmaker(
+        create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://")), class_=AsyncSession, expire_on_commit=False
+    )
+    outbox = OutboxDispatcher(
+        session_factory, poll_interval=1, batch_window=0, max_attempts=3, retry_base=1, retry_max=1, sending_lease=60,
+    )
+    return outbox, session_factory
+
+
+async def statuses(session_factory) -> dict:
+    async with session_factory() as session:
+        result = await session.execute(select(OutboxMessage.payload, OutboxMessage.status))
+        return {payload["n"]: status for payload, status in result.all()}
+
+
+def test_record_is_retried_after_transient_error(tmp_path):
+    outbox, session_factory = make_outbox(tmp_path)
+    delivered = []
+
+    async def handler(payloads):
+        delivered.extend(payloads)
+        return [None] * len(payloads)
+
+    outbox.register("seat", handler)
+    record = outbox._record
+    failures = [RuntimeError("database is locked")]
+
+    async def flaky_record(*args):
+        if failures:
+            raise failures.pop()
+        await record(*args)
+
+    outbox._record = flaky_record
+
+    async def scenario():
+        async with session_factory() as session:
+            await enqueue(session, "seat", {"n": 1})
+            await session.commit()
+        await outbox.dispatch_due()
+        await asyncio.gather(*outbox._tasks)
+        return await statuses(session_factory)
+
+    assert asyncio.run(scenario()) == {}
+    assert delivered == [{"n": 1}]
+    assert outbox.delivered == 1
+
+
+def test_expired_sending_lease_is_recovered(tmp_path):
+    outbox, session_factory = make_outbox(tmp_path)
+
+    async def scenario():
+        now = datetime.utcnow()
+        async with session_factory() as session:
+            session.add_all([
+                # Аренда истекла — результат доставки так и не записали
+                OutboxMessage(target="seat", payload={"n": 1}, status="sending", next_attempt_at=now - timedelta(seconds=1)),
+                # Доставка ещё идёт
+                OutboxMessage(target="seat", payload={"n": 2}, status="sending", next_attempt_at=now + timedelta(seconds=60)),
+                # Зависшее, но уже есть свежее ждущее с тем же ключом
+                OutboxMessage(target="seat", payload={"n": 3}, status="sending", dedup_key="seat:a",
+                              next_attempt_at=now - timedelta(seconds=1)),
+                OutboxMessage(target="seat", payload={"n": 4}, status="pending", dedup_key="seat:a", next_attempt_at=now),
+            ])
+            await session.commit()
+        recovered = await outbox.recover(expired_only=True)
+        return recovered, await statuses(session_factory)
+
+    recovered, result = asyncio.run(scenario())
+    assert recovered == 1
+    assert result == {1: "pending", 2: "sending", 4: "pending"}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+🧪 Планы горячих запросов: каждый должен идти по индексу (SEARCH), а не
+перебирать таблицу (SCAN) и не сортировать в памяти (TEMP B-TREE).
+
+Запросы берутся из db/queries.py — тех же функций, что вызывают роутеры,
+планировщик и сервисы, — и компилируются диалектом SQLite. Схема и индексы
+берутся из db/models.py. Рассылка тренера «всем, кто записывался» и полные
+выгрузки зеркала Schedule проходят по всей таблице намеренно и сюда не входят.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+
+from db import queries
+from db.models import Base
+from services.scheduler import INACTIVE_STATUSES
+
+NOW = datetime(2025, 3, 15, 7, 0, tzinfo=timezone.utc)
+TELEGRAM_ID = 123456789
+
+
+def hot_queries():
+    """(откуда, запрос)"""
+    return [
+        ("start.register_user_if_not_exists", queries.user_by_telegram_id(TELEGRAM_ID)),
+        ("profile.my_bookings", queries.user_bookings(TELEGRAM_ID)),
+        ("profile.my_subscriptions / booking / cancellation", queries.user_subscriptions(TELEGRAM_ID)),
+        ("booking: проверка абонемента", queries.active_subscription(TELEGRAM_ID)),
+        ("cancellation / admin: отмена брони", queries.close_booking(42, "cancelled")),
+        ("admin.show_today_bookings", queries.day_bookings(NOW, NOW + timedelta(days=1))),
+        ("trainer.trainer_schedule", queries.trainer_bookings("Анна", NOW, NOW + timedelta(days=7))),
+        (
+            "scheduler.sweep_reminders",
+            queries.reminder_candidates(NOW, NOW + timedelta(hours=12), INACTIVE_STATUSES),
+        ),
+        ("scheduler.check_inactive_users", queries.inactive_users(NOW - timedelta(days=14))),
+        ("google_calendar.reconcile_calendar", queries.bookings_between(NOW, NOW + timedelta(days=14))),
+        ("schedule_mirror.load_index", queries.schedule_slots_since(date(2025, 3, 14))),
+        ("schedule_mirror._apply_local", queries.update_schedule_row(42, free=3)),
+        ("reservations.get_free", queries.slot_free("Анна|2025-03-15|10:00|0")),
+        ("outbox.dispatch_due", queries.due_outbox(NOW.replace(tzinfo=None), limit=500)),
+        ("broadcast.process_batch", queries.pending_deliveries(1, limit=100)),
+    ]
+
+
+def query_plan(conn, statement) -> list:
+    sql = statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def test_hot_queries_use_indexes():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    problems = []
+    with engine.connect() as conn:
+        for source, statement in hot_queries():
+            plan = query_plan(conn, statement)
+            print(f"{source}: {plan}")
+            if any(step.startswith("SCAN") or "TEMP B-TREE" in step for step in plan):
+                problems.append(f"{source}: {plan}")
+    assert not problems, "Запросы без индекса:\n" + "\n".join(problems)
+
+
+if __name__ == "__main__":
+    test_hot_queries_use_indexes()
+    print("✅ Все горячие запросы идут по индексам")
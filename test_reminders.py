@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+🧪 Напоминания о занятиях: флаги отмечаются до отправки (без дублей), но
+напоминание, которое не удалось отправить, повторяет следующий проход.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import services.scheduler as scheduler_module
+from db.models import Base, Booking
+
+OK_USER, FAILING_USER, BLOCKED_USER = 1, 2, 3
+
+
+class FakeBot:
+    """Бот, у которого отправка одному чату падает, а другой заблокировал бота."""
+
+    def __init__(self, failing: set):
+        self.failing = failing
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        if chat_id in self.failing:
+            raise RuntimeError("Telegram server error")
+        if chat_id == BLOCKED_USER:
+            raise TelegramForbiddenError(method=None, message="bot was blocked by the user")
+        self.sent.append(chat_id)
+
+
+def make_session_factory(tmp_path):
+    url = f"sqlite:///{tmp_path / 'reminders.db'}"
+    Base.metadata.create_all(create_engine(url))
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def add_bookings(session_factory, start: datetime):
+    async with session_factory() as session:
+        for user_id in (OK_USER, FAILING_USER, BLOCKED_USER):
+            session.add(Booking(
+                user_id=user_id, trainer="Анна", date="15 марта 2025", time="10:00", price=1000,
+                status="paid", lesson_start=start, created_at=datetime.utcnow() - timedelta(days=1),
+            ))
+        await session.commit()
+
+
+async def flags(session_factory) -> dict:
+    async with session_factory() as session:
+        result = await session.execute(select(Booking.user_id, Booking.reminder_12_sent, Booking.reminder_2_sent))
+        return {row.user_id: (row.reminder_12_sent, row.reminder_2_sent) for row in result}
+
+
+def test_failed_reminder_is_retried(tmp_path, monkeypatch):
+    session_factory = make_session_factory(tmp_path)
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", session_factory)
+
+    async def scenario():
+        await add_bookings(session_factory, datetime.now(timezone.utc) + timedelta(hours=6))
+
+        first = await scheduler_module.sweep_reminders(FakeBot(failing={FAILING_USER}))
+        after_first = await flags(session_factory)
+        retry_bot = FakeBot(failing=set())
+        second = await scheduler_module.sweep_reminders(retry_bot)
+        third = await scheduler_module.sweep_reminders(FakeBot(failing=set()))
+        return first, after_first, retry_bot, second, third, await flags(session_factory)
+
+    first, after_first, retry_bot, second, third, final = asyncio.run(scenario())
+
+    assert first["failed"] == 1 and first["blocked"] == 1
+    assert after_first[OK_USER][0] and after_first[BLOCKED_USER][0]
+    assert not after_first[FAILING_USER][0]
+    # Следующий проход повторяет только неотправленное
+    assert retry_bot.sent == [FAILING_USER]
+    assert second["sent_12h"] == 1 and second["failed"] == 0
+    assert third["sent_12h"] == 0
+    assert all(reminder_12 for reminder_12, _ in final.values())
+
+
+def test_failed_2h_reminder_is_retried(tmp_path, monkeypatch):
+    session_factory = make_session_factory(tmp_path)
+    monkeypatch.setattr(scheduler_module, "AsyncSessionLocal", session_factory)
+
+    async def scenario():
+        await add_bookings(session_factory, datetime.now(timezone.utc) + timedelta(hours=1))
+        await scheduler_module.sweep_reminders(FakeBot(failing={FAILING_USER}))
+        after_first = await flags(session_factory)
+        retry_bot = FakeBot(failing=set())
+        await scheduler_module.sweep_reminders(retry_bot)
+        return after_first, retry_bot
+
+    after_first, retry_bot = asyncio.run(scenario())
+
+    assert after_first[OK_USER] == (True, True)
+    assert after_first[FAILING_USER][1] is False
+    assert retry_bot.sent == [FAILING_USER]
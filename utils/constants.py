@@ -40,6 +40,15 @@ WELCOME_TEXT = (
     "Что хочешь сделать? 👇"
 )
 
+MONTHS_RU = {
+    1: "января", 2: "февраля", 3: "марта", 4: "апреля",
+    5: "мая", 6: "июня", 7: "июля", 8: "августа",
+    9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
+}
+MONTH_NUMBERS_RU = {name: number for number, name in MONTHS_RU.items()}
+
+WEEKDAYS_RU_SHORT = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+
 LESSON_TYPES = {
     "trial": "Пробное занятие — 900 ₽",
     "group_single": "Групповое разовое — 1000 ₽",
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -10,32 +10,32 @@ def format_price(amount: int) -> str:
     return f"{amount} ₽"
 
 
-async def update_user_activity(user_id: int) -> None:
+def update_user_activity(user_id: int) -> None:
     """
-    Обновляет время последней активности пользователя.
+    Отмечает активность пользователя.
     Используется для отслеживания неактивных пользователей (шаг 11).
+    Время копится в памяти и пишется в users.last_activity пачкой
+    (services/activity.py) — нажатие в меню не пишет в БД.
     
     Args:
         user_id: Telegram ID пользователя
     """
-    from db.models import User
-    from db.database import AsyncSessionLocal
-    from sqlalchemy import select
+    from services.activity import activity
     
-    try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == user_id)
-            )
-            user = result.scalar_one_or_none()
-            
-            if user:
-                user.last_activity = datetime.utcnow()
-                await session.commit()
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Ошибка при обновлении last_activity для {user_id}: {e}")
+    activity.touch(user_id)
+
+
+def lesson_start_at(day: date, time_str: str) -> datetime:
+    """
+    Начало занятия: дата и время "HH:MM" в TIMEZONE студии → aware datetime.
+
+    Это значение пишется в Booking.lesson_start при записи и переносе.
+    """
+    import pytz
+    from config import TIMEZONE
+
+    naive = datetime.combine(day, datetime.strptime(time_str, "%H:%M").time())
+    return pytz.timezone(TIMEZONE).localize(naive)
 
 
 def hours_to_lesson(booking: "Booking") -> float:
@@ -43,24 +43,31 @@ def hours_to_lesson(booking: "Booking") -> float:
     Вычисляет количество часов до начала занятия.
     
     Args:
-        booking: Объект бронирования с полями date ("15 марта 2025") и time ("HH:MM")
+        booking: Объект бронирования с полем lesson_start (aware datetime)
     
     Returns:
         Количество часов до начала занятия (может быть отрицательным, если занятие в прошлом)
     
     Example:
-        >>> booking.date = "27 ноября 2025"
-        >>> booking.time = "10:00"
+        >>> booking.lesson_start = lesson_start_at(date(2025, 11, 27), "10:00")
         >>> hours = hours_to_lesson(booking)  # Примерно 10.5 часов
     """
     try:
-        # Парсим дату в формате "27 ноября 2025" и время "10:00"
-        lesson_datetime = datetime.strptime(f"{booking.date} {booking.time}", "%d %B %Y %H:%M")
-        now = datetime.now()
-        delta = lesson_datetime - now
-        return delta.total_seconds() / 3600
+        delta = booking_lesson_start(booking) - datetime.now(timezone.utc)
     except ValueError as e:
         # Если формат некорректный, логируем и возвращаем 0
-        print(f"Ошибка парсинга даты/времени: {booking.date} {booking.time} — {e}")
+        import logging
+        logging.getLogger(__name__).error(f"Ошибка разбора даты/времени брони {booking.id}: {e}")
         return 0
+    return delta.total_seconds() / 3600
 
+
+def booking_lesson_start(booking: "Booking") -> datetime:
+    """
+    Начало занятия брони (aware datetime). Для старых броней, у которых
+    lesson_start ещё не заполнен миграцией, разбирает date и time.
+    """
+    if booking.lesson_start is not None:
+        return booking.lesson_start
+    from services.schedule_index import resolve_day_month
+    return lesson_start_at(resolve_day_month(booking.date), booking.time)
@@ -0,0 +1,43 @@
+"""
+Token bucket — общий ограничитель частоты вызовов.
+
+Ничего не знает о том, кого ограничивает: квоты Google с приоритетами
+(services/google_quota.py) и лимит сообщений Telegram в рассылках
+(services/broadcast.py) строятся поверх него независимо друг от друга.
+"""
+
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """rate токенов в минуту, не больше capacity про запас."""
+
+    def __init__(self, name: str, per_minute: float, capacity: Optional[float] = None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, cost: float = 1, reserve: float = 0.0) -> float:
+        """
+        Берёт cost токенов, если после этого в ведре останется не меньше
+        reserve (доли capacity). Иначе ничего не берёт и возвращает, сколько
+        секунд ждать; 0.0 — токены взяты.
+        """
+        self._refill()
+        floor = self.capacity * reserve
+        if self._tokens - cost >= floor:
+            self._tokens -= cost
+            return 0.0
+        return (floor + cost - self._tokens) / self.rate
+
+    def stats(self) -> dict:
+        self._refill()
+        return {"tokens": round(self._tokens, 1)}